@@ -0,0 +1,26 @@
+"""
+Micro-benchmark of the OCR confidence coloring: per-line get_conf_color vs. vectorized get_conf_colors.
+
+python benchmarks/conf_color.py [NUM_LINES]
+"""
+import sys
+import timeit
+
+import numpy as np
+
+from qurator.tsvtools.ocr import get_conf_color, get_conf_colors
+
+
+def main(num_lines=100000, min_conf=0.2, max_conf=0.95):
+
+    conf = np.random.default_rng(0).uniform(0.0, 1.0, num_lines)
+
+    scalar = timeit.timeit(lambda: [get_conf_color(c, min_conf, max_conf) for c in conf], number=1)
+    vectorized = min(timeit.repeat(lambda: get_conf_colors(conf, min_conf, max_conf), number=1, repeat=5))
+
+    print("{} lines: get_conf_color {:.3f}s, get_conf_colors {:.3f}s, speedup {:.1f}x".
+          format(num_lines, scalar, vectorized, scalar / vectorized))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,335 @@
+"""
+Benchmarks of the conversion paths on a synthetic corpus (see synthetic.py).
+
+python benchmarks/run.py [--pages N] [--regions N] [--lines N] [--words N] [--repeat N] [BENCHMARK ...]
+
+Every benchmark runs in a separate process. Reported are the best time of --repeat runs, the throughput in
+tokens/sec (tokens = words of the corpus, for all benchmarks) and the peak RSS of the benchmark process
+(including its setup). With --budget-file (JSON: {"benchmark": minimum tokens/sec, ...}) the exit status is 1 if
+any benchmark falls short of its budget.
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import click
+
+from synthetic import generate_corpus
+
+
+def _page_files(corpus):
+
+    return sorted(Path(corpus).glob('page_*.xml'))
+
+
+def _words(corpus):
+    """
+    (text, conf) of all words of the PAGE-XML files of the corpus.
+    """
+    from lxml import etree as ET
+
+    words = []
+    for page_file in _page_files(corpus):
+        for text_equiv in ET.parse(str(page_file)).iter('{*}Word'):
+            text_equiv = text_equiv.find('{*}TextEquiv')
+            words.append((text_equiv.findtext('{*}Unicode'), float(text_equiv.get('conf'))))
+
+    return words
+
+
+def bench_page2tsv(corpus, work_dir, parser='ocrd'):
+    from qurator.tsvtools.page import page2tsv
+
+    page_files = _page_files(corpus)
+
+    def run(n):
+        tsv_file = Path(work_dir, 'page2tsv-{}.tsv'.format(n))
+        for page_file in page_files:
+            page2tsv(str(page_file), str(tsv_file), 'NERD', 'http://empty/{}'.format(page_file.stem), None, None,
+                     False, 1.0, None, None, None, 1, str(Path(corpus, 'normalization.pkl')), parser=parser)
+
+    return run
+
+
+def bench_page2tsv_ocr(corpus, work_dir):
+    from qurator.tsvtools.page import page2tsv
+
+    page_files = _page_files(corpus)
+
+    def run(n):
+        tsv_file = Path(work_dir, 'page2tsv-ocr-{}.tsv'.format(n))
+        for page_file in page_files:
+            page2tsv(str(page_file), str(tsv_file), 'OCR', 'http://empty/{}'.format(page_file.stem), None, None,
+                     False, 1.0, None, 0.2, 0.95, 1, str(Path(corpus, 'normalization.pkl')))
+
+    return run
+
+
+def bench_alto2tsv(corpus, work_dir):
+    from qurator.tsvtools.alto import alto2tsv
+
+    def run(n):
+        alto2tsv(str(Path(corpus, 'alto.xml')), str(Path(work_dir, 'alto2tsv-{}.tsv'.format(n))), 'NERD',
+                 'http://empty/{{ page_no }}', None, None, False, 1.0, None, 1, split_pages=True)
+
+    return run
+
+
+def bench_tsv2page(corpus, work_dir):
+    from qurator.tsvtools.merge import tsv2page
+    from qurator.tsvtools.page import page2tsv
+
+    pairs = []
+    for page_file in _page_files(corpus):
+        tsv_file = Path(work_dir, page_file.stem + '.tsv')
+        page2tsv(str(page_file), str(tsv_file), 'OCR', 'http://empty', None, None, False, 1.0, None, None, None, 1,
+                 None, parser='fast')
+        pairs.append((page_file, tsv_file))
+
+    def run(n):
+        for page_file, tsv_file in pairs:
+            tsv2page(str(Path(work_dir, '{}.corrected-{}.xml'.format(page_file.stem, n))), False, str(page_file),
+                     str(tsv_file))
+
+    return run
+
+
+def bench_unicode_normalize(corpus, work_dir):
+    from qurator.tsvtools.page import load_normalizer
+
+    normalize = load_normalizer(str(Path(corpus, 'normalization.pkl')))
+
+    texts = [text for text, _ in _words(corpus)]
+
+    def run(n):
+        for text in texts:
+            normalize(text)
+
+    return run
+
+
+def bench_get_conf_color(corpus, work_dir):
+    from qurator.tsvtools.ocr import get_conf_color
+
+    conf = [conf for _, conf in _words(corpus)]
+
+    def run(n):
+        for c in conf:
+            get_conf_color(c, 0.2, 0.95)
+
+    return run
+
+
+def bench_get_conf_colors(corpus, work_dir):
+    import numpy as np
+    from qurator.tsvtools.ocr import get_conf_colors
+
+    conf = np.array([conf for _, conf in _words(corpus)])
+
+    def run(n):
+        get_conf_colors(conf, 0.2, 0.95)
+
+    return run
+
+
+def bench_tsv2tsv_sanitize(corpus, work_dir):
+    import numpy as np
+    import pandas as pd
+    from qurator.utils.tsv import read_tsv, write_tsv
+    from qurator.tsvtools.page import page2tsv
+    from qurator.tsvtools.tsv import tsv2tsv
+
+    tsv_file = Path(work_dir, 'sanitize.tsv')
+    for page_file in _page_files(corpus):
+        page2tsv(str(page_file), str(tsv_file), 'NERD', 'http://empty/{}'.format(page_file.stem), None, None, False,
+                 1.0, None, None, None, 1, None, parser='fast')
+
+    # broken sentence numbering and some entities
+    tsv, urls, contexts = read_tsv(str(tsv_file))
+    rng = np.random.default_rng(0)
+    tsv['No.'] = np.where(rng.random(len(tsv)) < 0.07, 0, rng.integers(1, 30, len(tsv)))
+    tsv['NE-TAG'] = pd.Series(rng.choice(['O', 'O', 'O', 'B-PER', 'I-PER'], len(tsv)))
+    write_tsv(tsv, urls, contexts, str(tsv_file))
+
+    def run(n):
+        tsv2tsv(str(tsv_file), str(Path(work_dir, 'sanitized-{}.tsv'.format(n))), None, False, False, False, False,
+                False, False, False, False, True, False, [])
+
+    return run
+
+
+def _workspace(corpus, work_dir):
+    from ocrd import Resolver
+    from ocrd_utils import MIMETYPE_PAGE
+
+    workspace = Resolver().workspace_from_nothing(str(Path(work_dir, 'ws')))
+    workspace.mets.unique_identifier = 'synthetic'
+
+    Path(workspace.directory, 'PAGE').mkdir()
+    for page_file in _page_files(corpus):
+        Path(workspace.directory, 'PAGE', page_file.name).write_bytes(page_file.read_bytes())
+        workspace.add_file('PAGE', file_id='PAGE_' + page_file.stem, page_id='PHYS_' + page_file.stem,
+                           mimetype=MIMETYPE_PAGE, local_filename='PAGE/' + page_file.name)
+    workspace.save_mets()
+
+    return workspace
+
+
+def bench_ocrd_neat_export(corpus, work_dir):
+    from ocrd_utils import pushd_popd
+    from qurator.tsvtools.ocrd_processors import OcrdNeatExportProcessor
+
+    workspace = _workspace(corpus, work_dir)
+
+    def run(n):
+        with pushd_popd(workspace.directory):
+            OcrdNeatExportProcessor(workspace=workspace, input_file_grp='PAGE',
+                                    output_file_grp='TSV{}'.format(n)).process()
+
+    return run
+
+
+def bench_ocrd_neat_import(corpus, work_dir, delta=False):
+    """
+    `delta`: re-import of TSV files with one changed line per page.
+    """
+    from ocrd_utils import pushd_popd
+    from qurator.tsvtools.ocrd_processors import OcrdNeatExportProcessor, OcrdNeatImportProcessor
+
+    workspace = _workspace(corpus, work_dir)
+
+    page_grp = 'PAGE'
+    with pushd_popd(workspace.directory):
+        OcrdNeatExportProcessor(workspace=workspace, input_file_grp='PAGE', output_file_grp='TSV').process()
+
+        if delta:
+            OcrdNeatImportProcessor(workspace=workspace, input_file_grp='PAGE,TSV', output_file_grp='BASE',
+                                    parameter={'keep_words': True}).process()
+            page_grp = 'BASE'
+
+            for tsv_file in Path(workspace.directory, 'TSV').glob('*.tsv'):
+                lines = tsv_file.read_text(encoding='utf-8').split('\n')
+                lines[2] = 'corrected ' + lines[2]
+                tsv_file.write_text('\n'.join(lines), encoding='utf-8')
+
+    def run(n):
+        with pushd_popd(workspace.directory):
+            OcrdNeatImportProcessor(workspace=workspace, input_file_grp=page_grp + ',TSV',
+                                    output_file_grp='CORRECTED{}'.format(n), parameter={'delta': delta}).process()
+
+    return run
+
+
+BENCHMARKS = {
+    'page2tsv': bench_page2tsv,
+    'page2tsv-fast': lambda corpus, work_dir: bench_page2tsv(corpus, work_dir, parser='fast'),
+    'page2tsv-ocr': bench_page2tsv_ocr,
+    'alto2tsv': bench_alto2tsv,
+    'tsv2page': bench_tsv2page,
+    'unicode_normalize': bench_unicode_normalize,
+    'get_conf_color': bench_get_conf_color,
+    'get_conf_colors': bench_get_conf_colors,
+    'tsv2tsv-sanitize': bench_tsv2tsv_sanitize,
+    'ocrd-neat-export': bench_ocrd_neat_export,
+    'ocrd-neat-import': bench_ocrd_neat_import,
+    'ocrd-neat-import-delta': lambda corpus, work_dir: bench_ocrd_neat_import(corpus, work_dir, delta=True),
+}
+
+
+def run_benchmark(name, corpus, repeat):
+    """
+    Run benchmark `name` `repeat` times in this process. Returns the best time in seconds and the peak RSS in bytes.
+    """
+    with tempfile.TemporaryDirectory() as work_dir, open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+
+        run = BENCHMARKS[name](corpus, work_dir)
+
+        seconds = []
+        for n in range(repeat):
+            start = time.perf_counter()
+            run(n)
+            seconds.append(time.perf_counter() - start)
+
+    # kilobytes on Linux, bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return min(seconds), max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+@click.command()
+@click.argument('benchmarks', type=click.Choice(list(BENCHMARKS)), nargs=-1)
+@click.option('--corpus', type=click.Path(), default=None,
+              help='Directory of the synthetic corpus. It is generated if it does not contain any pages yet. '
+                   'default: temporary directory')
+@click.option('--pages', type=int, default=10, help='Number of pages. default: 10')
+@click.option('--regions', type=int, default=5, help='Regions per page. default: 5')
+@click.option('--lines', type=int, default=20, help='Lines per region. default: 20')
+@click.option('--words', type=int, default=10, help='Words per line. default: 10')
+@click.option('--pua-rate', type=float, default=0.05, help='Fraction of words with a private use character. '
+                                                           'default: 0.05')
+@click.option('--repeat', type=int, default=3, help='Number of runs of each benchmark, the best one counts. '
+                                                    'default: 3')
+@click.option('--json-file', type=click.Path(), default=None, help='Write the results to this file.')
+@click.option('--budget-file', type=click.Path(exists=True), default=None,
+              help='JSON file of minimum tokens/sec per benchmark.')
+@click.option('--in-process', type=bool, is_flag=True, hidden=True,
+              help='Run the benchmarks in this process and print one JSON result per line.')
+def main(benchmarks, corpus, pages, regions, lines, words, pua_rate, repeat, json_file, budget_file, in_process):
+
+    benchmarks = benchmarks or list(BENCHMARKS)
+
+    if in_process:
+        for name in benchmarks:
+            seconds, max_rss = run_benchmark(name, corpus, repeat)
+            print(json.dumps({'benchmark': name, 'seconds': seconds, 'max_rss': max_rss}), flush=True)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+
+        corpus = corpus or tmp_dir
+        if len(_page_files(corpus)) == 0:
+            generate_corpus(corpus, pages, regions, lines, words, pua_rate)
+
+        num_tokens = len(_words(corpus))
+
+        print("{} pages, {} tokens".format(len(_page_files(corpus)), num_tokens))
+        print("{:<20} {:>10} {:>14} {:>12}".format('benchmark', 'seconds', 'tokens/sec', 'peak RSS MB'))
+
+        results = []
+        for name in benchmarks:
+            out = subprocess.run([sys.executable, __file__, '--in-process', '--corpus', corpus, '--repeat',
+                                  str(repeat), name], stdout=subprocess.PIPE, check=True, text=True).stdout
+
+            result = json.loads(out.splitlines()[-1])
+            result['tokens'] = num_tokens
+            result['tokens_per_sec'] = num_tokens / result['seconds']
+            results.append(result)
+
+            print("{:<20} {:>10.3f} {:>14.0f} {:>12.1f}".format(name, result['seconds'], result['tokens_per_sec'],
+                                                                 result['max_rss'] / 1024 ** 2))
+
+    if json_file is not None:
+        with open(json_file, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if budget_file is not None:
+        with open(budget_file) as f:
+            budgets = json.load(f)
+
+        failed = [result for result in results if result['tokens_per_sec'] < budgets.get(result['benchmark'], 0)]
+        for result in failed:
+            print("Budget missed: {} {:.0f} tokens/sec < {} tokens/sec".format(
+                result['benchmark'], result['tokens_per_sec'], budgets[result['benchmark']]))
+
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Synthetic PAGE-XML and ALTO pages of configurable size for the benchmarks.
+
+python benchmarks/synthetic.py OUT_DIR [--pages N] [--regions N] [--lines N] [--words N] [--pua-rate R]
+
+Every page consists of regions x lines x words words. Words carry confidences and contain private use
+characters (see PUA_CHARACTERS) with probability `pua_rate`.
+"""
+import random
+from pathlib import Path
+from xml.sax.saxutils import escape, quoteattr
+
+import click
+
+PAGE_NAMESPACE = 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15'
+
+ALTO_NAMESPACE = 'http://www.loc.gov/standards/alto/ns-v4#'
+
+# private use characters of the MUFI range together with their normalization (base, combining character)
+PUA_CHARACTERS = {0xe72c: ('a', '0364'), 0xe644: ('o', '0364'), 0xe4e1: ('u', '0364'), 0xf1ac: ('ſ', ''),
+                  0xe5dc: ('n', '0303')}
+
+LETTERS = 'abcdefghijklmnopqrstuvwxyzäöüßſABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+WORD_WIDTH, WORD_GAP, LINE_HEIGHT, LINE_GAP, REGION_GAP = 60, 10, 30, 10, 40
+
+
+def random_word(rng, pua_rate):
+
+    word = [rng.choice(LETTERS) for _ in range(rng.randint(1, 10))]
+
+    if rng.random() < pua_rate:
+        word[rng.randrange(len(word))] = chr(rng.choice(list(PUA_CHARACTERS)))
+
+    return "".join(word)
+
+
+def synthetic_page(num_regions, num_lines, num_words, pua_rate=0.05, seed=0):
+    """
+    Layout of a synthetic page: list of regions, each a list of lines, each a list of (text, conf, bbox) words.
+    bbox is (left, top, right, bottom).
+    """
+    rng = random.Random(seed)
+
+    regions, top = [], 0
+    for _ in range(num_regions):
+        lines = []
+        for _ in range(num_lines):
+            words = []
+            for n in range(num_words):
+                left = n * (WORD_WIDTH + WORD_GAP)
+
+                bbox = (left, top + rng.randint(0, 3), left + WORD_WIDTH, top + LINE_HEIGHT - rng.randint(0, 3))
+
+                words.append((random_word(rng, pua_rate), round(rng.uniform(0.3, 1.0), 3), bbox))
+
+            lines.append(words)
+            top += LINE_HEIGHT + LINE_GAP
+
+        regions.append(lines)
+        top += REGION_GAP
+
+    return regions
+
+
+def _page_size(regions):
+
+    right = max([word[2][2] for lines in regions for words in lines for word in words], default=0)
+    bottom = max([word[2][3] for lines in regions for words in lines for word in words], default=0)
+
+    return right + WORD_GAP, bottom + LINE_GAP
+
+
+def _points(left, top, right, bottom):
+
+    return "{0},{1} {2},{1} {2},{3} {0},{3}".format(left, top, right, bottom)
+
+
+def _bbox(words):
+
+    return (min([w[2][0] for w in words]), min([w[2][1] for w in words]), max([w[2][2] for w in words]),
+            max([w[2][3] for w in words]))
+
+
+def page_xml(regions, page_id='synthetic', image_filename='synthetic.png'):
+
+    width, height = _page_size(regions)
+
+    out = ['<?xml version="1.0" encoding="UTF-8"?>',
+           '<pc:PcGts xmlns:pc="{}" pcGtsId="{}">'.format(PAGE_NAMESPACE, page_id),
+           '  <pc:Metadata><pc:Creator>synthetic</pc:Creator><pc:Created>2000-01-01T00:00:00</pc:Created>'
+           '<pc:LastChange>2000-01-01T00:00:00</pc:LastChange></pc:Metadata>',
+           '  <pc:Page imageFilename={} imageWidth="{}" imageHeight="{}">'.format(quoteattr(image_filename), width,
+                                                                                 height)]
+
+    for r, lines in enumerate(regions):
+        out.append('    <pc:TextRegion id="r{}">'.format(r))
+        out.append('      <pc:Coords points="{}"/>'.format(_points(*_bbox([w for words in lines for w in words]))))
+
+        for l, words in enumerate(lines):
+            out.append('      <pc:TextLine id="r{}_l{}">'.format(r, l))
+            out.append('        <pc:Coords points="{}"/>'.format(_points(*_bbox(words))))
+
+            for w, (text, conf, bbox) in enumerate(words):
+                out.append('        <pc:Word id="r{}_l{}_w{}"><pc:Coords points="{}"/>'
+                           '<pc:TextEquiv conf="{}"><pc:Unicode>{}</pc:Unicode></pc:TextEquiv></pc:Word>'.
+                           format(r, l, w, _points(*bbox), conf, escape(text)))
+
+            out.append('        <pc:TextEquiv conf="{}"><pc:Unicode>{}</pc:Unicode></pc:TextEquiv>'.
+                       format(min([w[1] for w in words]), escape(" ".join([w[0] for w in words]))))
+            out.append('      </pc:TextLine>')
+
+        out.append('    </pc:TextRegion>')
+
+    out += ['  </pc:Page>', '</pc:PcGts>', '']
+
+    return "\n".join(out)
+
+
+def alto_xml(pages):
+    """
+    A single ALTO file that contains all `pages` (see synthetic_page).
+    """
+    out = ['<?xml version="1.0" encoding="UTF-8"?>', '<alto xmlns="{}">'.format(ALTO_NAMESPACE), '  <Layout>']
+
+    for p, regions in enumerate(pages):
+        width, height = _page_size(regions)
+
+        out.append('    <Page ID="P{0}" PHYSICAL_IMG_NR="{0}" WIDTH="{1}" HEIGHT="{2}"><PrintSpace>'.
+                   format(p + 1, width, height))
+
+        for r, lines in enumerate(regions):
+            out.append('      <TextBlock ID="P{}_TB{}">'.format(p + 1, r))
+
+            for words in lines:
+                left, top, right, bottom = _bbox(words)
+                out.append('        <TextLine HPOS="{}" VPOS="{}" WIDTH="{}" HEIGHT="{}">'.
+                           format(left, top, right - left, bottom - top))
+
+                for w, (text, conf, (left, top, right, bottom)) in enumerate(words):
+                    if w > 0:
+                        out.append('          <SP WIDTH="{}"/>'.format(WORD_GAP))
+                    out.append('          <String CONTENT={} HPOS="{}" VPOS="{}" WIDTH="{}" HEIGHT="{}" WC="{}"/>'.
+                               format(quoteattr(text), left, top, right - left, bottom - top, conf))
+
+                out.append('        </TextLine>')
+
+            out.append('      </TextBlock>')
+
+        out.append('    </PrintSpace></Page>')
+
+    out += ['  </Layout>', '</alto>', '']
+
+    return "\n".join(out)
+
+
+def normalization_map():
+    """
+    Normalization table of PUA_CHARACTERS in the format of the --normalization-file of page2tsv.
+    """
+    import pandas as pd
+
+    return pd.DataFrame([(decimal, base, combining_character)
+                         for decimal, (base, combining_character) in PUA_CHARACTERS.items()],
+                        columns=['decimal', 'base', 'combining_character'])
+
+
+def generate_corpus(out_dir, num_pages, num_regions, num_lines, num_words, pua_rate=0.05):
+    """
+    Write `num_pages` PAGE-XML files page_NNNN.xml, a single ALTO file alto.xml with the same pages and the
+    normalization table normalization.pkl into `out_dir`. Returns the list of PAGE-XML files.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    pages = [synthetic_page(num_regions, num_lines, num_words, pua_rate, seed=n) for n in range(num_pages)]
+
+    page_files = []
+    for n, regions in enumerate(pages):
+        page_file = out_dir / 'page_{:04d}.xml'.format(n + 1)
+        page_file.write_text(page_xml(regions, page_id='page_{:04d}'.format(n + 1),
+                                      image_filename='page_{:04d}.png'.format(n + 1)), encoding='utf-8')
+        page_files.append(page_file)
+
+    (out_dir / 'alto.xml').write_text(alto_xml(pages), encoding='utf-8')
+
+    normalization_map().to_pickle(str(out_dir / 'normalization.pkl'))
+
+    return page_files
+
+
+@click.command()
+@click.argument('out-dir', type=click.Path(), required=True, nargs=1)
+@click.option('--pages', type=int, default=10, help='Number of pages. default: 10')
+@click.option('--regions', type=int, default=5, help='Regions per page. default: 5')
+@click.option('--lines', type=int, default=20, help='Lines per region. default: 20')
+@click.option('--words', type=int, default=10, help='Words per line. default: 10')
+@click.option('--pua-rate', type=float, default=0.05, help='Fraction of words with a private use character. '
+                                                           'default: 0.05')
+def main(out_dir, pages, regions, lines, words, pua_rate):
+
+    generate_corpus(out_dir, pages, regions, lines, words, pua_rate)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,488 @@
+import os
+import re
+import xml.etree.ElementTree as ElementTree
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from . import metrics
+from .doclinks import count_doc_links
+from .order import join_lines, reading_order
+from .writer import TSVWriter
+
+
+ALTO_NAMESPACES = [
+    '',
+    'http://schema.ccs-gmbh.com/ALTO',
+    'http://www.loc.gov/standards/alto/ns-v2#',
+    'http://www.loc.gov/standards/alto/ns-v3#',
+    'http://www.loc.gov/standards/alto/ns-v4#'
+]
+
+
+def alto_namespace(elem):
+    """
+    ALTO namespace of `elem` in '{...}' notation ('' for ALTO files without namespace).
+    """
+    ns = elem.tag[:elem.tag.index('}') + 1] if elem.tag.startswith('{') else ''
+
+    if ns[1:-1] not in ALTO_NAMESPACES:
+        raise RuntimeError("Unknown ALTO namespace: {}".format(ns))
+
+    return ns
+
+
+def _position(value):
+
+    try:
+        return int(value)
+    except ValueError:
+        # ALTO >= v3 allows float coordinates
+        return float(value)
+
+
+def _bbox(elem):
+
+    hpos, vpos, width, height = elem.get('HPOS'), elem.get('VPOS'), elem.get('WIDTH'), elem.get('HEIGHT')
+
+    try:
+        left, top = int(hpos), int(vpos)
+
+        return left, top, left + int(width), top + int(height)
+    except (TypeError, ValueError):
+        # missing or float coordinates
+        pass
+
+    left, top, right, bottom = -1, -1, -1, -1
+
+    if hpos is not None:
+        hpos = _position(hpos)
+        left = int(hpos)
+
+        if width is not None:
+            right = int(hpos + _position(width))
+
+    if vpos is not None:
+        vpos = _position(vpos)
+        top = int(vpos)
+
+        if height is not None:
+            bottom = int(vpos + _position(height))
+
+    return left, top, right, bottom
+
+
+def alto_iterate_textblocks(xml_file=None, root=None):
+
+    if root is None:
+        tree = ElementTree.parse(xml_file)
+        root = tree.getroot()
+
+    for idx, block_elem in enumerate(root.iter(alto_namespace(root) + 'TextBlock')):
+
+        id = str(idx)
+        if 'ID' in block_elem.attrib:
+            id = block_elem.attrib['ID']
+
+        yield id, block_elem
+
+
+def _iterparse(xml_file):
+    """
+    (namespace, ElementTree.iterparse 'end' events) of an ALTO file name or binary file object.
+    """
+    if hasattr(xml_file, 'read'):
+        _, root = next(ElementTree.iterparse(xml_file, events=('start',)))
+        xml_file.seek(0)
+    else:
+        with open(xml_file, 'rb') as f:
+            _, root = next(ElementTree.iterparse(f, events=('start',)))
+
+    return alto_namespace(root), ElementTree.iterparse(xml_file, events=('end',))
+
+
+def alto_iterparse_textblocks(xml_file):
+    """
+    Streaming counterpart of alto_iterate_textblocks that is based on ElementTree.iterparse. Each TextBlock is
+    cleared as soon as the next one is requested and each Page at its end, i.e., memory use does not grow with
+    the number of pages of the file.
+    """
+    ns, events = _iterparse(xml_file)
+    block_tag, page_tag = ns + 'TextBlock', ns + 'Page'
+
+    idx = 0
+    for _, elem in events:
+
+        if elem.tag == block_tag:
+            yield elem.get('ID', str(idx)), elem
+
+            idx += 1
+            elem.clear()
+
+        elif elem.tag == page_tag:
+            elem.clear()
+
+
+def alto_iterparse_pages(xml_file):
+    """
+    Streaming reader of multi-page ALTO files. Yields (page_id, page_no, blocks) per Page, where `blocks` are the
+    (id, element) pairs of its TextBlocks as in alto_iterate_textblocks. `page_no` is the PHYSICAL_IMG_NR of the
+    Page or, if missing, its position in the file (starting at 1). Each Page is cleared as soon as the next one
+    is requested.
+    """
+    ns, events = _iterparse(xml_file)
+    block_tag, page_tag = ns + 'TextBlock', ns + 'Page'
+
+    idx, num_pages = 0, 0
+    blocks = []
+    for _, elem in events:
+
+        if elem.tag == block_tag:
+            blocks.append((elem.get('ID', str(idx)), elem))
+            idx += 1
+
+        elif elem.tag == page_tag:
+            num_pages += 1
+
+            yield elem.get('ID', str(num_pages)), elem.get('PHYSICAL_IMG_NR', str(num_pages)), blocks
+
+            blocks = []
+            elem.clear()
+
+
+def alto_iterate_lines(root):
+
+    for idx, line_elem in enumerate(root.iter(alto_namespace(root) + 'TextLine')):
+
+        left, top, right, bottom = _bbox(line_elem)
+
+        yield line_elem, str(idx), left, right, top, bottom
+
+
+def alto_iterate_string_elements(root):
+
+    for string_elem in root.iter(alto_namespace(root) + 'String'):
+
+        if 'CONTENT' in string_elem.attrib:
+            content = string_elem.attrib['CONTENT']
+        else:
+            content = str(np.nan)
+
+        left, top, right, bottom = _bbox(string_elem)
+
+        yield unicodedata.normalize('NFC', content), left, top, right, bottom
+
+
+def alto_iterate_words(line_elem, ns=None):
+    """
+    Words of a TextLine: (content, left, top, right, bottom, wc) per String, where `wc` is the word confidence
+    (WC attribute) or None. As in alto_iterate_string_elements, only String elements make up the words, i.e., the
+    content of HYP elements is not part of the tokens.
+    """
+    if ns is None:
+        ns = alto_namespace(line_elem)
+
+    string_tag = ns + 'String'
+
+    words = []
+    for elem in line_elem:
+
+        if elem.tag == string_tag:
+            wc = elem.get('WC')
+
+            words.append((unicodedata.normalize('NFC', elem.get('CONTENT', str(np.nan))), *_bbox(elem),
+                          float(wc) if wc is not None else None))
+
+    return words
+
+
+def alto2tsv_columns(purpose):
+
+    if purpose == "NERD":
+        return ['No.', 'TOKEN', 'NE-TAG', 'NE-EMB', 'ID', 'url_id', 'left', 'right', 'top', 'bottom', 'conf']
+    elif purpose == "OCR":
+        return ['TEXT', 'url_id', 'left', 'right', 'top', 'bottom', 'conf', 'line_id']
+    else:
+        raise RuntimeError("Unknown purpose.")
+
+
+def alto_blocks_frame(blocks, purpose, url_id, scale_factor=1.0):
+    """
+    Convert the TextBlocks `blocks` ((id, element) pairs, see alto_iterate_textblocks) of an ALTO document into a
+    DataFrame with the columns of a neat TSV file (see alto2tsv_columns). All tokens are assigned to `url_id`.
+    """
+    out_columns = alto2tsv_columns(purpose)
+
+    tsv = []
+    line_info = []
+
+    with metrics.stage('parse'):
+        for region_idx, region in blocks:
+
+            ns = alto_namespace(region)
+
+            for line, _, l_left, l_right, l_top, l_bottom in alto_iterate_lines(region):
+
+                line_id = len(line_info)
+
+                words = alto_iterate_words(line, ns)
+
+                # line confidence: mean word confidence
+                wcs = [wc for _, _, _, _, _, wc in words if wc is not None]
+                conf = np.mean(wcs) if len(wcs) > 0 else np.nan
+
+                l_left, l_top, l_right, l_bottom = [int(scale_factor * x) for x in [l_left, l_top, l_right, l_bottom]]
+
+                line_info.append((url_id, l_left, l_right, l_top, l_bottom, conf, line_id))
+
+                for word, left, top, right, bottom, _ in words:
+
+                    word = word.strip()
+
+                    if len(word) == 0:
+                        continue
+
+                    if len(word.split()) > 1:
+                        print(word)
+                        continue
+
+                    if scale_factor != 1.0:
+                        left, top, right, bottom = [int(scale_factor * x) for x in [left, top, right, bottom]]
+
+                    tsv.append((region_idx, left + (right - left) / 2.0,
+                                word, url_id, left, right, top, bottom, line_id))
+
+    metrics.count('lines', len(line_info))
+    metrics.count('tokens', len(tsv))
+
+    with metrics.stage('reading_order'):
+        if len(tsv) == 0:
+            return pd.DataFrame([], columns=out_columns)
+
+        line_info = pd.DataFrame(line_info, columns=['url_id', 'left', 'right', 'top', 'bottom', 'conf', 'line_id'])
+
+        rid, hcenter, text, _, _, _, top, bottom, line_id = zip(*tsv)
+
+        order = reading_order(rid, line_id, hcenter, top, bottom)
+
+        if purpose == 'NERD':
+            tsv = pd.DataFrame([tsv[i][2:] for i in order],
+                               columns=['TOKEN', 'url_id', 'left', 'right', 'top', 'bottom', 'line_id'])
+            tsv['No.'] = 0
+            tsv['NE-TAG'] = 'O'
+            tsv['NE-EMB'] = 'O'
+            tsv['ID'] = '-'
+            tsv['conf'] = '-'
+
+        elif purpose == 'OCR':
+            lines, texts = join_lines(line_id, text, order)
+
+            tsv = line_info.iloc[lines].reset_index(drop=True)
+            tsv['TEXT'] = texts
+
+        return tsv[out_columns].reset_index(drop=True)
+
+
+def _open_alto(alto_xml_file):
+    """
+    ALTO files from the web (e.g. referenced by a METS file) are read into memory.
+    """
+    if re.match(r'https?://', str(alto_xml_file)) is None:
+        return alto_xml_file
+
+    import requests
+
+    resp = requests.get(alto_xml_file, timeout=60)
+    resp.raise_for_status()
+
+    return BytesIO(resp.content)
+
+
+def alto2tsv_frame(alto_xml_file, purpose, url_id, scale_factor=1.0):
+    """
+    Convert an ALTO file (or http(s) URL) as a whole into a DataFrame, see alto_blocks_frame.
+    """
+    with metrics.page(alto_xml_file):
+        return alto_blocks_frame(alto_iterparse_textblocks(_open_alto(alto_xml_file)), purpose, url_id,
+                                 scale_factor)
+
+
+def alto_page_frames(alto_xml_file, purpose, url_id, scale_factor=1.0):
+    """
+    Convert each Page of a multi-page ALTO file into its own DataFrame (see alto_blocks_frame) with consecutive
+    url_ids starting at `url_id`. Yields (page_id, page_no, frame), see alto_iterparse_pages.
+    """
+    for n, (page_id, page_no, blocks) in enumerate(alto_iterparse_pages(_open_alto(alto_xml_file))):
+
+        with metrics.page('{}#{}'.format(alto_xml_file, page_id)):
+            tsv = alto_blocks_frame(blocks, purpose, url_id + n, scale_factor)
+
+        yield page_id, page_no, tsv
+
+
+def read_mets(mets_file, alto_file_grp, image_file_grp=None, image_url='http://empty'):
+    """
+    Returns a list of (alto_file, image_url) jobs, one per physical page of `mets_file` that has a file in the
+    file group `alto_file_grp`, in the order of the physical structMap. Relative file locations are resolved
+    against the directory of `mets_file`.
+
+    The image URL of a page is the location of its file in `image_file_grp` if given. Otherwise, `image_url` with
+    the placeholders {{ page_id }}, {{ page_no }} (digits of the page id) and {{ file }} (file name stem of the
+    ALTO file) replaced.
+    """
+    # ocrd_models is only loaded in METS mode.
+    from ocrd_models import OcrdMets
+
+    mets = OcrdMets(filename=str(mets_file))
+    base_dir = os.path.dirname(str(mets_file))
+
+    def files(file_grp):
+        ret = {}
+        for f in mets.find_files(fileGrp=file_grp):
+            ret.setdefault(f.pageId, f)
+        return ret
+
+    def location(f):
+        loc = f.local_filename or f.url
+        if loc.startswith('file://'):
+            loc = loc[len('file://'):]
+        if re.match(r'https?://', loc) is None and not os.path.isabs(loc):
+            loc = os.path.join(base_dir, loc)
+        return loc
+
+    alto_files = files(alto_file_grp)
+    image_files = files(image_file_grp) if image_file_grp is not None else {}
+
+    jobs = []
+    for page_id in mets.physical_pages:
+
+        if page_id not in alto_files:
+            continue
+
+        alto_file = location(alto_files[page_id])
+
+        if page_id in image_files:
+            url = location(image_files[page_id])
+        else:
+            url = image_url.replace('{{ page_id }}', page_id).replace('{{ page_no }}', re.sub('[^0-9]', '', page_id)).\
+                replace('{{ file }}', Path(alto_file).stem)
+
+        jobs.append((alto_file, url))
+
+    return jobs
+
+
+def _write_parts(tsv_out_file, purpose, parts):
+    """
+    Append (image_url, frame) parts to `tsv_out_file`, a new file starts with the header line.
+    """
+    with TSVWriter(tsv_out_file, alto2tsv_columns(purpose)) as writer:
+
+        for image_url, tsv in parts:
+
+            with metrics.stage('write'):
+                writer.write_part(image_url, tsv)
+
+
+def _start_url_id(tsv_out_file, doc_index=False):
+    """
+    url_id of the next part of `tsv_out_file`.
+    """
+    return count_doc_links(tsv_out_file, use_index=doc_index) if os.path.exists(tsv_out_file) else 0
+
+
+def alto2tsv(alto_xml_file, tsv_out_file, purpose, image_url, ner_rest_endpoint, ned_rest_endpoint,
+             noproxy, scale_factor, ned_threshold, ned_priority, doc_index=False, annotation_cache=None,
+             split_pages=False, annotation_client=None):
+    """
+    `split_pages`: each Page of the ALTO file becomes a document part of its own. The placeholders
+    {{ page_id }} and {{ page_no }} in `image_url` are replaced per Page (see alto_page_frames).
+
+    NER/NED requests of all pages are made by `annotation_client` (annotate.AnnotationClient) if given, by a
+    client with `annotation_cache` otherwise. Pages whose annotation fails are written unannotated.
+    """
+    alto2tsv_columns(purpose)
+
+    if noproxy:
+        os.environ['no_proxy'] = '*'
+
+    url_id = _start_url_id(tsv_out_file, doc_index)
+
+    annotate = None
+    if purpose == 'NERD' and ner_rest_endpoint is not None:
+        from .annotate import AnnotationClient, annotate_frame
+
+        if annotation_client is None:
+            annotation_client = AnnotationClient(ner_rest_endpoint, ned_rest_endpoint, ned_threshold, ned_priority,
+                                                 cache=annotation_cache)
+
+        def annotate(tsv):
+            return annotate_frame(tsv, purpose, annotation_client)
+
+    def frames():
+        if split_pages:
+            for page_id, page_no, tsv in alto_page_frames(alto_xml_file, purpose, url_id, scale_factor):
+                yield image_url.replace('{{ page_id }}', page_id).replace('{{ page_no }}', page_no), tsv
+        else:
+            yield image_url, alto2tsv_frame(alto_xml_file, purpose, url_id, scale_factor)
+
+    # one page at a time: each page is annotated and written before the next one is parsed
+    parts = ((url, tsv if annotate is None else annotate(tsv)) for url, tsv in frames())
+
+    _write_parts(tsv_out_file, purpose, parts)
+
+
+def alto2tsv_mets(mets_file, tsv_out_file, purpose, alto_file_grp, image_file_grp, image_url, ner_rest_endpoint,
+                  ned_rest_endpoint, noproxy, scale_factor, ned_threshold, ned_priority, num_workers=1,
+                  annotation_cache=None):
+    """
+    Convert all pages of a METS file (see read_mets) into one multi-page TSV file. The pages get consecutive
+    url_ids in the order of the METS file. An existing `tsv_out_file` is continued.
+
+    The ALTO files are parsed by `num_workers` processes, the pages are annotated (annotate.AnnotationClient) and
+    written in order by the calling process. At most 4 * `num_workers` parsed pages wait for the writer.
+    """
+    alto2tsv_columns(purpose)
+
+    if noproxy:
+        os.environ['no_proxy'] = '*'
+
+    jobs = read_mets(mets_file, alto_file_grp, image_file_grp, image_url)
+
+    url_id = _start_url_id(tsv_out_file)
+
+    def frames(executor):
+        args = ([alto_file for alto_file, _ in jobs], [purpose] * len(jobs), range(url_id, url_id + len(jobs)),
+                [scale_factor] * len(jobs))
+
+        for (alto_file, _), tsv in zip(jobs, map(alto2tsv_frame, *args) if executor is None else
+                                       metrics.pool_map(executor, alto2tsv_frame, *args,
+                                                        max_pending=4 * num_workers)):
+            print("alto2tsv - processing file: {}".format(alto_file))
+
+            yield tsv
+
+    def annotated(executor):
+        if purpose == 'NERD' and ner_rest_endpoint is not None:
+            from .annotate import AnnotationClient
+
+            client = AnnotationClient(ner_rest_endpoint, ned_rest_endpoint, ned_threshold, ned_priority,
+                                      cache=annotation_cache)
+
+            for (alto_file, _), (tsv, error) in zip(jobs, client.annotate(frames(executor))):
+                if error is not None:
+                    print("alto2tsv - annotation failed for file {}: {}".format(alto_file, error))
+                yield tsv
+        else:
+            yield from frames(executor)
+
+    if num_workers <= 1 or len(jobs) <= 1:
+        _write_parts(tsv_out_file, purpose, zip([url for _, url in jobs], annotated(None)))
+        return
+
+    with ProcessPoolExecutor(max_workers=min(num_workers, len(jobs))) as executor:
+        _write_parts(tsv_out_file, purpose, zip([url for _, url in jobs], annotated(executor)))
@@ -0,0 +1,250 @@
+import json
+import time
+import unicodedata
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from qurator.utils.ned import ned
+
+from . import metrics
+
+
+def _ner_tokens(ner_result):
+
+    for sen in ner_result:
+
+        for token in sen:
+
+            yield unicodedata.normalize('NFC', token['word']), token['prediction'], False
+
+        yield '', '', True
+
+
+def align_ner_result(tsv, ner_tokens, drop_leading_breaks=False):
+    """
+    Retokenize the NERD frame `tsv` according to the NER result, i.e., the same alignment as qurator.utils.ner.ner.
+
+    `ner_tokens` (see _ner_tokens) is consumed as far as the tokens of `tsv` reach, such that consecutive pages
+    of a batch request can be aligned one after the other. The sentence break behind the last token of a page is
+    left in `ner_tokens`, i.e., for all but the first page of a batch `drop_leading_breaks` has to be set: sentence
+    breaks in front of the first token of the page are dropped, as the trailing one is if the page is annotated
+    on its own.
+    """
+    tsv_result = []
+    for row in tsv.itertuples():
+
+        row_token = unicodedata.normalize('NFC', str(row.TOKEN).replace(' ', ''))
+
+        ner_token_concat = ''
+        while row_token != ner_token_concat:
+
+            ner_token, ner_tag, sentence_break = next(ner_tokens)
+            ner_token_concat += ner_token
+
+            assert len(row_token) >= len(ner_token_concat)
+
+            if sentence_break:
+                if len(tsv_result) > 0 or not drop_leading_breaks:
+                    tsv_result.append((0, '', 'O', 'O', '-', row.url_id, row.left, row.right, row.top, row.bottom))
+            else:
+                tsv_result.append((0, ner_token, ner_tag, 'O', '-', row.url_id, row.left, row.right, row.top,
+                                   row.bottom))
+
+    return pd.DataFrame(tsv_result, columns=['No.', 'TOKEN', 'NE-TAG', 'NE-EMB', 'ID', 'url_id',
+                                             'left', 'right', 'top', 'bottom'])
+
+
+class AnnotationClient:
+    """
+    NER/NED annotation of NERD frames by the sbb_ner/sbb_ned REST services
+    (https://github.com/qurator-spk/sbb_ner, https://github.com/qurator-spk/sbb_ned).
+
+    All requests go through one pooled HTTP session. Failed requests (connection errors and 429/5xx responses)
+    are retried `max_retries` times with exponential backoff (`backoff` * 2^n seconds).
+
+    `batch_size` pages are sent to the services in one request and up to `num_workers` of these requests are
+    in flight at the same time. Note that the NER service sees the pages of a batch as one text, i.e., a
+    sentence may continue across a page boundary.
+
+    Service results are looked up in/stored to `cache` (cache.AnnotationCache) if given.
+    """
+
+    def __init__(self, ner_rest_endpoint, ned_rest_endpoint=None, ned_threshold=None, ned_priority=None,
+                 num_workers=1, batch_size=1, max_retries=3, backoff=0.5, timeout=None, cache=None):
+
+        self.ner_rest_endpoint = ner_rest_endpoint
+        self.ned_rest_endpoint = ned_rest_endpoint
+        self.ned_threshold = ned_threshold
+        self.ned_priority = ned_priority
+        self.num_workers = max(1, num_workers)
+        self.batch_size = max(1, batch_size)
+        self.timeout = timeout
+        self.cache = cache
+
+        retry = Retry(total=max_retries, backoff_factor=backoff, status_forcelist=[429, 500, 502, 503, 504],
+                      allowed_methods=None, raise_on_status=False)
+
+        adapter = HTTPAdapter(pool_connections=self.num_workers, pool_maxsize=self.num_workers, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _post(self, url, data):
+
+        start = time.perf_counter()
+        try:
+            resp = self.session.post(url=url, json=data, timeout=self.timeout)
+        finally:
+            metrics.observe_http(url.split('?')[0], time.perf_counter() - start)
+
+        resp.raise_for_status()
+
+        return resp.json()
+
+    def _cached(self, request, *key):
+        """
+        Result of `request` from the cache, if there is one, under the key of the hashed `key` parts.
+        """
+        if self.cache is None:
+            return request()
+
+        key = self.cache.key(*key)
+
+        value = self.cache.get(key)
+        if value is not None:
+            return json.loads(value)
+
+        result = request()
+
+        self.cache.put(key, json.dumps(result))
+
+        return result
+
+    def _ner_result(self, text):
+
+        return self._cached(lambda: self._post(self.ner_rest_endpoint, {'text': text}),
+                            'ner', self.ner_rest_endpoint, text)
+
+    def _ned_result(self, ner_result):
+
+        return self._cached(lambda: self._request_ned(ner_result),
+                            'ned', self.ned_rest_endpoint, self.ned_threshold, self.ned_priority, ner_result)
+
+    def _request_ned(self, ner_result):
+        """
+        Same requests as qurator.utils.ned.ned.
+        """
+        ner_parsed = self._post(self.ned_rest_endpoint + '/parse', ner_result)
+
+        ned_rest_endpoint = self.ned_rest_endpoint + '/ned?return_full=0'
+
+        if self.ned_priority is not None:
+            ned_rest_endpoint += "&priority=" + str(int(self.ned_priority))
+
+        if self.ned_threshold is not None:
+            ned_rest_endpoint += "&threshold=" + str(float(self.ned_threshold))
+
+        return self._post(ned_rest_endpoint, ner_parsed)
+
+    def annotate_batch(self, frames):
+        """
+        Annotate the NERD `frames` of consecutive pages by one NER (and NED) request.
+        Returns a list of (frame, error) pairs: the annotated frame and None or, if the requests failed,
+        the unannotated frame and the exception.
+        """
+        with metrics.stage('annotate'):
+            return self._annotate_batch(frames)
+
+    def _annotate_batch(self, frames):
+
+        texts = [" ".join(tsv.TOKEN.astype(str).tolist()) for tsv in frames if len(tsv) > 0]
+
+        if len(texts) == 0:
+            return [(tsv, None) for tsv in frames]
+
+        try:
+            ner_result = self._ner_result(" ".join(texts))
+
+            ned_result = self._ned_result(ner_result) if self.ned_rest_endpoint is not None else None
+
+        except requests.RequestException as e:
+            return [(tsv, e) for tsv in frames]
+
+        ner_tokens = _ner_tokens(ner_result)
+
+        ret = []
+        first = True
+        for tsv in frames:
+            if len(tsv) == 0:
+                ret.append((tsv, None))
+                continue
+
+            tsv = align_ner_result(tsv, ner_tokens, drop_leading_breaks=not first)
+            first = False
+
+            if ned_result is not None:
+                tsv, _ = ned(tsv, ner_result, self.ned_rest_endpoint, threshold=self.ned_threshold,
+                             priority=self.ned_priority, ned_result=ned_result)
+
+            ret.append((tsv, None))
+
+        return ret
+
+    def annotate(self, frames):
+        """
+        Annotate an iterable of NERD frames. Yields (frame, error) pairs (see annotate_batch) in order of `frames`.
+
+        `frames` is consumed lazily, i.e., the next pages can be produced while the requests for the previous
+        ones are still pending.
+        """
+
+        def batches():
+            batch = []
+            for tsv in frames:
+                batch.append(tsv)
+                if len(batch) >= self.batch_size:
+                    yield batch
+                    batch = []
+            if len(batch) > 0:
+                yield batch
+
+        if self.num_workers <= 1:
+            for batch in batches():
+                yield from self.annotate_batch(batch)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            pending = deque()
+            for batch in batches():
+                pending.append(executor.submit(self.annotate_batch, batch))
+
+                if len(pending) > self.num_workers:
+                    yield from pending.popleft().result()
+
+            while len(pending) > 0:
+                yield from pending.popleft().result()
+
+
+def annotate_frame(tsv, purpose, client):
+    """
+    NER and, if the `client` (AnnotationClient, None: no annotation) has a NED endpoint, NED of a NERD frame.
+    The caller keeps the client for all pages, i.e., the HTTP connections and the cache are shared across pages.
+
+    If the requests fail, the error is printed and `tsv` is returned unannotated. Note that page2tsv/alto2tsv used
+    to drop the rows of such a page and to write only its '# <url>' line.
+    """
+    if purpose != 'NERD' or client is None or len(tsv) == 0:
+        return tsv
+
+    [(tsv, error)] = client.annotate_batch([tsv])
+
+    if error is not None:
+        print(error)
+
+    return tsv
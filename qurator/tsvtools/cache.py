@@ -0,0 +1,126 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+class AnnotationCache:
+    """
+    On-disk cache of NER/NED service results (SQLite).
+
+    Entries are addressed by a hash of everything that determines a result (see key), i.e., the token sequence,
+    the endpoint and the NED parameters. If the cached results exceed `max_size` bytes, the least recently used
+    entries are evicted.
+
+    The total size of the entries is read once at open and then kept up to date by put. The last use times of
+    cache hits are written in batches of `touch_interval` hits (and by put, stats and close), i.e., a hit does not
+    cost a commit.
+
+    The cache can be shared by the threads of an annotate.AnnotationClient.
+    """
+
+    def __init__(self, filename, max_size=1024 * 1024 * 1024, touch_interval=100):
+
+        self.filename = filename
+        self.max_size = max_size
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(filename, timeout=60, check_same_thread=False)
+        self._con.execute('CREATE TABLE IF NOT EXISTS entries '
+                          '(key TEXT PRIMARY KEY, value TEXT, size INTEGER, last_used REAL)')
+        self._con.execute('CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)')
+        self._con.commit()
+
+        self._size = self._con.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        self._touched = {}
+
+    @staticmethod
+    def key(*parts):
+        """
+        Hash of the JSON representation of `parts`.
+        """
+        return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Cached value of `key` or None.
+        """
+        with self._lock:
+            row = self._con.execute('SELECT value FROM entries WHERE key = ?', (key,)).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._touched[key] = time.time()
+
+            if len(self._touched) >= self.touch_interval:
+                self._write_touched()
+                self._con.commit()
+
+        return row[0]
+
+    def _write_touched(self):
+
+        self._con.executemany('UPDATE entries SET last_used = ? WHERE key = ?',
+                              [(last_used, key) for key, last_used in self._touched.items()])
+        self._touched = {}
+
+    def put(self, key, value):
+
+        size = len(value.encode('utf-8'))
+
+        with self._lock:
+            row = self._con.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+
+            self._touched.pop(key, None)
+            self._write_touched()
+
+            self._con.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)', (key, value, size, time.time()))
+            self._size += size - (0 if row is None else row[0])
+
+            if self._size > self.max_size:
+                self._evict()
+
+            self._con.commit()
+
+    def _evict(self):
+
+        evict = []
+        for key, size in self._con.execute('SELECT key, size FROM entries ORDER BY last_used'):
+            if self._size <= self.max_size:
+                break
+            evict.append((key,))
+            self._size -= size
+
+        self._con.executemany('DELETE FROM entries WHERE key = ?', evict)
+
+    def stats(self):
+
+        with self._lock:
+            self._write_touched()
+            self._con.commit()
+
+            entries = self._con.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'size': self._size}
+
+    def print_stats(self):
+
+        stats = self.stats()
+
+        print("annotation cache {}: {} hits, {} misses, {} entries ({} bytes)".
+              format(self.filename, stats['hits'], stats['misses'], stats['entries'], stats['size']))
+
+    def close(self):
+
+        with self._lock:
+            self._write_touched()
+            self._con.commit()
+
+        self._con.close()
@@ -1,257 +1,104 @@
-import glob
-import re
-import os
-from io import StringIO
-from pathlib import Path
+import importlib
+from contextlib import contextmanager
+from functools import wraps
 
-import numpy as np
 import click
-import pandas as pd
-import requests
-from lxml import etree as ET
 
-import xml.etree.ElementTree as ElementTree
-import unicodedata
+# The command line tools only import click at startup. Everything else (pandas, lxml, ocrd_models, the NER/NED
+# clients, ...) is imported by the modules that implement the commands, i.e., when a command actually runs.
 
-from ocrd_models.ocrd_page import parse
-from ocrd_utils import bbox_from_points
+# Functions that used to be defined in this module, resolved on first access for backward compatibility.
+_MOVED = {
+    'alto_iterate_textblocks': 'alto', 'alto_iterate_lines': 'alto', 'alto_iterate_string_elements': 'alto',
+    'alto2tsv': 'alto',
+    'annotate_frame': 'annotate',
+    'PRIVATE_USE_PATTERN': 'normalize', 'compile_normalization_map': 'normalize', 'unicode_normalize': 'normalize',
+    'page2tsv_columns': 'page', 'load_normalizer': 'page', 'page2tsv_frame': 'page', 'page2tsv': 'page',
+    'read_batch_manifest': 'page', 'page2tsv_batch': 'page',
+    'tsv2page': 'merge',
+}
 
-from qurator.utils.tsv import read_tsv, write_tsv, extract_doc_links
-from .ocr import get_conf_color
 
-from qurator.utils.ner import ner
-from qurator.utils.ned import ned
+def __getattr__(name):
 
+    if name not in _MOVED:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
-@click.command()
-@click.argument('tsv-file', type=click.Path(exists=True), required=True, nargs=1)
-@click.argument('url-file', type=click.Path(exists=False), required=True, nargs=1)
-def extract_document_links(tsv_file, url_file):
-
-    parts = extract_doc_links(tsv_file)
-
-    urls = [part['url'] for part in parts]
-
-    urls = pd.DataFrame(urls, columns=['url'])
-
-    urls.to_csv(url_file, sep="\t", quoting=3, index=False)
-
-
-@click.command()
-@click.argument('tsv-file', type=click.Path(exists=True), required=True, nargs=1)
-@click.argument('annotated-tsv-file', type=click.Path(exists=False), required=True, nargs=1)
-def annotate_tsv(tsv_file, annotated_tsv_file):
-
-    parts = extract_doc_links(tsv_file)
-
-    annotated_parts = []
-
-    for part in parts:
-
-        part_data = StringIO(part['header'] + part['text'])
-
-        df = pd.read_csv(part_data, sep="\t", comment='#', quoting=3)
-
-        df['url_id'] = len(annotated_parts)
-
-        annotated_parts.append(df)
-
-    df = pd.concat(annotated_parts)
-
-    df.to_csv(annotated_tsv_file, sep="\t", quoting=3, index=False)
-
-
-def alto_iterate_textblocks(xml_file=None, root=None):
-
-    if root is None:
-        tree = ElementTree.parse(xml_file)
-        root = tree.getroot()
-
-    for idx, block_elem in enumerate(root.iter('{http://www.loc.gov/standards/alto/ns-v2#}TextBlock')):
-
-        id = str(idx)
-        if 'ID' in block_elem.attrib:
-            id = block_elem.attrib['ID']
-
-        yield id, block_elem
-
-
-def alto_iterate_lines(root):
-
-    for idx, line_elem in enumerate(root.iter('{http://www.loc.gov/standards/alto/ns-v2#}TextLine')):
-
-        left, top, right, bottom = -1, -1, -1, -1
-
-        if 'HPOS' in line_elem.attrib:
-            left = int(line_elem.attrib['HPOS'])
-
-        if 'VPOS' in line_elem.attrib:
-            top = int(line_elem.attrib['VPOS'])
-
-        if 'HPOS' in line_elem.attrib and 'WIDTH' in line_elem.attrib:
-            right = int(line_elem.attrib['HPOS']) + int(line_elem.attrib['WIDTH'])
-
-        if 'VPOS' in line_elem.attrib and 'HEIGHT' in line_elem.attrib:
-            bottom = int(line_elem.attrib['VPOS']) + int(line_elem.attrib['HEIGHT'])
-
-        yield line_elem, str(idx), left, right, top, bottom
-
-
-def alto_iterate_string_elements(root):
-
-    for string_elem in root.iter('{http://www.loc.gov/standards/alto/ns-v2#}String'):
-
-        if 'CONTENT' in string_elem.attrib:
-            content = string_elem.attrib['CONTENT']
-        else:
-            content = str(np.NAN)
-
-        left, top, right, bottom = -1, -1, -1, -1
-
-        if 'HPOS' in string_elem.attrib:
-            left = int(string_elem.attrib['HPOS'])
-
-        if 'VPOS' in string_elem.attrib:
-            top = int(string_elem.attrib['VPOS'])
-
-        if 'HPOS' in string_elem.attrib and 'WIDTH' in string_elem.attrib:
-            right = int(string_elem.attrib['HPOS']) + int(string_elem.attrib['WIDTH'])
-
-        if 'VPOS' in string_elem.attrib and 'HEIGHT' in string_elem.attrib:
-            bottom = int(string_elem.attrib['VPOS']) + int(string_elem.attrib['HEIGHT'])
-
-        yield unicodedata.normalize('NFC', content), left, top, right, bottom
-
+    return getattr(importlib.import_module('.' + _MOVED[name], __package__), name)
 
-def alto2tsv(alto_xml_file, tsv_out_file, purpose, image_url, ner_rest_endpoint, ned_rest_endpoint,
-             noproxy, scale_factor, ned_threshold, ned_priority):
-    if purpose == "NERD":
-        out_columns = ['No.', 'TOKEN', 'NE-TAG', 'NE-EMB', 'ID', 'url_id', 'left', 'right', 'top', 'bottom', 'conf']
-    elif purpose == "OCR":
-        out_columns = ['TEXT', 'url_id', 'left', 'right', 'top', 'bottom', 'conf', 'line_id']
 
-    else:
-        raise RuntimeError("Unknown purpose.")
-
-    if noproxy:
-        os.environ['no_proxy'] = '*'
-
-    urls = []
-    if os.path.exists(tsv_out_file):
-        parts = extract_doc_links(tsv_out_file)
-        urls = [part['url'] for part in parts]
-    else:
-        pd.DataFrame([], columns=out_columns).to_csv(tsv_out_file, sep="\t", quoting=3, index=False)
-
-    tsv = []
-    line_info = []
-
-    for region_idx, region in alto_iterate_textblocks(alto_xml_file):
-
-        for line, _, l_left, l_right, l_top, l_bottom in alto_iterate_lines(region):
-
-            line_id = len(line_info)
-
-            line_info.append((len(urls), l_left, l_right, l_top, l_bottom, line_id))
-
-            for word_num, (word, left, top, right, bottom) in enumerate(alto_iterate_string_elements(line)):
-
-                word = word.strip()
-
-                if len(word) == 0:
-                    continue
-
-                if len(word.split()) > 1:
-                    print(word)
-                    continue
-
-                left, top, right, bottom = [int(scale_factor * x) for x in [left, top, right, bottom]]
-
-                tsv.append((region_idx, left + (right - left) / 2.0,
-                            word, len(urls), left, right, top, bottom, line_id))
-
-    line_info = pd.DataFrame(line_info, columns=['url_id', 'left', 'right', 'top', 'bottom', 'line_id'])
-
-    tsv = pd.DataFrame(tsv, columns=['rid', 'hcenter'] +
-                                    ['TEXT', 'url_id', 'left', 'right', 'top', 'bottom', 'line_id'])
-
-    with open(tsv_out_file, 'a') as f:
-        f.write('# ' + image_url + '\n')
-
-    if len(tsv) == 0:
+@contextmanager
+def open_annotation_cache(filename, size):
+    """
+    cache.AnnotationCache of the --annotation-cache options (None if no file is given). The hit/miss statistics
+    are printed at exit.
+    """
+    if filename is None:
+        yield None
         return
 
-    vlinecenter = pd.DataFrame(tsv[['line_id', 'top']].groupby('line_id', sort=False).mean().top +
-                               (tsv[['line_id', 'bottom']].groupby('line_id', sort=False).mean().bottom -
-                                tsv[['line_id', 'top']].groupby('line_id', sort=False).mean().top) / 2,
-                               columns=['vlinecenter'])
+    from .cache import AnnotationCache
 
-    tsv = tsv.merge(vlinecenter, left_on='line_id', right_index=True)
+    cache = AnnotationCache(filename, size * 1024 * 1024)
+    try:
+        yield cache
+    finally:
+        cache.print_stats()
+        cache.close()
 
-    regions = [region.sort_values(['vlinecenter', 'hcenter']) for rid, region in tsv.groupby('rid', sort=False)]
-    tsv = pd.concat(regions)
 
-    if purpose == 'NERD':
-        tsv['No.'] = 0
-        tsv['NE-TAG'] = 'O'
-        tsv['NE-EMB'] = 'O'
-        tsv['ID'] = '-'
-        tsv['conf'] = '-'
-        tsv = tsv.rename(columns={'TEXT': 'TOKEN'})
+def metrics_options(command):
+    """
+    Adds the --metrics-file, --metrics-format and --profile options to `command`, which then runs in a
+    metrics.session.
+    """
+    @wraps(command)
+    def wrapper(*args, metrics_file, metrics_format, profile, **kwargs):
+        from .metrics import session
 
-    elif purpose == 'OCR':
-        tsv = pd.DataFrame([(line_id, " ".join(part.TEXT.to_list())) for line_id, part in tsv.groupby('line_id')],
-                           columns=['line_id', 'TEXT'])
-        tsv = tsv.merge(line_info, left_on='line_id', right_index=True)
-    tsv = tsv[out_columns].reset_index(drop=True)
+        with session(metrics_file, metrics_format, profile):
+            return command(*args, **kwargs)
 
-    try:
-        if purpose == 'NERD' and ner_rest_endpoint is not None:
-            tsv, ner_result = ner(tsv, ner_rest_endpoint)
-            if ned_rest_endpoint is not None:
-                tsv, _ = ned(tsv, ner_result, ned_rest_endpoint, threshold=ned_threshold, priority=ned_priority)
+    options = [click.option('--metrics-file', type=click.Path(), default=None,
+                            help="Write wall time per page and processing stage, token/line counts and NER/NED "
+                                 "request latencies to this file."),
+               click.option('--metrics-format', type=click.Choice(['jsonl', 'prometheus']), default=None,
+                            help="--metrics-file: JSON lines (one line per page and a summary line) or Prometheus "
+                                 "textfile format. default: prometheus for *.prom files, jsonl otherwise."),
+               click.option('--profile', type=click.Path(), default=None,
+                            help="Run under cProfile and write the statistics (pstats format) to this file.")]
 
-        tsv.to_csv(tsv_out_file, sep="\t", quoting=3, index=False, mode='a', header=False)
-    except requests.HTTPError as e:
-        print(e)
+    for option in reversed(options):
+        wrapper = option(wrapper)
 
+    return wrapper
 
-def unicode_normalize(text, normalization_map=None, use_combining_characters=True):
 
-    if normalization_map is None:
-        ret = "".join([c if unicodedata.category(c) != "Co" else '' for c in text])
+def write_parquet_sidecar(tsv_file):
+    """
+    Converts the whole `tsv_file`, i.e., it is called once per run (--batch, --mets) and not per appended page.
+    """
+    from .parquet import parquet_sidecar_file, tsv2parquet
 
-        if ret != text:
-            print("Warning: Due to unicode normalization possible loss of information: "
-                  "{} => {} (normalization file missing?)".format(text, ret))
+    tsv2parquet(tsv_file, parquet_sidecar_file(tsv_file))
 
-    elif use_combining_characters:
-        ret = "".join([c if unicodedata.category(c) != "Co" else
-                        "{}{}".format(normalization_map.loc[ord(c)].base,
-                                      chr(int(normalization_map.loc[ord(c)].combining_character, base=16))
-                                      if normalization_map.loc[ord(c)].combining_character != '' else '')
-                        if ord(c) in normalization_map.index else '' for c in text])
 
-        # do it again since the normalization map may again contain unicode private use chars
-        ret = "".join([c if unicodedata.category(c) != "Co" else '' for c in ret])
+@click.command()
+@click.argument('tsv-file', type=click.Path(exists=True), required=True, nargs=1)
+@click.argument('url-file', type=click.Path(exists=False), required=True, nargs=1)
+def extract_document_links(tsv_file, url_file):
+    from .tsv import extract_document_links
 
-        if ret != text:
-            print("Warning: Due to unicode normalization possible loss of information: "
-                  "{} => {}".format(text, ret))
-    else:
-        ret = "".join([c if unicodedata.category(c) != "Co" else
-                       normalization_map.loc[ord(c)].base
-                       if ord(c) in normalization_map.index else ''
-                       for c in text])
+    extract_document_links(tsv_file, url_file)
 
-        # do it again since the normalization map may again contain unicode private use chars
-        ret = "".join([c if unicodedata.category(c) != "Co" else '' for c in ret])
 
-        if ret != text:
-            print("Warning: Due to unicode normalization possible loss of information: "
-                  "{} => {}".format(text, ret))
+@click.command()
+@click.argument('tsv-file', type=click.Path(exists=True), required=True, nargs=1)
+@click.argument('annotated-tsv-file', type=click.Path(exists=False), required=True, nargs=1)
+def annotate_tsv(tsv_file, annotated_tsv_file):
+    from .tsv import annotate_tsv
 
-    return unicodedata.normalize('NFC', ret)
+    annotate_tsv(tsv_file, annotated_tsv_file)
 
 
 @click.command()
@@ -270,259 +117,69 @@ def unicode_normalize(text, normalization_map=None, use_combining_characters=Tru
 @click.option('--just-zero', type=bool, is_flag=True, help='Process only files that have max sentence length zero,'
                                                            'i.e., that do not have sentence splitting.')
 @click.option('--sanitize-sentence-numbers', type=bool, is_flag=True, help='Sanitize sentence numbering.')
+@click.option('--legacy-sanitize', type=bool, is_flag=True,
+              help='Use the old row by row implementation of --sanitize-sentence-numbers (for comparison).')
 @click.option('--show-columns', type=bool, is_flag=True, help='Show TSV columns.')
 @click.option('--drop-column', type=str, multiple=True, default=[], help="Drop column")
+@click.option('--stream', type=bool, is_flag=True,
+              help="Process and write the file one document part (# <url> section) after the other. Memory use is "
+                   "then bounded by the largest part. NER is performed per part. Parquet input is always read as a "
+                   "whole.")
+@click.option('--annotation-cache', type=click.Path(), default=None,
+              help="SQLite file that caches the results of the NER/NED services. Unchanged pages are not sent "
+                   "again.")
+@click.option('--annotation-cache-size', type=int, default=1024,
+              help="Maximum size of --annotation-cache in MB. Least recently used results are evicted. default: 1024.")
+@metrics_options
 def tsv2tsv(tsv_in_file, tsv_out_file, ner_rest_endpoint, noproxy,
             num_tokens, sentence_count, max_sentence_len, keep_tokenization, sentence_split_only,
-            show_urls, just_zero, sanitize_sentence_numbers, show_columns, drop_column):
-
-    if noproxy:
-        os.environ['no_proxy'] = '*'
-
-    keep_tokenization = keep_tokenization or sentence_split_only
-
-    tsv, urls, contexts = read_tsv(tsv_in_file)
-
-    tsv.loc[tsv.TOKEN.isnull(), 'TOKEN'] = ""
-
-    print("Input file: {}".format(tsv_in_file))
-
-    if show_urls:
-        if urls is None or len(urls) == 0:
-            print("URLS missing!")
-        else:
-            print("URLS:{}".format(urls))
-
-    if show_columns:
-        print("Columns: ", " ".join([ c for c in tsv.columns]))
-
-    if tsv['No.'].max() > 0 and just_zero:
-
-        print("File {} already has sentence splitting (--just-zero). Skipping.".format(tsv_in_file))
-        return
-
-    if num_tokens:
-        print("Number of tokens {}". format(len(tsv)), end=" ")
-
-    if sentence_count:
-        print("Number of sentences {}". format(sum(tsv['No.'] == 0)), end=" ")
-
-    if max_sentence_len:
-        print("Maximum sentence length {}.".format(tsv['No.'].max()), end=" ")
-
-    if ner_rest_endpoint is None:
-        tsv_tmp = tsv
-    else:
-        tsv_tmp, _ = ner(tsv, ner_rest_endpoint, keep_tokenization=keep_tokenization)
-
-    if tsv_out_file is None:
-        print("\n")
-        return
+            show_urls, just_zero, sanitize_sentence_numbers, legacy_sanitize, show_columns, drop_column, stream,
+            annotation_cache, annotation_cache_size):
+    from .tsv import tsv2tsv
 
-    print("\n==>")
+    with open_annotation_cache(annotation_cache, annotation_cache_size) as cache:
+        tsv2tsv(tsv_in_file, tsv_out_file, ner_rest_endpoint, noproxy,
+                num_tokens, sentence_count, max_sentence_len, keep_tokenization, sentence_split_only,
+                show_urls, just_zero, sanitize_sentence_numbers, show_columns, drop_column, cache,
+                legacy_sanitize, stream)
 
-    print("Output file: {}".format(tsv_out_file))
 
-    if num_tokens:
-        print("Number of tokens {}". format(len(tsv_tmp)), end=" ")
-
-    if sentence_count:
-        print("Number of sentences {}". format(sum(tsv_tmp['No.'] == 0)), end=" ")
-
-    if max_sentence_len:
-        print("Maximum sentence length {}.".format(tsv_tmp['No.'].max()), end=" ")
-
-    num_diff = -1
-    if keep_tokenization:
-        num_diff = sum(tsv.TOKEN != tsv_tmp.TOKEN)
-
-    if keep_tokenization and num_diff > 0:
-        print("Number of token differences: {}".format(num_diff))
-        raise AssertionError()
-
-        # diff = pd.concat([tsv.loc[tsv.TOKEN != tsv_tmp.TOKEN],
-        #                  tsv_tmp[['TOKEN']].loc[tsv.TOKEN != tsv_tmp.TOKEN].
-        #                  rename(columns={'TOKEN': 'TOKEN_TMP'})], axis=1)
-        #
-        # import ipdb;ipdb.set_trace()
-
-    if sentence_split_only:
-        tsv_out = tsv
-        tsv_out['No.'] = tsv_tmp['No.']
-    else:
-        tsv_out = tsv_tmp
-
-    if sanitize_sentence_numbers:
-
-        word_pos = 0
-        prev_pos = 0
-        for idx, _ in tsv_out.iterrows():
-
-            if prev_pos != 0 and not str(tsv_out.loc[idx, 'NE-TAG']).startswith('I-') and  \
-                    tsv_out.loc[idx, 'No.'] == 0 or len(tsv_out.loc[idx, 'TOKEN']) == 0:
-                word_pos = 0
-
-            prev_pos = word_pos
-
-            tsv_out.loc[idx, 'No.'] = word_pos
-
-            word_pos += 1
-
-    tsv_out = tsv_out.drop(columns=[dc for dc in drop_column if dc in tsv_out.columns])
-
-    write_tsv(tsv_out, urls, contexts, tsv_out_file)
-
-    print("\n")
-
-
-def page2tsv(page_xml_file, tsv_out_file, purpose, image_url, ner_rest_endpoint, ned_rest_endpoint,
-             noproxy, scale_factor, ned_threshold, min_confidence, max_confidence, ned_priority, normalization_file):
-
-    print("page2tsv - processing file: {}".format(page_xml_file))
-
-    if purpose == "NERD":
-        out_columns = ['No.', 'TOKEN', 'NE-TAG', 'NE-EMB', 'ID', 'url_id', 'left', 'right', 'top', 'bottom', 'conf']
-    elif purpose == "OCR":
-        out_columns = ['TEXT', 'url_id', 'left', 'right', 'top', 'bottom', 'conf', 'line_id']
-        if min_confidence is not None and max_confidence is not None:
-            out_columns += ['ocrconf']
-    else:
-        raise RuntimeError("Unknown purpose.")
-
-    if noproxy:
-        os.environ['no_proxy'] = '*'
-
-    urls = []
-    if os.path.exists(tsv_out_file):
-        parts = extract_doc_links(tsv_out_file)
-        urls = [part['url'] for part in parts]
-    else:
-        pd.DataFrame([], columns=out_columns).to_csv(tsv_out_file, sep="\t", quoting=3, index=False)
-
-    pcgts = parse(page_xml_file)
-    tsv = []
-    line_info = []
-
-    _unicode_normalize = unicode_normalize
-
-    if normalization_file is not None:
-        normalization_map = pd.read_pickle(normalization_file)
-
-        normalization_map = normalization_map.set_index('decimal')
-
-        _unicode_normalize = lambda s: unicode_normalize(s, normalization_map=normalization_map)
-
-    for region_idx, region in enumerate(pcgts.get_Page().get_AllRegions(classes=['Text'], order='reading-order')):
-        for text_line in region.get_TextLine():
-            left, top, right, bottom = [int(scale_factor * x) for x in bbox_from_points(text_line.get_Coords().points)]
-
-            if min_confidence is not None and max_confidence is not None:
-                conf = np.max([textequiv.conf for textequiv in text_line.get_TextEquiv()])
-            else:
-                conf = np.nan
-
-            line_info.append((len(urls), left, right, top, bottom, conf, text_line.id))
-
-            words = [word for word in text_line.get_Word()]
-
-            if len(words) <= 0:
-                for text_equiv in text_line.get_TextEquiv():
-                    # transform OCR coordinates using `scale_factor` to derive
-                    # correct coordinates for the web presentation image
-                    left, top, right, bottom = [int(scale_factor * x) for x in bbox_from_points(text_line.get_Coords().points)]
-
-                    text = text_equiv.get_Unicode()
-
-                    for text_part in text.split(" "):
-
-                        tsv.append((region_idx, len(line_info) - 1, left + (right - left) / 2.0,
-                                    _unicode_normalize(text_part), len(urls), left, right, top, bottom, text_line.id))
-            else:
-                for word in words:
-                    # XXX TODO make this configurable
-                    textequiv = ''
-                    list_textequivs = word.get_TextEquiv()
-                    if list_textequivs:
-                        textequiv = list_textequivs[0].get_Unicode()
-                    # transform OCR coordinates using `scale_factor` to derive
-                    # correct coordinates for the web presentation image
-                    left, top, right, bottom = [int(scale_factor * x) for x in bbox_from_points(word.get_Coords().points)]
-                    tsv.append((region_idx, len(line_info) - 1, left + (right - left) / 2.0,
-                                _unicode_normalize(textequiv), len(urls), left, right, top, bottom, text_line.id))
-
-    line_info = pd.DataFrame(line_info, columns=['url_id', 'left', 'right', 'top', 'bottom', 'conf', 'line_id'])
-
-    if min_confidence is not None and max_confidence is not None:
-        line_info['ocrconf'] = line_info.conf.map(lambda x: get_conf_color(x, min_confidence, max_confidence))
-
-    tsv = pd.DataFrame(tsv, columns=['rid', 'line', 'hcenter'] +
-                                    ['TEXT', 'url_id', 'left', 'right', 'top', 'bottom', 'line_id'])
-
-    # print(tsv)
-    with open(tsv_out_file, 'a') as f:
-        f.write('# ' + image_url + '\n')
+@click.command()
+@click.option('--output-filename', '-o', help="Output filename. "
+                                              "If omitted, PAGE-XML filename with .corrected.xml extension. "
+                                              "Only applicable for a single PAGE_FILE TSV_FILE pair.")
+@click.option('--keep-words', '-k', is_flag=True, help="Keep (out-of-date) Words of TextLines")
+@click.option('--word-level', '-w', is_flag=True,
+              help="Update the Words of the TextLines in place: NERD TSV tokens are mapped onto the Words by their "
+                   "coordinates, the tokens of OCR TSV lines onto the Words of the line in order.")
+@click.option('--scale-factor', type=float, default=1.0,
+              help="--word-level: --scale-factor of page2tsv that produced the TSV coordinates. default: 1.0")
+@click.option('--delta', is_flag=True,
+              help="Only touch the TextLines whose text differs from the TSV. Pages without changes are hardlinked "
+                   "instead of written.")
+@click.option('--change-report', type=click.Path(), default=None,
+              help="Write the number of changed pages and lines (per page and in total) as JSON to this file.")
+@click.argument('page-and-tsv-files', nargs=-1, required=True)
+@metrics_options
+def tsv2page_cli(output_filename, keep_words, word_level, scale_factor, delta, change_report, page_and_tsv_files):
+    """
+    Merge the TEXT of neat TSV files back into the TextLines of the corresponding PAGE-XML files.
 
-    if len(tsv) == 0:
-        return
+    PAGE_AND_TSV_FILES: One or more pairs PAGE_FILE TSV_FILE.
+    """
+    if len(page_and_tsv_files) % 2 != 0:
+        raise click.UsageError("Expected pairs of PAGE_FILE TSV_FILE.")
 
-    vlinecenter = pd.DataFrame(tsv[['line', 'top']].groupby('line', sort=False).mean().top +
-                               (tsv[['line', 'bottom']].groupby('line', sort=False).mean().bottom -
-                                tsv[['line', 'top']].groupby('line', sort=False).mean().top) / 2,
-                               columns=['vlinecenter'])
-
-    tsv = tsv.merge(vlinecenter, left_on='line', right_index=True)
-    regions = [region.sort_values(['vlinecenter', 'hcenter']) for rid, region in tsv.groupby('rid', sort=False)]
-    tsv = pd.concat(regions)
-
-    if purpose == 'NERD':
-        tsv['No.'] = 0
-        tsv['NE-TAG'] = 'O'
-        tsv['NE-EMB'] = 'O'
-        tsv['ID'] = '-'
-        tsv['conf'] = '-'
-        tsv = tsv.rename(columns={'TEXT': 'TOKEN'})
-
-    elif purpose == 'OCR':
-        tsv = pd.DataFrame([(line, " ".join(part.TEXT.to_list())) for line, part in tsv.groupby('line')],
-                           columns=['line', 'TEXT'])
-        tsv = tsv.merge(line_info, left_on='line', right_index=True)
-    tsv = tsv[out_columns].reset_index(drop=True)
+    if output_filename and len(page_and_tsv_files) > 2:
+        raise click.UsageError("--output-filename requires a single PAGE_FILE TSV_FILE pair.")
 
-    try:
-        if purpose == 'NERD' and ner_rest_endpoint is not None:
-            tsv, ner_result = ner(tsv, ner_rest_endpoint)
-            if ned_rest_endpoint is not None:
-                tsv, _ = ned(tsv, ner_result, ned_rest_endpoint, threshold=ned_threshold, priority=ned_priority)
-
-        tsv.to_csv(tsv_out_file, sep="\t", quoting=3, index=False, mode='a', header=False, encoding='utf-8')
-    except requests.HTTPError as e:
-        print(e)
-
-
-def tsv2page(output_filename, keep_words, page_file, tsv_file):
-    if not output_filename:
-        output_filename = Path(page_file).stem + '.corrected.xml'
-    ns = {'pc': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15'}
-    tsv = pd.read_csv(tsv_file, sep='\t', comment='#', quoting=3)
-    tree = ET.parse(page_file)
-    for _, row in tsv.iterrows():
-        el_textline = tree.find(f'//pc:TextLine[@id="{row.line_id}"]', namespaces=ns)
-        el_textline.find('pc:TextEquiv/pc:Unicode', namespaces=ns).text = row.TEXT
-        if not keep_words:
-            for el_word in el_textline.findall('pc:Word', namespaces=ns):
-                el_textline.remove(el_word)
-    with open(output_filename, 'w', encoding='utf-8') as f:
-        f.write(ET.tostring(tree, pretty_print=True).decode('utf-8'))
+    from .merge import tsv2page, write_change_report
 
+    reports = [tsv2page(output_filename, keep_words, page_file, tsv_file, word_level, scale_factor, delta)
+               for page_file, tsv_file in zip(page_and_tsv_files[0::2], page_and_tsv_files[1::2])]
 
-@click.command()
-@click.option('--output-filename', '-o', help="Output filename. "
-                                              "If omitted, PAGE-XML filename with .corrected.xml extension")
-@click.option('--keep-words', '-k', is_flag=True, help="Keep (out-of-date) Words of TextLines")
-@click.argument('page-file')
-@click.argument('tsv-file')
-def tsv2page_cli(output_filename, keep_words, page_file, tsv_file):
-    return tsv2page(output_filename, keep_words, page_file, tsv_file)
+    if change_report is not None:
+        write_change_report(reports, change_report)
 
 
 @click.command()
@@ -536,30 +193,69 @@ def tsv2page_cli(output_filename, keep_words, page_file, tsv_file):
                    "\n\nOCR: OCR application/ground-truth creation. "
                    "\n\ndefault: NERD.")
 def make_page2tsv_commands(xls_file, directory, purpose):
-    if xls_file is not None:
+    from .page import page2tsv_commands
 
-        if xls_file.endswith(".xls"):
-            df = pd.read_excel(xls_file)
-        else:
-            df = pd.read_excel(xls_file, engine='openpyxl')
+    page2tsv_commands(xls_file, directory, purpose)
 
-        df = df.dropna(how='all')
 
-        for _, row in df.iterrows():
-            print('page2tsv $(OPTIONS) {}.xml {}.tsv --image-url={} --scale-factor={} --purpose={}'.
-                  format(row.Filename, row.Filename, row.iiif_url.replace('/full/full', '/left,top,width,height/full'),
-                         row.scale_factor, purpose))
+@click.command()
+@click.option('--xls-file', type=click.Path(exists=True), default=None,
+              help="Read parameters from xls-file. Expected columns:  Filename, iiif_url, scale_factor.")
+@click.option('--directory', type=click.Path(exists=True), default=None,
+              help="Search directory for PPN**/*.xml files. Extract PPN and file number into image-url.")
+@click.option('--purpose', type=click.Choice(['NERD', 'OCR'], case_sensitive=False), default="NERD",
+              help="Purpose of output tsv file. "
+                   "\n\nNERD: NER/NED application/ground-truth creation. "
+                   "\n\nOCR: OCR application/ground-truth creation. "
+                   "\n\ndefault: NERD.")
+@click.option('--ner-rest-endpoint', type=str, default=None,
+              help="REST endpoint of sbb_ner service. See https://github.com/qurator-spk/sbb_ner for details. "
+                   "Only applicable in case of NERD.")
+@click.option('--ned-rest-endpoint', type=str, default=None,
+              help="REST endpoint of sbb_ned service. See https://github.com/qurator-spk/sbb_ned for details. "
+                   "Only applicable in case of NERD.")
+@click.option('--noproxy', type=bool, is_flag=True, help='disable proxy. default: enabled.')
+@click.option('--ned-threshold', type=float, default=None)
+@click.option('--min-confidence', type=float, default=None)
+@click.option('--max-confidence', type=float, default=None)
+@click.option('--ned-priority', type=int, default=1)
+@click.option('--normalization-file', type=click.Path(exists=True), default=None)
+@click.option('--parser', type=click.Choice(['ocrd', 'fast']), default='ocrd',
+              help="PAGE-XML reader. ocrd: ocrd_models object tree. fast: streaming lxml reader. default: ocrd.")
+@click.option('--annotation-retries', type=int, default=3,
+              help="Number of retries of failed NER/NED requests (with exponential backoff). default: 3.")
+@click.option('--num-workers', type=int, default=0,
+              help="Number of processes that convert pages. default: 0 (one per CPU).")
+@click.option('--state-file', type=click.Path(), default='page2tsv-run.sqlite',
+              help="SQLite file that records the finished jobs. A restarted run skips the outputs that are up to "
+                   "date. default: page2tsv-run.sqlite")
+@click.option('--check', type=click.Choice(['mtime', 'hash']), default='mtime',
+              help="An output is up to date if the options and the modification time and size (mtime) or the "
+                   "content (hash) of its PAGE-XML file and of the normalization file did not change since its "
+                   "conversion. default: mtime.")
+def page2tsv_run_cli(xls_file, directory, purpose, ner_rest_endpoint, ned_rest_endpoint, noproxy, ned_threshold,
+                     min_confidence, max_confidence, ned_priority, normalization_file, parser, annotation_retries,
+                     num_workers, state_file, check):
+    """
+    Convert the files listed in --xls-file or found in --directory (the page2tsv commands of
+    make-page2tsv-commands) by a process pool. Each TSV file is written next to its PAGE-XML file. Interrupted
+    runs can be restarted, see --state-file.
+    """
+    if xls_file is None and directory is None:
+        raise click.UsageError("Either --xls-file or --directory is required.")
+
+    from .page import page2tsv_jobs
+    from .runner import page2tsv_run
 
-    elif directory is not None:
-        for file in glob.glob('{}/**/*.xml'.format(directory), recursive=True):
+    options = {'purpose': purpose, 'ner_rest_endpoint': ner_rest_endpoint, 'ned_rest_endpoint': ned_rest_endpoint,
+               'noproxy': noproxy, 'ned_threshold': ned_threshold, 'min_confidence': min_confidence,
+               'max_confidence': max_confidence, 'ned_priority': ned_priority,
+               'normalization_file': normalization_file, 'parser': parser, 'annotation_retries': annotation_retries}
 
-            ma = re.match('(.*/(PPN[0-9X]+)/.*?([0-9]+).*?).xml', file)
+    counts = page2tsv_run(page2tsv_jobs(xls_file, directory), state_file, options, num_workers, check)
 
-            if ma:
-                print('page2tsv {} {}.tsv '
-                      '--image-url=https://content.staatsbibliothek-berlin.de/dc/'
-                      '{}-{:08d}/left,top,width,height/full/0/default.jpg --scale-factor=1.0 --purpose={}'.
-                      format(file, ma.group(1), ma.group(2), int(ma.group(3)), purpose))
+    if counts['failed'] > 0:
+        raise click.ClickException("{} jobs failed. They are repeated by the next run.".format(counts['failed']))
 
 
 @click.command()
@@ -585,22 +281,85 @@ def make_page2tsv_commands(xls_file, directory, purpose):
 @click.option('--ned-threshold', type=float, default=None)
 @click.option('--min-confidence', type=float, default=None)
 @click.option('--max-confidence', type=float, default=None)
+@click.option('--conf-palette', type=str, default=None,
+              help="Comma separated '#rrggbb' colors from --min-confidence to --max-confidence that are "
+                   "interpolated for the ocrconf column. default: #d86c75,#d8ce6c,#6cd892")
+@click.option('--continuous-conf-colors', type=bool, is_flag=True,
+              help="Interpolate the ocrconf colors continuously between neighbouring colors of the palette. "
+                   "default: the colors jump at the inner colors of the palette.")
 @click.option('--ned-priority', type=int, default=1)
 @click.option('--normalization-file', type=click.Path(exists=True), default=None)
+@click.option('--doc-index', type=bool, is_flag=True,
+              help="Keep the number of pages of TSV_OUT_FILE in the sidecar file TSV_OUT_FILE.idx such that "
+                   "successive calls only have to scan the newly appended part of TSV_OUT_FILE.")
+@click.option('--parser', type=click.Choice(['ocrd', 'fast']), default='ocrd',
+              help="PAGE-XML reader. ocrd: ocrd_models object tree. fast: streaming lxml reader. default: ocrd.")
+@click.option('--batch', type=bool, is_flag=True,
+              help="PAGE_XML_FILE is a directory or a manifest TSV file with columns page_xml_file, image_url and "
+                   "(optional) scale_factor. All pages are converted in one run into TSV_OUT_FILE. "
+                   "In case of a directory, {{ file }} and {{ page_no }} in --image-url are replaced per page.")
+@click.option('--annotation-workers', type=int, default=1,
+              help="--batch: Number of concurrent NER/NED requests. default: 1.")
+@click.option('--annotation-batch-size', type=int, default=1,
+              help="--batch: Number of pages that are sent to the NER/NED services in one request. Note that "
+                   "sentences may then continue across page boundaries. default: 1.")
+@click.option('--annotation-retries', type=int, default=3,
+              help="Number of retries of failed NER/NED requests (with exponential backoff). Pages whose annotation "
+                   "fails are written unannotated. default: 3.")
+@click.option('--annotation-report', type=click.Path(), default=None,
+              help="--batch: Write the NER/NED annotation status of each page to this TSV file.")
+@click.option('--annotation-cache', type=click.Path(), default=None,
+              help="SQLite file that caches the results of the NER/NED services. Unchanged pages are not sent "
+                   "again.")
+@click.option('--annotation-cache-size', type=int, default=1024,
+              help="Maximum size of --annotation-cache in MB. Least recently used results are evicted. default: 1024.")
+@click.option('--parquet', type=bool, is_flag=True,
+              help="--batch: Also write TSV_OUT_FILE as Parquet file TSV_OUT_FILE.parquet (see tsv2parquet) at the "
+                   "end of the run. Requires pyarrow.")
+@metrics_options
 def page2tsv_cli(page_xml_file, tsv_out_file, purpose, image_url, ner_rest_endpoint, ned_rest_endpoint,
-             noproxy, scale_factor, ned_threshold, min_confidence, max_confidence, ned_priority, normalization_file):
+             noproxy, scale_factor, ned_threshold, min_confidence, max_confidence, conf_palette, continuous_conf_colors,
+             ned_priority, normalization_file, doc_index, parser, batch, annotation_workers, annotation_batch_size,
+             annotation_retries, annotation_report, annotation_cache, annotation_cache_size, parquet):
     """
 
     Converts a page-XML file into a TSV file that can be edited with neat.
     Optionally the tool also accepts NER and Entitiy Linking API-Endpoints as parameters and
     performs NER and EL and the document if these are provided.
 
-    PAGE_XML_FILE: The source page-XML file.
+    PAGE_XML_FILE: The source page-XML file (--batch: directory or manifest file).
     TSV_OUT_FILE: Resulting TSV file.
     """
 
-    return page2tsv(page_xml_file, tsv_out_file, purpose, image_url, ner_rest_endpoint, ned_rest_endpoint,
-             noproxy, scale_factor, ned_threshold, min_confidence, max_confidence, ned_priority, normalization_file)
+    from .ocr import parse_conf_palette
+    from .page import page2tsv, page2tsv_batch, read_batch_manifest
+
+    if parquet and not batch:
+        raise click.UsageError("--parquet requires --batch. If TSV_OUT_FILE is built page by page, run tsv2parquet "
+                               "once after the last page.")
+
+    if conf_palette is not None:
+        try:
+            conf_palette = parse_conf_palette(conf_palette)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint='--conf-palette')
+
+    with open_annotation_cache(annotation_cache, annotation_cache_size) as cache:
+        if batch:
+            jobs = read_batch_manifest(page_xml_file, image_url, scale_factor)
+
+            page2tsv_batch(jobs, tsv_out_file, purpose, ner_rest_endpoint, ned_rest_endpoint, noproxy,
+                           ned_threshold, min_confidence, max_confidence, ned_priority, normalization_file,
+                           parser, conf_palette, annotation_workers, annotation_batch_size,
+                           annotation_retries, annotation_report, cache, continuous_conf_colors)
+        else:
+            page2tsv(page_xml_file, tsv_out_file, purpose, image_url, ner_rest_endpoint, ned_rest_endpoint,
+                     noproxy, scale_factor, ned_threshold, min_confidence, max_confidence, ned_priority,
+                     normalization_file, doc_index, parser, conf_palette, annotation_retries, cache,
+                     continuous_conf_colors)
+
+    if parquet:
+        write_parquet_sidecar(tsv_out_file)
 
 
 @click.command()
@@ -625,16 +384,88 @@ def page2tsv_cli(page_xml_file, tsv_out_file, purpose, image_url, ner_rest_endpo
 @click.option('--scale-factor', type=float, default=1.0, help='default: 1.0')
 @click.option('--ned-threshold', type=float, default=None)
 @click.option('--ned-priority', type=int, default=1)
+@click.option('--doc-index', type=bool, is_flag=True,
+              help="Keep the number of pages of TSV_OUT_FILE in the sidecar file TSV_OUT_FILE.idx such that "
+                   "successive calls only have to scan the newly appended part of TSV_OUT_FILE.")
+@click.option('--annotation-cache', type=click.Path(), default=None,
+              help="SQLite file that caches the results of the NER/NED services. Unchanged pages are not sent "
+                   "again.")
+@click.option('--annotation-cache-size', type=int, default=1024,
+              help="Maximum size of --annotation-cache in MB. Least recently used results are evicted. default: 1024.")
+@click.option('--parquet', type=bool, is_flag=True,
+              help="--mets/--split-pages: Also write TSV_OUT_FILE as Parquet file TSV_OUT_FILE.parquet (see "
+                   "tsv2parquet) at the end of the run. Requires pyarrow.")
+@click.option('--split-pages', type=bool, is_flag=True,
+              help="Each Page of a multi-page ALTO file becomes a document part of its own. {{ page_id }} and "
+                   "{{ page_no }} in --image-url are replaced per Page.")
+@click.option('--mets', type=bool, is_flag=True,
+              help="ALTO_XML_FILE is a METS file. All its pages are converted in one run into TSV_OUT_FILE.")
+@click.option('--alto-file-grp', type=str, default='FULLTEXT',
+              help="--mets: File group of the ALTO files. default: FULLTEXT.")
+@click.option('--image-file-grp', type=str, default=None,
+              help="--mets: File group whose file locations are the image URLs of the pages. If omitted, "
+                   "{{ page_id }}, {{ page_no }} and {{ file }} in --image-url are replaced per page.")
+@click.option('--num-workers', type=int, default=1,
+              help="--mets: Number of processes that parse ALTO files. default: 1.")
+@metrics_options
 def alto2tsv_cli(alto_xml_file, tsv_out_file, purpose, image_url, ner_rest_endpoint, ned_rest_endpoint,
-             noproxy, scale_factor, ned_threshold, ned_priority):
+             noproxy, scale_factor, ned_threshold, ned_priority, doc_index, annotation_cache, annotation_cache_size,
+             parquet, split_pages, mets, alto_file_grp, image_file_grp, num_workers):
     """
 
         Converts a ALTO-XML file into a TSV file that can be edited with neat.
         Optionally the tool also accepts NER and Entitiy Linking API-Endpoints as parameters and
         performs NER and EL and the document if these are provided.
 
-        ALTO_XML_FILE: The source ALTO-XML file.
+        ALTO_XML_FILE: The source ALTO-XML file (--mets: METS file).
         TSV_OUT_FILE: Resulting TSV file.
         """
-    return alto2tsv(alto_xml_file, tsv_out_file, purpose, image_url, ner_rest_endpoint, ned_rest_endpoint,
-             noproxy, scale_factor, ned_threshold, ned_priority)
+    from .alto import alto2tsv, alto2tsv_mets
+
+    if parquet and not (mets or split_pages):
+        raise click.UsageError("--parquet requires --mets or --split-pages. If TSV_OUT_FILE is built page by page, "
+                               "run tsv2parquet once after the last page.")
+
+    with open_annotation_cache(annotation_cache, annotation_cache_size) as cache:
+        if mets:
+            alto2tsv_mets(alto_xml_file, tsv_out_file, purpose, alto_file_grp, image_file_grp, image_url,
+                          ner_rest_endpoint, ned_rest_endpoint, noproxy, scale_factor, ned_threshold, ned_priority,
+                          num_workers, cache)
+        else:
+            alto2tsv(alto_xml_file, tsv_out_file, purpose, image_url, ner_rest_endpoint, ned_rest_endpoint,
+                     noproxy, scale_factor, ned_threshold, ned_priority, doc_index, cache, split_pages)
+
+    if parquet:
+        write_parquet_sidecar(tsv_out_file)
+
+
+@click.command()
+@click.argument('tsv-file', type=click.Path(exists=True), required=True, nargs=1)
+@click.argument('parquet-file', type=click.Path(exists=False), required=True, nargs=1)
+def tsv2parquet_cli(tsv_file, parquet_file):
+    """
+    Convert a neat TSV file into a Parquet file with typed columns (integer coordinates, categorical tags, ...).
+    The header line and the '# <url>' / '#__CONTEXT__:' lines are kept in the file metadata, i.e., parquet2tsv
+    restores TSV_FILE exactly (except for empty lines and other comments). Requires pyarrow.
+
+    TSV_FILE: The source neat TSV file.
+    PARQUET_FILE: Resulting Parquet file.
+    """
+    from .parquet import tsv2parquet
+
+    tsv2parquet(tsv_file, parquet_file)
+
+
+@click.command()
+@click.argument('parquet-file', type=click.Path(exists=True), required=True, nargs=1)
+@click.argument('tsv-file', type=click.Path(exists=False), required=True, nargs=1)
+def parquet2tsv_cli(parquet_file, tsv_file):
+    """
+    Convert a Parquet file written by tsv2parquet back into a neat TSV file. Requires pyarrow.
+
+    PARQUET_FILE: The source Parquet file.
+    TSV_FILE: Resulting neat TSV file.
+    """
+    from .parquet import parquet2tsv
+
+    parquet2tsv(parquet_file, tsv_file)
@@ -0,0 +1,141 @@
+import json
+import os
+import re
+
+URL_PATTERN = re.compile(rb'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+CONTEXT_PATTERN = re.compile(rb'#\s*__CONTEXT__\s*:\s*(.*)')
+
+
+def is_doc_link(line):
+    """
+    True if `line` (bytes) starts a new document part, i.e., if it is a '# <url>' or a '#__CONTEXT__:' comment.
+
+    Note that qurator.utils.tsv.extract_doc_links takes any line that contains a URL for a doc link. Here, only
+    comment lines are doc links: a row whose token is a URL stays a row of its part, as it does for
+    pd.read_csv(..., comment='#'), instead of starting a new part and shifting all following url_ids.
+    """
+    return line.startswith(b'#') and (CONTEXT_PATTERN.match(line) is not None or URL_PATTERN.search(line) is not None)
+
+
+def parse_doc_link(line):
+    """
+    (url, context) of the doc link `line` (bytes, see is_doc_link), where either url or context is None.
+    """
+    is_context = CONTEXT_PATTERN.match(line)
+    if is_context:
+        return None, json.loads(is_context.group(1))
+
+    return URL_PATTERN.findall(line)[-1].decode('utf-8'), None
+
+
+def read_doc_links(tsv_file):
+    """
+    (url, context) of all doc links of a neat TSV file (see parse_doc_link), i.e., one entry per url_id.
+    """
+    with open(tsv_file, 'rb') as f:
+
+        f.readline()
+
+        return [parse_doc_link(line) for line in f if is_doc_link(line)]
+
+
+def doc_index_file(tsv_file):
+    return str(tsv_file) + '.idx'
+
+
+def _scan_doc_links(f, start, offsets):
+    """
+    Scan `f` from byte position `start` and append the byte offsets of all doc link lines to `offsets`.
+    Returns the position behind the last complete line.
+    """
+    f.seek(start)
+
+    pos = start
+    for line in f:
+        if not line.endswith(b'\n'):
+            break
+
+        if pos > 0 and is_doc_link(line):
+            offsets.append(pos)
+
+        pos += len(line)
+
+    return pos
+
+
+def _read_doc_index(tsv_file, f):
+
+    try:
+        with open(doc_index_file(tsv_file), 'r') as fi:
+            index = json.load(fi)
+    except (OSError, ValueError):
+        return None
+
+    if index.get('size', -1) > os.fstat(f.fileno()).st_size:
+        return None
+
+    # cheap consistency check: the last indexed doc link has to be still in place.
+    if len(index['offsets']) > 0:
+        f.seek(index['offsets'][-1])
+        if not is_doc_link(f.readline()):
+            return None
+
+    return index
+
+
+def count_doc_links(tsv_file, use_index=False):
+    """
+    Count the document parts ('# <url>' and '#__CONTEXT__:' lines) of a neat TSV file. This is the url_id of the
+    next part that is appended to the file.
+
+    If `use_index` is set, the count and the byte offsets of the parts are kept in the sidecar file
+    TSV_FILE.idx and only the data that has been appended since the last call is scanned.
+    """
+    if not os.path.exists(tsv_file):
+        return 0
+
+    with open(tsv_file, 'rb') as f:
+
+        index = _read_doc_index(tsv_file, f) if use_index else None
+
+        if index is None:
+            index = {'size': 0, 'offsets': []}
+
+        index['size'] = _scan_doc_links(f, index['size'], index['offsets'])
+
+    if use_index:
+        with open(doc_index_file(tsv_file), 'w') as fi:
+            json.dump(index, fi)
+
+    return len(index['offsets'])
+
+
+def iter_doc_parts(tsv_file):
+    """
+    Split a neat TSV file into its document parts without loading it as a whole.
+
+    Yields (url, context, data) per part, where `data` (bytes) is the header line of the file followed by the data
+    lines of the part. Data lines in front of the first doc link are yielded as a part with url and context None.
+    """
+    with open(tsv_file, 'rb') as f:
+
+        header = f.readline()
+
+        url, context, lines = None, None, []
+        has_part = False
+
+        for line in f:
+
+            if not is_doc_link(line):
+                lines.append(line)
+                continue
+
+            if has_part or len(lines) > 0:
+                yield url, context, header + b''.join(lines)
+
+            has_part, lines = True, []
+
+            url, context = parse_doc_link(line)
+
+        if has_part or len(lines) > 0:
+            yield url, context, header + b''.join(lines)
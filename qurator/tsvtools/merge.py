@@ -0,0 +1,337 @@
+import json
+import os
+import shutil
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from lxml import etree as ET
+
+from . import metrics
+from .pagexml import bbox_from_coords
+from .parquet import is_parquet_file, read_parquet
+
+# elements that follow the TextEquivs of Words and TextLines in the PAGE schema
+_AFTER_TEXT_EQUIV = ('TextStyle', 'UserDefined', 'Labels')
+
+
+class WordIndex:
+    """
+    Uniform grid over the bounding boxes (left, top, right, bottom) of the words of a page. Each word is entered
+    into all grid cells that it overlaps, such that a lookup only has to consider the words of a few cells.
+    The default cell size is the median word height.
+
+    Boxes that equal the one of a word are looked up directly, the grid is only built for the first box that does
+    not.
+    """
+
+    def __init__(self, bboxes, cell_size=None):
+
+        self.bboxes = [tuple(bbox) for bbox in bboxes]
+
+        self.exact = {}
+        for idx, bbox in enumerate(self.bboxes):
+            self.exact.setdefault(bbox, idx)
+
+        if cell_size is None:
+            heights = sorted(bottom - top for _, top, _, bottom in self.bboxes)
+            cell_size = max(heights[len(heights) // 2], 1) if heights else 1
+
+        self.cell_size = cell_size
+        self.cells = None
+
+    def _build(self):
+
+        self.cells = defaultdict(list)
+        for idx, bbox in enumerate(self.bboxes):
+            for cell in self._cells(bbox):
+                self.cells[cell].append(idx)
+
+    def _cells(self, bbox):
+
+        left, top, right, bottom = [int(x // self.cell_size) for x in bbox]
+
+        return ((x, y) for x in range(left, right + 1) for y in range(top, bottom + 1))
+
+    def lookup(self, bbox):
+        """
+        Index of the word with the largest overlap with `bbox`, -1 if there is none.
+        """
+        bbox = tuple(bbox)
+
+        if bbox in self.exact:
+            return self.exact[bbox]
+
+        if self.cells is None:
+            self._build()
+
+        left, top, right, bottom = bbox
+
+        best, best_area = -1, 0
+        for idx in sorted(set(idx for cell in self._cells(bbox) for idx in self.cells.get(cell, []))):
+            w_left, w_top, w_right, w_bottom = self.bboxes[idx]
+
+            area = max(0, min(right, w_right) - max(left, w_left)) * max(0, min(bottom, w_bottom) - max(top, w_top))
+
+            if area > best_area:
+                best, best_area = idx, area
+
+        return best
+
+
+def _text(elem, ns):
+
+    return elem.findtext('pc:TextEquiv/pc:Unicode', default='', namespaces=ns)
+
+
+def _set_text(elem, ns, text):
+    """
+    Set the (first) TextEquiv/Unicode of a Word or TextLine, creating it in schema order if necessary.
+    """
+    unicode = elem.find('pc:TextEquiv/pc:Unicode', namespaces=ns)
+
+    if unicode is None:
+        text_equiv = elem.find('pc:TextEquiv', namespaces=ns)
+
+        if text_equiv is None:
+            text_equiv = ET.Element('{%s}TextEquiv' % ns['pc'])
+
+            following = [child for child in elem if ET.QName(child).localname in _AFTER_TEXT_EQUIV]
+            if following:
+                following[0].addprevious(text_equiv)
+            else:
+                elem.append(text_equiv)
+
+        unicode = ET.SubElement(text_equiv, '{%s}Unicode' % ns['pc'])
+
+    unicode.text = text
+
+
+def merge_words(tree, ns, tsv, keep_words, scale_factor=1.0):
+    """
+    Word level merge of `tsv` into the PAGE-XML `tree`, i.e., the Words of the TextLines are updated in place.
+
+    NERD TSV (TOKEN): each token is mapped onto the Word that it originates from by its coordinates (divided by
+    `scale_factor`, see WordIndex). Tokens that have been split up (for instance by the NER tokenization) are
+    concatenated again. Tokens of TextLines without Words carry the coordinates of the line and replace its text.
+
+    OCR TSV (TEXT, line_id): the blank separated tokens of each line replace the texts of the Words of the line in
+    order. If their number differs from the number of Words, only the line text is replaced and the Words are
+    removed unless `keep_words` is set.
+
+    The text of a TextLine whose Words changed is the blank joined text of its Words.
+    """
+    textlines = list(tree.iter('{%s}TextLine' % ns['pc']))
+
+    if 'TOKEN' in tsv.columns:
+        words = [(line_idx, word) for line_idx, el_textline in enumerate(textlines)
+                 for word in el_textline.findall('pc:Word', namespaces=ns)]
+
+        index = WordIndex([bbox_from_coords(word, '{%s}' % ns['pc']) for _, word in words])
+
+        line_index = {}
+        for line_idx, el_textline in enumerate(textlines):
+            if el_textline.find('pc:Word', namespaces=ns) is None:
+                line_index.setdefault(bbox_from_coords(el_textline, '{%s}' % ns['pc']), line_idx)
+
+        word_tokens, line_tokens, unmatched = defaultdict(list), defaultdict(list), 0
+
+        for token, left, right, top, bottom in zip(tsv.TOKEN, tsv.left, tsv.right, tsv.top, tsv.bottom):
+            if pd.isnull(token) or len(str(token)) == 0:
+                continue
+
+            if scale_factor != 1.0:
+                left, top, right, bottom = [round(x / scale_factor) for x in (left, top, right, bottom)]
+
+            if (left, top, right, bottom) in line_index:
+                line_tokens[line_index[(left, top, right, bottom)]].append(str(token))
+                continue
+
+            word_idx = index.lookup((left, top, right, bottom))
+            if word_idx < 0:
+                unmatched += 1
+                continue
+
+            word_tokens[word_idx].append(str(token))
+
+        if unmatched > 0:
+            print("Warning: {} tokens could not be assigned to a Word.".format(unmatched))
+
+        changed_lines = set()
+        for word_idx, tokens in word_tokens.items():
+            line_idx, word = words[word_idx]
+
+            if _text(word, ns) != "".join(tokens):
+                _set_text(word, ns, "".join(tokens))
+                changed_lines.add(line_idx)
+
+        for line_idx in changed_lines:
+            el_words = textlines[line_idx].findall('pc:Word', namespaces=ns)
+
+            _set_text(textlines[line_idx], ns, " ".join(_text(el_word, ns) for el_word in el_words))
+
+        for line_idx, tokens in line_tokens.items():
+            if _text(textlines[line_idx], ns) != " ".join(tokens):
+                _set_text(textlines[line_idx], ns, " ".join(tokens))
+                changed_lines.add(line_idx)
+
+        return len(changed_lines)
+
+    id_to_textline = {}
+    for el_textline in textlines:
+        id_to_textline.setdefault(el_textline.get('id'), el_textline)
+
+    num_changed = 0
+    for line_id, text in zip(tsv.line_id, tsv.TEXT):
+        el_textline = id_to_textline[str(line_id)]
+        text = '' if pd.isnull(text) else str(text)
+
+        changed = _text(el_textline, ns) != text
+        if changed:
+            _set_text(el_textline, ns, text)
+
+        el_words = el_textline.findall('pc:Word', namespaces=ns)
+        tokens = text.split(' ')
+
+        if len(tokens) == len(el_words):
+            for el_word, token in zip(el_words, tokens):
+                if _text(el_word, ns) != token:
+                    _set_text(el_word, ns, token)
+                    changed = True
+
+        elif not keep_words and len(el_words) > 0:
+            for el_word in el_words:
+                el_textline.remove(el_word)
+            changed = True
+
+        num_changed += changed
+
+    return num_changed
+
+
+def changed_lines(current, texts):
+    """
+    Positions where the `texts` (new line texts) differ from `current` (texts of the PAGE-XML TextLines),
+    compared in bulk.
+
+    The strings are compared directly as numpy object arrays (one elementwise == per line, which stops at the first
+    differing character) instead of via per-line hashes: hashing would read every string in full, and the texts of
+    the PAGE-XML file are not kept between runs, so there are no stored hashes to compare against.
+    """
+    return np.flatnonzero(np.asarray(current, dtype=object) != np.asarray(texts, dtype=object))
+
+
+def merge_changed_lines(tree, ns, tsv, keep_words):
+    """
+    Line level merge of `tsv` into the PAGE-XML `tree` that only touches the TextLines whose text differs from the
+    TSV, i.e., unchanged TextLines keep their Words regardless of `keep_words`. Returns the number of changed lines.
+    """
+    textlines = {}
+    for el_textline in tree.iter('{%s}TextLine' % ns['pc']):
+        textlines.setdefault(el_textline.get('id'), el_textline)
+
+    el_textlines = [textlines[str(line_id)] for line_id in tsv.line_id]
+    texts = ['' if pd.isnull(text) else str(text) for text in tsv.TEXT]
+
+    changed = changed_lines([_text(el_textline, ns) for el_textline in el_textlines], texts)
+
+    for pos in changed:
+        _set_text(el_textlines[pos], ns, texts[pos])
+        if not keep_words:
+            for el_word in el_textlines[pos].findall('pc:Word', namespaces=ns):
+                el_textlines[pos].remove(el_word)
+
+    return len(changed)
+
+
+def link_or_copy(src, dst):
+    """
+    Hardlink `dst` to `src` (copy if that is not possible, e.g., across file systems).
+    """
+    if Path(dst).exists():
+        if Path(dst).samefile(src):
+            return
+        Path(dst).unlink()
+
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def tsv2page(output_filename, keep_words, page_file, tsv_file, word_level=False, scale_factor=1.0, delta=False):
+    """
+    `word_level`: see merge_words, `scale_factor` is the one of page2tsv.
+
+    `delta`: only TextLines whose text changed are touched (see merge_changed_lines). If nothing changed, the output
+    file is a hardlink of `page_file` instead of a re-serialized copy.
+
+    Returns a change report {'page_file', 'tsv_file', 'output_file', 'lines', 'lines_changed', 'written'}, where
+    'written' is 'xml' or 'link'. Without `delta` and `word_level`, all lines count as changed.
+    """
+    if not output_filename:
+        output_filename = Path(page_file).stem + '.corrected.xml'
+
+    with metrics.page(page_file):
+        with metrics.stage('read'):
+            if is_parquet_file(tsv_file):
+                tsv, _ = read_parquet(tsv_file, columns=None if word_level else ['line_id', 'TEXT'])
+            elif word_level or delta:
+                # texts and tokens are compared as they are, i.e., '007' stays '007'
+                tsv = pd.read_csv(tsv_file, sep='\t', comment='#', quoting=3, dtype={'TOKEN': str, 'TEXT': str},
+                                  keep_default_na=False)
+            else:
+                tsv = pd.read_csv(tsv_file, sep='\t', comment='#', quoting=3)
+
+        with metrics.stage('parse'):
+            tree = ET.parse(page_file)
+            ns = {'pc': ET.QName(tree.getroot()).namespace}
+
+        with metrics.stage('merge'):
+            if word_level:
+                num_changed = merge_words(tree, ns, tsv, keep_words, scale_factor)
+            elif delta:
+                num_changed = merge_changed_lines(tree, ns, tsv, keep_words)
+            else:
+                num_changed = len(tsv)
+
+                textlines = {}
+                for el_textline in tree.iter('{%s}TextLine' % ns['pc']):
+                    textlines.setdefault(el_textline.get('id'), el_textline)
+
+                for line_id, text in zip(tsv.line_id, tsv.TEXT):
+                    el_textline = textlines[str(line_id)]
+                    el_textline.find('pc:TextEquiv/pc:Unicode', namespaces=ns).text = text
+                    if not keep_words:
+                        for el_word in el_textline.findall('pc:Word', namespaces=ns):
+                            el_textline.remove(el_word)
+
+        metrics.count('lines', len(tsv))
+        metrics.count('lines_changed', num_changed)
+
+        report = {'page_file': str(page_file), 'tsv_file': str(tsv_file), 'output_file': str(output_filename),
+                  'lines': len(tsv), 'lines_changed': int(num_changed), 'written': 'xml'}
+
+        with metrics.stage('write'):
+            if delta and num_changed == 0:
+                link_or_copy(page_file, output_filename)
+                report['written'] = 'link'
+                return report
+
+            with open(output_filename, 'w', encoding='utf-8') as f:
+                f.write(ET.tostring(tree, pretty_print=True).decode('utf-8'))
+
+    return report
+
+
+def write_change_report(reports, report_file):
+    """
+    Write the change reports of tsv2page (one per page) as JSON file together with the totals.
+    """
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump({'pages': len(reports),
+                   'pages_changed': sum(1 for report in reports if report['lines_changed'] > 0),
+                   'lines': sum(report['lines'] for report in reports),
+                   'lines_changed': sum(report['lines_changed'] for report in reports),
+                   'files': reports}, f, indent=2)
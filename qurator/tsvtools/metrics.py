@@ -0,0 +1,325 @@
+"""
+Optional instrumentation of the converters: wall time per page and processing stage, token/line counts and
+latency histograms of the HTTP requests to the NER/NED services.
+
+Nothing is recorded unless a session (see session) is active. The command line tools start one with
+--metrics-file/--profile, the OCR-D processors with the environment variables OCRD_NEAT_METRICS,
+OCRD_NEAT_METRICS_FORMAT and OCRD_NEAT_PROFILE.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+METRICS_FORMATS = ['jsonl', 'prometheus']
+
+# upper bounds (seconds) of the buckets of the HTTP latency histograms
+HTTP_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+
+_lock = threading.Lock()
+_local = threading.local()
+
+# None if disabled, see _new_state
+_state = None
+
+
+def _new_state():
+
+    return {'start': time.time(), 'pages': {}, 'stages': {}, 'counts': {}, 'http': {}}
+
+
+def enabled():
+
+    return _state is not None
+
+
+def _page_record(page_id):
+
+    if page_id not in _state['pages']:
+        _state['pages'][page_id] = {'seconds': 0.0, 'stages': {}, 'counts': {}}
+
+    return _state['pages'][page_id]
+
+
+def _add(key, name, value):
+
+    with _lock:
+        _state[key][name] = _state[key].get(name, 0) + value
+
+        page_id = getattr(_local, 'page', None)
+        if page_id is not None:
+            record = _page_record(page_id)
+            record[key][name] = record[key].get(name, 0) + value
+
+
+@contextmanager
+def page(page_id):
+    """
+    Attribute the stages and counts of the current thread to `page_id` (file name or other identifier).
+    Pages do not nest, i.e., inside of a page this is a no-op.
+    """
+    if _state is None or getattr(_local, 'page', None) is not None:
+        yield
+        return
+
+    _local.page = str(page_id)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _lock:
+            _page_record(_local.page)['seconds'] += time.perf_counter() - start
+        _local.page = None
+
+
+@contextmanager
+def stage(name):
+    """
+    Add the wall time of the block to processing stage `name`.
+    """
+    if _state is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _add('stages', name, time.perf_counter() - start)
+
+
+def count(name, n):
+    """
+    Add `n` to the counter `name` (tokens, lines, ...).
+    """
+    if _state is None:
+        return
+
+    _add('counts', name, int(n))
+
+
+def observe_http(url, seconds):
+    """
+    Add the latency of a request to `url` to its histogram.
+    """
+    if _state is None:
+        return
+
+    with _lock:
+        if url not in _state['http']:
+            _state['http'][url] = {'buckets': [0] * (len(HTTP_BUCKETS) + 1), 'sum': 0.0, 'count': 0}
+
+        histogram = _state['http'][url]
+
+        histogram['buckets'][sum(1 for bound in HTTP_BUCKETS if seconds > bound)] += 1
+        histogram['sum'] += seconds
+        histogram['count'] += 1
+
+
+def merge(state):
+    """
+    Add the metrics `state` of another process (see pool_map) to the current ones.
+    """
+    with _lock:
+        for key in ['stages', 'counts']:
+            for name, value in state[key].items():
+                _state[key][name] = _state[key].get(name, 0) + value
+
+        for page_id, other in state['pages'].items():
+            record = _page_record(page_id)
+            record['seconds'] += other['seconds']
+            for key in ['stages', 'counts']:
+                for name, value in other[key].items():
+                    record[key][name] = record[key].get(name, 0) + value
+
+        for url, other in state['http'].items():
+            if url not in _state['http']:
+                _state['http'][url] = {'buckets': [0] * (len(HTTP_BUCKETS) + 1), 'sum': 0.0, 'count': 0}
+
+            histogram = _state['http'][url]
+            histogram['buckets'] = [a + b for a, b in zip(histogram['buckets'], other['buckets'])]
+            histogram['sum'] += other['sum']
+            histogram['count'] += other['count']
+
+
+class _Collected:
+    """
+    Picklable wrapper of `fn` that runs it with metrics of its own and returns them along with the result.
+    """
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def __call__(self, *args):
+        global _state
+
+        _state = _new_state()
+        try:
+            result = self.fn(*args)
+        finally:
+            state, _state = _state, None
+
+        return result, state
+
+
+def _bounded_map(executor, fn, args, max_pending):
+    """
+    fn(*arg) for all `args` in order with at most `max_pending` submitted calls whose results are not consumed yet.
+    """
+    pending = deque()
+    for arg in args:
+        pending.append(executor.submit(fn, *arg))
+
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+
+    while len(pending) > 0:
+        yield pending.popleft().result()
+
+
+def pool_map(executor, fn, *iterables, max_pending=None):
+    """
+    executor.map(fn, *iterables) of a process pool that keeps the metrics recorded by the worker processes.
+
+    With `max_pending`, the iterables are consumed lazily and at most `max_pending` calls run ahead of the consumer
+    of the results, i.e., memory use does not grow if the consumer falls behind.
+    """
+    collect = _state is not None
+
+    if collect:
+        fn = _Collected(fn)
+
+    if max_pending is None:
+        results = executor.map(fn, *iterables)
+    else:
+        results = _bounded_map(executor, fn, zip(*iterables), max_pending)
+
+    for result in results:
+        if collect:
+            result, state = result
+            merge(state)
+
+        yield result
+
+
+def _histogram_buckets(histogram):
+    """
+    Cumulative bucket counts as {upper bound: count}.
+    """
+    ret, total = {}, 0
+    for bound, n in zip([str(bound) for bound in HTTP_BUCKETS] + ['+Inf'], histogram['buckets']):
+        total += n
+        ret[bound] = total
+
+    return ret
+
+
+def _write_jsonl(state, f):
+
+    for page_id, record in state['pages'].items():
+        f.write(json.dumps({'page': page_id, **record}) + '\n')
+
+    f.write(json.dumps({'summary': True, 'seconds': time.time() - state['start'], 'pages': len(state['pages']),
+                        'stages': state['stages'], 'counts': state['counts'],
+                        'http': {url: {'buckets': _histogram_buckets(histogram), 'sum': histogram['sum'],
+                                       'count': histogram['count']}
+                                 for url, histogram in state['http'].items()}}) + '\n')
+
+
+def _label(value):
+
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _write_prometheus(state, f):
+
+    f.write('# HELP tsvtools_pages_total Number of processed pages.\n')
+    f.write('# TYPE tsvtools_pages_total counter\n')
+    f.write('tsvtools_pages_total {}\n'.format(len(state['pages'])))
+
+    f.write('# HELP tsvtools_stage_seconds_total Wall time per processing stage.\n')
+    f.write('# TYPE tsvtools_stage_seconds_total counter\n')
+    for name, seconds in sorted(state['stages'].items()):
+        f.write('tsvtools_stage_seconds_total{{stage="{}"}} {}\n'.format(_label(name), seconds))
+
+    f.write('# HELP tsvtools_items_total Number of processed tokens, lines, ...\n')
+    f.write('# TYPE tsvtools_items_total counter\n')
+    for name, n in sorted(state['counts'].items()):
+        f.write('tsvtools_items_total{{kind="{}"}} {}\n'.format(_label(name), n))
+
+    f.write('# HELP tsvtools_http_request_seconds Latency of the requests to the NER/NED services.\n')
+    f.write('# TYPE tsvtools_http_request_seconds histogram\n')
+    for url, histogram in sorted(state['http'].items()):
+        for bound, n in _histogram_buckets(histogram).items():
+            f.write('tsvtools_http_request_seconds_bucket{{url="{}",le="{}"}} {}\n'.format(_label(url), bound, n))
+        f.write('tsvtools_http_request_seconds_sum{{url="{}"}} {}\n'.format(_label(url), histogram['sum']))
+        f.write('tsvtools_http_request_seconds_count{{url="{}"}} {}\n'.format(_label(url), histogram['count']))
+
+
+def write(metrics_file, metrics_format=None):
+    """
+    Write the current metrics as JSON lines (one line per page and a summary line) or in the Prometheus textfile
+    format. The default format is 'prometheus' for *.prom files and 'jsonl' otherwise.
+    """
+    if metrics_format is None:
+        metrics_format = 'prometheus' if str(metrics_file).endswith('.prom') else 'jsonl'
+
+    if metrics_format not in METRICS_FORMATS:
+        raise ValueError("Unknown metrics format: {}".format(metrics_format))
+
+    with _lock, open(metrics_file, 'w', encoding='utf-8') as f:
+        if metrics_format == 'jsonl':
+            _write_jsonl(_state, f)
+        else:
+            _write_prometheus(_state, f)
+
+
+@contextmanager
+def session(metrics_file=None, metrics_format=None, profile_file=None):
+    """
+    Record metrics while the block runs and write them to `metrics_file` (see write). With `profile_file`, the
+    block additionally runs under cProfile and the statistics are written to that file (pstats format). Note that
+    the profile only covers the calling process.
+    """
+    global _state
+
+    if metrics_file is None and profile_file is None:
+        yield
+        return
+
+    if metrics_file is not None:
+        _state = _new_state()
+
+    profiler = None
+    if profile_file is not None:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_file)
+
+        if metrics_file is not None:
+            write(metrics_file, metrics_format)
+            _state = None
+
+
+def environ_session(fn):
+    """
+    Decorator that runs `fn` in a session configured by the environment variables OCRD_NEAT_METRICS (metrics file),
+    OCRD_NEAT_METRICS_FORMAT and OCRD_NEAT_PROFILE (profile file).
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with session(os.environ.get('OCRD_NEAT_METRICS') or None, os.environ.get('OCRD_NEAT_METRICS_FORMAT') or None,
+                     os.environ.get('OCRD_NEAT_PROFILE') or None):
+            return fn(*args, **kwargs)
+
+    return wrapper
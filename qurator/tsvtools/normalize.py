@@ -0,0 +1,66 @@
+import re
+import unicodedata
+
+# all characters of unicode category "Co" (private use)
+PRIVATE_USE_PATTERN = re.compile('[\ue000-\uf8ff\U000f0000-\U000ffffd\U00100000-\U0010fffd]')
+
+
+def _private_use_replacement(c, normalization_map, use_combining_characters):
+
+    if ord(c) not in normalization_map.index:
+        return ''
+
+    entry = normalization_map.loc[ord(c)]
+
+    if use_combining_characters:
+        ret = "{}{}".format(entry.base, chr(int(entry.combining_character, base=16))
+                            if entry.combining_character != '' else '')
+    else:
+        ret = entry.base
+
+    # the normalization map may again contain unicode private use chars
+    return PRIVATE_USE_PATTERN.sub('', ret)
+
+
+def compile_normalization_map(normalization_map, use_combining_characters=True):
+    """
+    Precompute the replacements of all private use characters of `normalization_map`.
+    The result can be passed to unicode_normalize instead of the normalization map itself.
+    """
+
+    return {int(decimal): _private_use_replacement(chr(decimal), normalization_map, use_combining_characters)
+            for decimal in normalization_map.index.unique() if PRIVATE_USE_PATTERN.match(chr(decimal))}
+
+
+def unicode_normalize(text, normalization_map=None, use_combining_characters=True):
+    """
+    Replace unicode private use characters of `text` according to `normalization_map` (DataFrame indexed by
+    decimal code point with columns base and combining_character) and return the NFC normalized result.
+    Private use characters that are not contained in the map are removed.
+
+    `normalization_map` can also be a table from compile_normalization_map, which is much faster if many
+    texts are processed. `use_combining_characters` is then determined by the table.
+    """
+
+    if PRIVATE_USE_PATTERN.search(text) is None:
+        return unicodedata.normalize('NFC', text)
+
+    if normalization_map is None:
+        ret = PRIVATE_USE_PATTERN.sub('', text)
+
+        if ret != text:
+            print("Warning: Due to unicode normalization possible loss of information: "
+                  "{} => {} (normalization file missing?)".format(text, ret))
+
+        return unicodedata.normalize('NFC', ret)
+
+    if isinstance(normalization_map, dict):
+        ret = PRIVATE_USE_PATTERN.sub('', text.translate(normalization_map))
+    else:
+        ret = PRIVATE_USE_PATTERN.sub(lambda m: _private_use_replacement(m.group(), normalization_map,
+                                                                         use_combining_characters), text)
+    if ret != text:
+        print("Warning: Due to unicode normalization possible loss of information: "
+              "{} => {}".format(text, ret))
+
+    return unicodedata.normalize('NFC', ret)
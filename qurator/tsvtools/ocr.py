@@ -1,23 +1,62 @@
+import re
+
 import numpy as np
-import pandas as pd
 
+DEFAULT_CONF_PALETTE = [[216, 108, 117], [216, 206, 108], [108, 216, 146]]
+
+
+def parse_conf_palette(palette):
+    """
+    Convert a comma separated list of '#rrggbb' colors (lowest to highest confidence) into a list of RGB values.
+    Raises ValueError if there are less than two colors or a color is not of the form '#rrggbb' / 'rrggbb'.
+    """
+    colors = [color.strip() for color in palette.split(',')]
+
+    if len(colors) < 2:
+        raise ValueError("A confidence palette needs at least two colors: {}".format(palette))
+
+    for color in colors:
+        if re.fullmatch('#?[0-9a-fA-F]{6}', color) is None:
+            raise ValueError("Not a '#rrggbb' color: {}".format(color))
+
+    return [[int(color.lstrip('#')[i:i + 2], 16) for i in (0, 2, 4)] for color in colors]
+
+
+def get_conf_colors(conf, min_conf, max_conf, palette=None, continuous=False):
+    """
+    Vectorized get_conf_color: map an array of OCR confidences onto hex colors ('#rrggbb') by mixing the two
+    neighbouring colors of `palette` (list of at least two RGB values, evenly spaced from min_conf to max_conf,
+    default: red-yellow-green). Confidences are clipped to [min_conf, max_conf]. NaN confidences are mapped onto ''.
+
+    As in the original get_conf_color, the two colors are weighted by the position of the confidence in the whole
+    range [min_conf, max_conf], i.e., the colors jump at the inner colors of the palette. `continuous` weights them
+    by the position between the two colors instead, i.e., the colors change continuously.
+    """
+    colors = np.array(DEFAULT_CONF_PALETTE if palette is None else palette)
+
+    conf = np.clip(np.asarray(conf, dtype=float), min_conf, max_conf)
+    valid = ~np.isnan(conf)
+
+    interval_size = (max_conf - min_conf) / (len(colors) - 1.0)
 
-def get_conf_color(conf, min_conf, max_conf):
+    t = np.clip((conf[valid] - min_conf) / interval_size, 0, len(colors) - 1)
 
-    conf = min_conf if conf < min_conf else conf
-    conf = max_conf if conf > max_conf else conf
+    lower = np.floor(t).astype(int)
+    upper = np.ceil(t).astype(int)
 
-    interval_size = (max_conf - min_conf) / 2.0
+    if continuous:
+        pos = (t - lower)[:, np.newaxis]
+    else:
+        pos = ((conf[valid] - min_conf) / ((len(colors) - 1.0) * interval_size))[:, np.newaxis]
 
-    colors = np.array([[216, 108, 117], [216, 206, 108], [108, 216, 146]])
+    col = (colors[lower] * (1.0 - pos) + colors[upper] * pos).astype(int)
 
-    colors = pd.DataFrame(colors, index=[0, 1, 2], columns=['R', 'G', 'B'])
+    ret = np.full(len(conf), '', dtype=object)
+    ret[valid] = ['#{:02x}{:02x}{:02x}'.format(r, g, b) for r, g, b in col.tolist()]
 
-    lower = np.floor((conf - min_conf) / interval_size)
-    upper = np.ceil((conf - min_conf) / interval_size)
+    return ret
 
-    pos = (conf - min_conf) / (2.0*interval_size)
 
-    col = (colors.loc[lower] * (1.0 - pos) + colors.loc[upper] * pos).astype(int)
+def get_conf_color(conf, min_conf, max_conf, palette=None, continuous=False):
 
-    return '#{:02x}'.format(col.R) + '{:02x}'.format(col.G) + '{:02x}'.format(col.B)
+    return get_conf_colors([conf], min_conf, max_conf, palette, continuous)[0]
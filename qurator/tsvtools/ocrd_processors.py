@@ -1,22 +1,222 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from io import StringIO
 from json import loads
+from os import environ, cpu_count
 from pathlib import Path
 from pkg_resources import resource_string
 from re import sub as re_sub
 
 import pandas as pd
+from lxml import etree as ET
 from PIL import Image
 
 from ocrd import Processor
 from ocrd_utils import getLogger, make_file_id, assert_file_grp_cardinality, MIMETYPE_PAGE
-from ocrd_models import OcrdExif
 from ocrd_models.constants import NAMESPACES as NS
-from ocrd_models.ocrd_page import TextEquivType, to_xml
-from ocrd_modelfactory import page_from_file
+from ocrd_models.ocrd_page import TextEquivType, MetadataType, PcGtsType, parse, to_xml
 
-from .cli import page2tsv
+from . import metrics
+from .merge import changed_lines, link_or_copy, merge_changed_lines, merge_words, write_change_report
+from .page import page2tsv_frame, page2tsv_columns
+from .parquet import is_parquet_file, read_parquet
+from .writer import TSVWriter
 
 OCRD_TOOL = loads(resource_string(__name__, 'ocrd-tool.json'))
 
+
+def num_workers(parameter):
+    """
+    Number of pages that are processed concurrently: environment variable OCRD_NEAT_WORKERS if set,
+    parameter 'num_workers' otherwise. 0 means one worker per CPU.
+    """
+    workers = int(environ.get('OCRD_NEAT_WORKERS', parameter['num_workers']))
+
+    return workers if workers > 0 else cpu_count()
+
+
+def map_pages(fn, jobs, workers):
+    """
+    Apply `fn` to all argument tuples of `jobs` using `workers` processes. Results are yielded in order of `jobs`.
+    """
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield fn(*job)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+        yield from metrics.pool_map(executor, fn, *zip(*jobs))
+
+
+@lru_cache(maxsize=None)
+def image_size(image_filename):
+    """
+    (width, height) of an image. Only the image header is read, pixel data is not decoded.
+    """
+    with Image.open(image_filename) as img:
+        return img.size
+
+
+def export_page(page_filename, tsv_filepath, iiif_url, image_size=None):
+    """
+    If the (width, height) of the image that is referenced by `iiif_url` is given, the coordinates are scaled
+    from the PAGE image size to that size. There is one scale factor (by width) for both axes, i.e., a warning is
+    logged if the image has a different aspect ratio than the PAGE image.
+    """
+    with metrics.page(page_filename):
+        with metrics.stage('read'):
+            pcgts = parse(page_filename, silence=True)
+
+        scale_factor = 1.0
+        if image_size is not None:
+            page = pcgts.get_Page()
+
+            scale_factor = image_size[0] / page.get_imageWidth()
+            height_scale_factor = image_size[1] / page.get_imageHeight()
+
+            if abs(scale_factor - height_scale_factor) > 0.01 * scale_factor:
+                getLogger('ocrd_neat.export').warning(
+                    'Image of %s has a different aspect ratio than the PAGE image (scale factors %.3f by width and '
+                    '%.3f by height), vertical coordinates are scaled by width', page_filename, scale_factor,
+                    height_scale_factor)
+
+        tsv = page2tsv_frame(pcgts, 'OCR', 0, scale_factor)
+
+        with metrics.stage('write'), TSVWriter(tsv_filepath, page2tsv_columns('OCR'), append=False) as writer:
+            writer.write_part(iiif_url, tsv)
+
+
+def merge_line_words(textline, text, keep_words):
+    """
+    Word level import: the blank separated tokens of `text` replace the texts of the Words of `textline` in order.
+    If their number differs from the number of Words, the Words are removed unless `keep_words` is set.
+    """
+    tokens = text.split(' ')
+    words = textline.get_Word()
+
+    if len(tokens) == len(words):
+        for word, token in zip(words, tokens):
+            text_equivs = word.get_TextEquiv()
+            if not text_equivs or text_equivs[0].get_Unicode() != token:
+                word.set_TextEquiv([TextEquivType(Unicode=token)])
+
+    elif not keep_words:
+        textline.set_Word([])
+
+
+def read_line_texts(tsv_filename):
+    """
+    line_id -> TEXT of the lines of an OCR TSV file that are not blank.
+    """
+    if is_parquet_file(tsv_filename):
+        tsv, _ = read_parquet(tsv_filename, columns=['line_id', 'TEXT'])
+    else:
+        # texts are taken as they are, i.e., '007' stays '007'
+        tsv = pd.read_csv(tsv_filename, sep='\t', comment='#', quoting=3, dtype={'line_id': str, 'TEXT': str},
+                          keep_default_na=False)
+
+    return {str(line_id): str(text) for line_id, text in zip(tsv.line_id, tsv.TEXT)
+            if not pd.isnull(text) and str(text).strip()}
+
+
+def import_page(page_filename, tsv_filename, keep_words, file_id, metadata_item, word_level=False):
+
+    with metrics.page(page_filename):
+        with metrics.stage('parse'):
+            pcgts = parse(page_filename, silence=True)
+            page = pcgts.get_Page()
+
+        with metrics.stage('read'):
+            id_to_text = read_line_texts(tsv_filename)
+
+        metrics.count('lines', len(id_to_text))
+
+        with metrics.stage('merge'):
+            for textline in page.get_AllTextLines():
+                if word_level:
+                    if textline.id in id_to_text:
+                        textline.set_TextEquiv([TextEquivType(Unicode=id_to_text[textline.id])])
+                        merge_line_words(textline, id_to_text[textline.id], keep_words)
+                    continue
+
+                if textline.id in id_to_text:
+                    textline.set_TextEquiv([TextEquivType(Unicode=id_to_text[textline.id])])
+                if not keep_words:
+                    textline.set_Word([])
+
+            pcgts.get_Metadata().add_MetadataItem(metadata_item)
+            pcgts.set_pcGtsId(file_id)
+
+        with metrics.stage('serialize'):
+            return to_xml(pcgts)
+
+
+def _metadata_element(metadata_item, namespace):
+    """
+    lxml element of a MetadataItemType in the PAGE `namespace`.
+    """
+    out = StringIO()
+    metadata_item.export(out, 0, namespaceprefix_='pc:', namespacedef_='xmlns:pc="{}"'.format(namespace),
+                         name_='MetadataItem', pretty_print=False)
+
+    return ET.fromstring(out.getvalue())
+
+
+def import_page_delta(page_filename, tsv_filename, keep_words, file_id, metadata_item, word_level=False):
+    """
+    Delta variant of import_page that only touches the TextLines whose text differs from the TSV
+    (see merge.merge_changed_lines and merge.merge_words). The page is processed as plain lxml tree, i.e., it is
+    neither parsed into a PcGtsType nor serialized by to_xml.
+
+    Returns (content, number of lines, number of changed lines), content is None if nothing changed.
+    """
+    with metrics.page(page_filename):
+        return _import_page_delta(page_filename, tsv_filename, keep_words, file_id, metadata_item, word_level)
+
+
+def _import_page_delta(page_filename, tsv_filename, keep_words, file_id, metadata_item, word_level):
+
+    with metrics.stage('read'):
+        id_to_text = read_line_texts(tsv_filename)
+
+    with metrics.stage('parse'):
+        tree = ET.parse(page_filename)
+    ns = {'pc': ET.QName(tree.getroot()).namespace}
+
+    current = {}
+    for el_textline in tree.iter('{%s}TextLine' % ns['pc']):
+        current.setdefault(el_textline.get('id'), el_textline.findtext('pc:TextEquiv/pc:Unicode', default='',
+                                                                       namespaces=ns))
+
+    line_ids = [line_id for line_id in id_to_text if line_id in current]
+    texts = [id_to_text[line_id] for line_id in line_ids]
+
+    changed = changed_lines([current[line_id] for line_id in line_ids], texts)
+
+    metrics.count('lines', len(line_ids))
+    metrics.count('lines_changed', len(changed))
+
+    if len(changed) == 0:
+        return None, len(line_ids), 0
+
+    tsv = pd.DataFrame({'line_id': [line_ids[pos] for pos in changed], 'TEXT': [texts[pos] for pos in changed]})
+
+    with metrics.stage('merge'):
+        if word_level:
+            merge_words(tree, ns, tsv, keep_words)
+        else:
+            merge_changed_lines(tree, ns, tsv, keep_words)
+
+        tree.find('pc:Metadata', namespaces=ns).append(_metadata_element(metadata_item, ns['pc']))
+        tree.getroot().set('pcGtsId', file_id)
+        ET.cleanup_namespaces(tree)
+
+    with metrics.stage('serialize'):
+        content = ET.tostring(tree, pretty_print=True, xml_declaration=True, encoding='UTF-8').decode('utf-8')
+
+    return content, len(line_ids), len(changed)
+
+
 class OcrdNeatExportProcessor(Processor):
 
     def __init__(self, *args, **kwargs):
@@ -24,6 +224,7 @@ class OcrdNeatExportProcessor(Processor):
         kwargs['version'] = OCRD_TOOL['version']
         super().__init__(*args, **kwargs)
 
+    @metrics.environ_session
     def process(self):
         """
         Convert PAGE-XML to TSV loadable by the neat GT editor.
@@ -32,19 +233,23 @@ class OcrdNeatExportProcessor(Processor):
         assert_file_grp_cardinality(self.input_file_grp, 1)
         assert_file_grp_cardinality(self.output_file_grp, 1)
         iiif_url_template = self.parameter['iiif_url_template']
-        noproxy = self.parameter['noproxy']
+        scale_filegrp = self.parameter['scale_filegrp']
+        if self.parameter['noproxy']:
+            environ['no_proxy'] = '*'
 
         ppn_found = self.workspace.mets._tree.find('//mods:mods/mods:recordInfo/mods:recordIdentifier[@source="gbv-ppn"]', NS)
         if ppn_found is not None:
             ppn = ppn_found.text
         else:
             ppn = ''
-        for n, input_file in enumerate(self.input_files):
+        input_files = list(self.input_files)
+        jobs = []
+        outputs = []
+        for n, input_file in enumerate(input_files):
             page_id = input_file.pageId or input_file.ID
-            log.info('Processing: %d / %s of %d', n, page_id, len(list(self.input_files)))
+            log.info('Processing: %d / %s of %d', n, page_id, len(input_files))
             file_id = make_file_id(input_file, self.output_file_grp)
-            pcgts = page_from_file(self.workspace.download_file(input_file))
-            page = pcgts.get_Page()
+            page_filename = self.workspace.download_file(input_file).local_filename
 
             iiif_url = iiif_url_template\
                     .replace('{{ unique_identifier }}', self.workspace.mets.unique_identifier)\
@@ -53,8 +258,32 @@ class OcrdNeatExportProcessor(Processor):
                     .replace('{{ page_no }}', re_sub('[^0-9]', '', page_id))
             Path(self.output_file_grp).mkdir(exist_ok=True)
             tsv_filepath = Path(self.output_file_grp, file_id + '.tsv')
-            page2tsv(input_file.local_filename, tsv_filepath, 'OCR', iiif_url, None, None, noproxy, 1.0, None, None, None, 1)
+            jobs.append((str(Path(self.workspace.directory, page_filename)),
+                         str(Path(self.workspace.directory, tsv_filepath)), iiif_url))
+            outputs.append((file_id, page_id, tsv_filepath))
+
+        if scale_filegrp:
+            image_filenames = []
+            for _, page_id, _ in outputs:
+                image_files = [f for f in self.workspace.mets.find_files(fileGrp=scale_filegrp, pageId=page_id)
+                               if f.mimetype.startswith('image/')]
+                if not image_files:
+                    log.warning('No image in file group %s for page %s, coordinates are not scaled',
+                                scale_filegrp, page_id)
+                    image_filenames.append(None)
+                    continue
+                image_filenames.append(str(Path(self.workspace.directory,
+                                                self.workspace.download_file(image_files[0]).local_filename)))
+
+            # header-only reads, i.e., I/O bound
+            with ThreadPoolExecutor() as executor:
+                image_sizes = list(executor.map(lambda f: image_size(f) if f is not None else None, image_filenames))
+
+            jobs = [job + (size,) for job, size in zip(jobs, image_sizes)]
 
+        # METS registration stays sequential and in input order
+        for (file_id, page_id, tsv_filepath), _ in zip(outputs, map_pages(export_page, jobs,
+                                                                          num_workers(self.parameter))):
             self.workspace.add_file(
                 file_id=file_id,
                 file_grp=self.output_file_grp,
@@ -69,6 +298,7 @@ class OcrdNeatImportProcessor(Processor):
         kwargs['version'] = OCRD_TOOL['version']
         super().__init__(*args, **kwargs)
 
+    @metrics.environ_session
     def process(self):
         """
         Merge neat TSV results back into PAGE-XML.
@@ -77,31 +307,56 @@ class OcrdNeatImportProcessor(Processor):
         assert_file_grp_cardinality(self.input_file_grp, 2)
         assert_file_grp_cardinality(self.output_file_grp, 1)
         keep_words = self.parameter['keep_words']
-        for n, (page_in_file, tsv_file) in enumerate(self.zip_input_files()):
+        word_level = self.parameter['word_level']
+        delta = self.parameter['delta']
+
+        # the same processingStep metadata is added to every page
+        metadata = PcGtsType(Metadata=MetadataType())
+        self.add_metadata(metadata)
+        metadata_item = metadata.get_Metadata().get_MetadataItem()[-1]
+
+        input_files = list(self.zip_input_files())
+        jobs = []
+        outputs = []
+        for n, (page_in_file, tsv_file) in enumerate(input_files):
             page_id = page_in_file.pageId or page_in_file.ID
-            log.info('Processing: %d / %s of %d', n, page_id, len(list(self.zip_input_files())))
+            log.info('Processing: %d / %s of %d', n, page_id, len(input_files))
             file_id = make_file_id(page_in_file, self.output_file_grp)
-            pcgts = page_from_file(self.workspace.download_file(page_in_file))
-            page = pcgts.get_Page()
+            page_filename = self.workspace.download_file(page_in_file).local_filename
 
-            tsv = pd.read_csv(tsv_file.local_filename, sep='\t', comment='#', quoting=3)
-            id_to_text = {}
-            for _, row in tsv.iterrows():
-                if str(row.TEXT).strip():
-                    id_to_text[row.line_id] = row.TEXT
-            for textline in page.get_AllTextLines():
-                if textline.id in id_to_text:
-                    textline.set_TextEquiv([TextEquivType(Unicode=id_to_text[textline.id])])
-                if not keep_words:
-                    textline.set_Word([])
+            jobs.append((str(Path(self.workspace.directory, page_filename)),
+                         str(Path(self.workspace.directory, tsv_file.local_filename)), keep_words, file_id,
+                         metadata_item, word_level))
+            outputs.append((file_id, page_id))
+
+        import_fn = import_page_delta if delta else import_page
+        reports = []
+
+        # METS registration stays sequential and in input order
+        for (file_id, page_id), job, result in zip(outputs, jobs, map_pages(import_fn, jobs,
+                                                                            num_workers(self.parameter))):
+            local_filename = "%s/%s.xml" % (self.output_file_grp, file_id)
+
+            if not delta:
+                content = result
+            else:
+                content, num_lines, num_changed = result
+                reports.append({'page_id': page_id, 'file_id': file_id, 'lines': num_lines,
+                                'lines_changed': num_changed, 'written': 'xml' if content is not None else 'link'})
+
+            if content is None:
+                log.info('No changes: %s', page_id)
+                Path(self.workspace.directory, self.output_file_grp).mkdir(exist_ok=True)
+                link_or_copy(job[0], Path(self.workspace.directory, local_filename))
 
-            self.add_metadata(pcgts)
-            pcgts.set_pcGtsId(file_id)
             self.workspace.add_file(
                 file_id=file_id,
                 file_grp=self.output_file_grp,
                 page_id=page_id,
                 mimetype=MIMETYPE_PAGE,
-                local_filename="%s/%s.xml" % (self.output_file_grp, file_id),
-                content=to_xml(pcgts)
+                local_filename=local_filename,
+                content=content
             )
+
+        if delta and self.parameter['change_report']:
+            write_change_report(reports, str(Path(self.workspace.directory, self.parameter['change_report'])))
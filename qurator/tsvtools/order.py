@@ -0,0 +1,52 @@
+import numpy as np
+
+
+def _appearance_codes(keys):
+    """
+    Integer codes of `keys` that are ascending in order of the first appearance of each key.
+    """
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[np.argsort(first, kind='stable')] = np.arange(len(first))
+
+    return rank[inverse.reshape(-1)]
+
+
+def reading_order(region, line, hcenter, top, bottom):
+    """
+    Reading order of the tokens of a page as an index array.
+
+    Regions come in order of appearance. Within a region, the tokens are sorted by the vertical center of their
+    line (mean top + (mean bottom - mean top) / 2 of the tokens of the line), then by their horizontal center
+    `hcenter`. Ties keep the token order, i.e., the result is the same as that of sorting each region of a
+    DataFrame by sort_values(['vlinecenter', 'hcenter']).
+    """
+    line_codes = _appearance_codes(line)
+
+    top = np.asarray(top, dtype=np.float64)
+    bottom = np.asarray(bottom, dtype=np.float64)
+
+    count = np.bincount(line_codes)
+    mean_top = np.bincount(line_codes, weights=top) / count
+    mean_bottom = np.bincount(line_codes, weights=bottom) / count
+
+    vlinecenter = (mean_top + (mean_bottom - mean_top) / 2)[line_codes]
+
+    return np.lexsort((np.asarray(hcenter, dtype=np.float64), vlinecenter, _appearance_codes(region)))
+
+
+def join_lines(line, text, order):
+    """
+    Join the `text` of the tokens of each line with blanks, taking the tokens in `order` (see reading_order).
+    Returns (lines, texts) in ascending order of `line`.
+    """
+    line = np.asarray(line)
+
+    by_line = order[np.argsort(line[order], kind='stable')]
+
+    lines, starts = np.unique(line[by_line], return_index=True)
+
+    ends = list(starts[1:]) + [len(by_line)]
+
+    return lines, [" ".join(text[i] for i in by_line[start:end]) for start, end in zip(starts, ends)]
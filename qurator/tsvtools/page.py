@@ -0,0 +1,341 @@
+import glob
+import os
+import re
+from io import StringIO
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from lxml import etree as ET
+
+from . import metrics
+from .doclinks import count_doc_links
+from .normalize import unicode_normalize, compile_normalization_map
+from .ocr import get_conf_colors
+from .order import join_lines, reading_order
+from .pagexml import PAGE_PARSERS
+from .writer import TSVWriter
+
+
+def page2tsv_columns(purpose, min_confidence=None, max_confidence=None):
+
+    if purpose == "NERD":
+        out_columns = ['No.', 'TOKEN', 'NE-TAG', 'NE-EMB', 'ID', 'url_id', 'left', 'right', 'top', 'bottom', 'conf']
+    elif purpose == "OCR":
+        out_columns = ['TEXT', 'url_id', 'left', 'right', 'top', 'bottom', 'conf', 'line_id']
+        if min_confidence is not None and max_confidence is not None:
+            out_columns += ['ocrconf']
+    else:
+        raise RuntimeError("Unknown purpose.")
+
+    return out_columns
+
+
+def load_normalizer(normalization_file):
+
+    if normalization_file is None:
+        return unicode_normalize
+
+    normalization_map = pd.read_pickle(normalization_file)
+
+    normalization_table = compile_normalization_map(normalization_map.set_index('decimal'))
+
+    return lambda s: unicode_normalize(s, normalization_map=normalization_table)
+
+
+def page2tsv_frame(page_xml_file, purpose, url_id, scale_factor=1.0, min_confidence=None, max_confidence=None,
+                   normalize=unicode_normalize, parser='ocrd', conf_palette=None, continuous_conf_colors=False):
+    """
+    Convert a single PAGE-XML file into a DataFrame with the columns of a neat TSV file
+    (see page2tsv_columns). All tokens of the page are assigned to `url_id`.
+
+    `page_xml_file` can also be an already parsed PAGE document: either a PcGtsType (always read with the ocrd
+    reader) or a lxml tree (read with the fast reader without modifying it).
+
+    `parser` selects the PAGE-XML reader for files, see pagexml.PAGE_PARSERS.
+    `conf_palette` are the colors of the ocrconf column, `continuous_conf_colors` selects the continuous
+    interpolation of these colors, see ocr.get_conf_colors.
+    """
+
+    out_columns = page2tsv_columns(purpose, min_confidence, max_confidence)
+
+    tsv = []
+    line_info = []
+
+    if isinstance(page_xml_file, (ET._ElementTree, ET._Element)):
+        parser = 'fast'
+    elif not isinstance(page_xml_file, (str, os.PathLike)):
+        # PcGtsType, ocrd_models is not imported just for this check
+        parser = 'ocrd'
+
+    # texts are normalized in one go after parsing such that both stages can be timed separately
+    raw_texts = []
+
+    with metrics.stage('parse'):
+        for region_idx, text_lines in enumerate(PAGE_PARSERS[parser](page_xml_file)):
+            for line_id, line_bbox, text_equivs, words in text_lines:
+                # transform OCR coordinates using `scale_factor` to derive
+                # correct coordinates for the web presentation image
+                left, top, right, bottom = [int(scale_factor * x) for x in line_bbox]
+
+                if min_confidence is not None and max_confidence is not None:
+                    conf = np.max([text_equiv_conf for _, text_equiv_conf in text_equivs])
+                else:
+                    conf = np.nan
+
+                line_info.append((url_id, left, right, top, bottom, conf, line_id))
+
+                if len(words) <= 0:
+                    for text, _ in text_equivs:
+
+                        for text_part in text.split(" "):
+
+                            tsv.append((region_idx, len(line_info) - 1, left + (right - left) / 2.0,
+                                        url_id, left, right, top, bottom, line_id))
+                            raw_texts.append(text_part)
+                else:
+                    for word_bbox, textequiv in words:
+                        # transform OCR coordinates using `scale_factor` to derive
+                        # correct coordinates for the web presentation image
+                        left, top, right, bottom = [int(scale_factor * x) for x in word_bbox]
+                        tsv.append((region_idx, len(line_info) - 1, left + (right - left) / 2.0,
+                                    url_id, left, right, top, bottom, line_id))
+                        raw_texts.append(textequiv)
+
+    with metrics.stage('normalize'):
+        text = [normalize(raw_text) for raw_text in raw_texts]
+
+    metrics.count('lines', len(line_info))
+    metrics.count('tokens', len(tsv))
+
+    with metrics.stage('reading_order'):
+        line_info = pd.DataFrame(line_info, columns=['url_id', 'left', 'right', 'top', 'bottom', 'conf', 'line_id'])
+
+        if min_confidence is not None and max_confidence is not None:
+            line_info['ocrconf'] = get_conf_colors(line_info.conf.to_numpy(dtype=float), min_confidence,
+                                                   max_confidence, conf_palette, continuous_conf_colors)
+
+        if len(tsv) == 0:
+            return pd.DataFrame([], columns=out_columns)
+
+        rid, line, hcenter, _, _, _, top, bottom, _ = zip(*tsv)
+
+        order = reading_order(rid, line, hcenter, top, bottom)
+
+        if purpose == 'NERD':
+            tsv = pd.DataFrame([(text[i],) + tsv[i][3:] for i in order],
+                               columns=['TOKEN', 'url_id', 'left', 'right', 'top', 'bottom', 'line_id'])
+            tsv['No.'] = 0
+            tsv['NE-TAG'] = 'O'
+            tsv['NE-EMB'] = 'O'
+            tsv['ID'] = '-'
+            tsv['conf'] = '-'
+
+        elif purpose == 'OCR':
+            lines, texts = join_lines(line, text, order)
+
+            tsv = line_info.iloc[lines].reset_index(drop=True)
+            tsv['TEXT'] = texts
+
+        return tsv[out_columns].reset_index(drop=True)
+
+
+def page2tsv(page_xml_file, tsv_out_file, purpose, image_url, ner_rest_endpoint, ned_rest_endpoint,
+             noproxy, scale_factor, ned_threshold, min_confidence, max_confidence, ned_priority, normalization_file,
+             doc_index=False, parser='ocrd', conf_palette=None, annotation_retries=3, annotation_cache=None,
+             continuous_conf_colors=False, annotation_client=None):
+    """
+    Append a single PAGE-XML file to the TSV file `tsv_out_file`.
+
+    NER/NED requests are made by `annotation_client` (annotate.AnnotationClient) if given, i.e., callers that
+    convert many pages keep one client with its HTTP connections. Otherwise a client with `annotation_retries` and
+    `annotation_cache` is made for this page. If the annotation fails, the page is written unannotated.
+    """
+
+    print("page2tsv - processing file: {}".format(page_xml_file))
+
+    out_columns = page2tsv_columns(purpose, min_confidence, max_confidence)
+
+    if noproxy:
+        os.environ['no_proxy'] = '*'
+
+    url_id = count_doc_links(tsv_out_file, use_index=doc_index) if os.path.exists(tsv_out_file) else 0
+
+    with metrics.page(page_xml_file):
+        tsv = page2tsv_frame(page_xml_file, purpose, url_id, scale_factor, min_confidence, max_confidence,
+                             load_normalizer(normalization_file), parser, conf_palette, continuous_conf_colors)
+
+        if purpose == 'NERD' and ner_rest_endpoint is not None and len(tsv) > 0:
+            from .annotate import AnnotationClient, annotate_frame
+
+            if annotation_client is None:
+                annotation_client = AnnotationClient(ner_rest_endpoint, ned_rest_endpoint, ned_threshold,
+                                                     ned_priority, max_retries=annotation_retries,
+                                                     cache=annotation_cache)
+
+            tsv = annotate_frame(tsv, purpose, annotation_client)
+
+        # header (new file), '# url' line and rows in one write
+        with metrics.stage('write'), TSVWriter(tsv_out_file, out_columns) as writer:
+            writer.write_part(image_url, tsv)
+
+
+def read_batch_manifest(batch_input, image_url, scale_factor):
+    """
+    Returns a list of (page_xml_file, image_url, scale_factor) jobs.
+
+    `batch_input` is either a directory, whose *.xml files are converted in sorted order, or a TSV manifest
+    with columns page_xml_file, image_url and, optionally, scale_factor. Relative paths in the manifest are
+    resolved against the directory of the manifest. Lines starting with '#' are comments.
+
+    In case of a directory, `image_url` is used for every page. The placeholders {{ file }} and {{ page_no }} are
+    replaced by the file name stem and the digits contained in it.
+    """
+
+    if os.path.isdir(batch_input):
+        jobs = []
+        for page_xml_file in sorted(glob.glob(os.path.join(batch_input, '*.xml'))):
+            stem = Path(page_xml_file).stem
+            url = image_url.replace('{{ file }}', stem).replace('{{ page_no }}', re.sub('[^0-9]', '', stem))
+            jobs.append((page_xml_file, url, scale_factor))
+
+        return jobs
+
+    # only whole lines are comments, '#' may occur in image URLs (fragments, IIIF)
+    with open(batch_input, encoding='utf-8') as f:
+        lines = [line for line in f if not line.startswith('#')]
+
+    manifest = pd.read_csv(StringIO(''.join(lines)), sep='\t', quoting=3)
+
+    if 'scale_factor' not in manifest.columns:
+        manifest['scale_factor'] = scale_factor
+
+    base_dir = os.path.dirname(batch_input)
+
+    return [(os.path.join(base_dir, row.page_xml_file), row.image_url, float(row.scale_factor))
+            for row in manifest.itertuples()]
+
+
+def page2tsv_batch(jobs, tsv_out_file, purpose, ner_rest_endpoint, ned_rest_endpoint, noproxy, ned_threshold,
+                   min_confidence, max_confidence, ned_priority, normalization_file, parser='ocrd', conf_palette=None,
+                   annotation_workers=1, annotation_batch_size=1, annotation_retries=3, annotation_report=None,
+                   annotation_cache=None, continuous_conf_colors=False):
+    """
+    Convert a sequence of (page_xml_file, image_url, scale_factor) jobs into one multi-page TSV file.
+    The pages get consecutive url_ids in the order of `jobs`. An existing `tsv_out_file` is continued.
+
+    NER/NED requests are made by an annotate.AnnotationClient with `annotation_workers`, `annotation_batch_size`
+    and `annotation_retries`. Pages whose annotation fails are written unannotated. The annotation status of each
+    page is written to the TSV file `annotation_report` if given. Service results are looked up in/stored to
+    `annotation_cache` (cache.AnnotationCache) if given.
+    """
+
+    out_columns = page2tsv_columns(purpose, min_confidence, max_confidence)
+
+    if noproxy:
+        os.environ['no_proxy'] = '*'
+
+    url_id = count_doc_links(tsv_out_file) if os.path.exists(tsv_out_file) else 0
+
+    normalize = load_normalizer(normalization_file)
+
+    def frames():
+        for n, (page_xml_file, _, scale_factor) in enumerate(jobs):
+
+            print("page2tsv - processing file: {}".format(page_xml_file))
+
+            with metrics.page(page_xml_file):
+                tsv = page2tsv_frame(page_xml_file, purpose, url_id + n, scale_factor, min_confidence,
+                                     max_confidence, normalize, parser, conf_palette, continuous_conf_colors)
+            yield tsv
+
+    if purpose == 'NERD' and ner_rest_endpoint is not None:
+        from .annotate import AnnotationClient
+
+        client = AnnotationClient(ner_rest_endpoint, ned_rest_endpoint, ned_threshold, ned_priority,
+                                  num_workers=annotation_workers, batch_size=annotation_batch_size,
+                                  max_retries=annotation_retries, cache=annotation_cache)
+        annotated = client.annotate(frames())
+    else:
+        annotated = ((tsv, None) for tsv in frames())
+
+    report = []
+    with TSVWriter(tsv_out_file, out_columns) as writer:
+
+        for (page_xml_file, image_url, _), (tsv, error) in zip(jobs, annotated):
+
+            if error is not None:
+                print("page2tsv - annotation failed for file {}: {}".format(page_xml_file, error))
+
+            report.append((page_xml_file, image_url, 'ok' if error is None else 'failed',
+                           '' if error is None else str(error)))
+
+            with metrics.page(page_xml_file), metrics.stage('write'):
+                writer.write_part(image_url, tsv)
+
+    if annotation_report is not None:
+        pd.DataFrame(report, columns=['page_xml_file', 'image_url', 'status', 'error']).\
+            to_csv(annotation_report, sep="\t", quoting=3, index=False)
+
+
+def scan_xml_files(directory):
+    """
+    Yields the *.xml files below `directory` (depth first, sorted per directory). Like glob, hidden files and
+    directories are skipped. Uses os.scandir, i.e., no extra stat calls on most file systems.
+    """
+    stack = [directory]
+    while len(stack) > 0:
+        with os.scandir(stack.pop()) as entries:
+            entries = sorted(entries, key=lambda entry: entry.name)
+
+        sub_dirs = []
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+
+            if entry.is_dir():
+                sub_dirs.append(entry.path)
+            elif entry.name.endswith('.xml') and entry.is_file():
+                yield entry.path
+
+        stack += reversed(sub_dirs)
+
+
+def page2tsv_jobs(xls_file, directory):
+    """
+    Yields the (page_xml_file, tsv_out_file, image_url, scale_factor) jobs of the files listed in `xls_file`
+    (columns Filename, iiif_url, scale_factor) or found in `directory` (PPN*/ directories).
+    """
+    if xls_file is not None:
+
+        if xls_file.endswith(".xls"):
+            df = pd.read_excel(xls_file)
+        else:
+            df = pd.read_excel(xls_file, engine='openpyxl')
+
+        df = df.dropna(how='all')
+
+        for _, row in df.iterrows():
+            yield '{}.xml'.format(row.Filename), '{}.tsv'.format(row.Filename), \
+                row.iiif_url.replace('/full/full', '/left,top,width,height/full'), row.scale_factor
+
+    elif directory is not None:
+        for file in scan_xml_files(directory):
+
+            ma = re.match('(.*/(PPN[0-9X]+)/.*?([0-9]+).*?).xml', file)
+
+            if ma:
+                yield file, '{}.tsv'.format(ma.group(1)), \
+                    'https://content.staatsbibliothek-berlin.de/dc/{}-{:08d}/left,top,width,height/full/0/default.jpg'.\
+                    format(ma.group(2), int(ma.group(3))), 1.0
+
+
+def page2tsv_commands(xls_file, directory, purpose):
+    """
+    Print page2tsv command lines for the files listed in `xls_file` or found in `directory` (see page2tsv_jobs).
+    """
+    for page_xml_file, tsv_out_file, image_url, scale_factor in page2tsv_jobs(xls_file, directory):
+
+        print('page2tsv {}{} {} --image-url={} --scale-factor={} --purpose={}'.
+              format('$(OPTIONS) ' if xls_file is not None else '', page_xml_file, tsv_out_file, image_url,
+                     scale_factor, purpose))
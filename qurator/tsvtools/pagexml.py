@@ -0,0 +1,203 @@
+from lxml import etree as ET
+
+PAGE_NAMESPACES = [
+    'http://schema.primaresearch.org/PAGE/gts/pagecontent/2013-07-15',
+    'http://schema.primaresearch.org/PAGE/gts/pagecontent/2016-07-15',
+    'http://schema.primaresearch.org/PAGE/gts/pagecontent/2017-07-15',
+    'http://schema.primaresearch.org/PAGE/gts/pagecontent/2018-07-15',
+    'http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15'
+]
+
+# Same order as ocrd_models.constants.PAGE_REGION_TYPES, which determines the "document" order of get_AllRegions.
+REGION_TYPES = ['Advert', 'Chart', 'Chem', 'Custom', 'Graphic', 'Image', 'LineDrawing', 'Map', 'Maths', 'Music',
+                'Noise', 'Separator', 'Table', 'Text', 'Unknown']
+
+REGION_RANK = {region_type + 'Region': rank for rank, region_type in enumerate(REGION_TYPES)}
+
+# Both readers return the text regions of a page in reading order as lists of text lines:
+#
+#   (line_id, (left, top, right, bottom), [(unicode, conf), ...], [((left, top, right, bottom), unicode), ...])
+#
+# i.e. id, bounding box and all TextEquivs of the line followed by bounding box and first TextEquiv of each word.
+
+
+def ocrd_page_regions(page_xml_file):
+    """
+    `page_xml_file` is either a file name or an already parsed PcGtsType.
+    """
+    # ocrd_models is only loaded if this reader is used.
+    from ocrd_models.ocrd_page import PcGtsType, parse
+    from ocrd_utils import bbox_from_points
+
+    if isinstance(page_xml_file, PcGtsType):
+        pcgts = page_xml_file
+    else:
+        pcgts = parse(page_xml_file)
+
+    for region in pcgts.get_Page().get_AllRegions(classes=['Text'], order='reading-order'):
+        lines = []
+        for text_line in region.get_TextLine():
+
+            words = []
+            for word in text_line.get_Word():
+                # XXX TODO make this configurable
+                textequiv = ''
+                list_textequivs = word.get_TextEquiv()
+                if list_textequivs:
+                    textequiv = list_textequivs[0].get_Unicode()
+
+                words.append((bbox_from_points(word.get_Coords().points), textequiv))
+
+            lines.append((text_line.id, bbox_from_points(text_line.get_Coords().points),
+                          [(text_equiv.get_Unicode(), text_equiv.conf) for text_equiv in text_line.get_TextEquiv()],
+                          words))
+
+        yield lines
+
+
+def _localname(elem):
+    return elem.tag.rsplit('}', 1)[-1]
+
+
+def bbox_from_coords(elem, ns):
+    """
+    (left, top, right, bottom) of the Coords of a PAGE element, `ns` is '{namespace}'.
+    """
+    coords = elem.find(ns + 'Coords')
+
+    if coords.get('points') is not None:
+        xys = [pair.split(',') for pair in coords.get('points').split(' ')]
+        xs = [int(x) for x, _ in xys]
+        ys = [int(y) for _, y in xys]
+    else:
+        # PAGE 2010-2013 style <Point x="" y=""/> coordinates
+        points = coords.findall(ns + 'Point')
+        xs = [int(point.get('x')) for point in points]
+        ys = [int(point.get('y')) for point in points]
+
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _text_equivs(elem, ns):
+
+    ret = []
+    for text_equiv in elem.iterfind(ns + 'TextEquiv'):
+        conf = text_equiv.get('conf')
+        ret.append((text_equiv.findtext(ns + 'Unicode', default=''), float(conf) if conf is not None else None))
+
+    return ret
+
+
+def _reading_order(group, ns):
+    """
+    Region ids of a ReadingOrder group, with the semantics of PageType._get_recursive_reading_order.
+    """
+    if _localname(group).startswith('OrderedGroup'):
+        elements = sorted([child for child in group if _localname(child) in ('RegionRefIndexed', 'OrderedGroupIndexed',
+                                                                             'UnorderedGroupIndexed')],
+                          key=lambda child: int(child.get('index')))
+    else:
+        elements = group.findall(ns + 'RegionRef') + group.findall(ns + 'OrderedGroup') + \
+                   group.findall(ns + 'UnorderedGroup')
+
+    region_refs = []
+    for elem in elements:
+        region_refs.append(elem.get('regionRef'))
+        if not _localname(elem).startswith('RegionRef'):
+            region_refs.extend(_reading_order(elem, ns))
+
+    return region_refs
+
+
+def fast_page_regions(page_xml_file):
+    """
+    Streaming replacement of ocrd_page_regions that is based on lxml.etree.iterparse.
+
+    Processed TextLines, regions and the ReadingOrder are cleared from the tree right away, i.e., only the extracted
+    line tuples are kept in memory. Region order follows PageType.get_AllRegions(classes=['Text'],
+    order='reading-order'): regions in reading order first, then the remaining ones in "document" order.
+
+    `page_xml_file` can also be an already parsed lxml tree, which is walked without modification.
+    """
+    ns = None
+    reading_order = []
+
+    # region records: [rank, id, children, lines]
+    page = [None, None, [], []]
+    stack = [page]
+
+    tags = ['{*}PcGts', '{*}ReadingOrder', '{*}TextLine'] + ['{*}' + region_type for region_type in REGION_RANK.keys()]
+
+    if isinstance(page_xml_file, (ET._ElementTree, ET._Element)):
+        events = ET.iterwalk(page_xml_file, events=('start', 'end'), tag=tags)
+        clear = False
+    else:
+        events = ET.iterparse(page_xml_file, events=('start', 'end'), tag=tags)
+        clear = True
+
+    for event, elem in events:
+        localname = _localname(elem)
+
+        if event == 'start':
+            if localname == 'PcGts':
+                ns = elem.tag[:-len(localname)]
+                if ns[1:-1] not in PAGE_NAMESPACES:
+                    raise RuntimeError("Unknown PAGE namespace: {}".format(ns))
+
+            elif localname in REGION_RANK:
+                region = [REGION_RANK[localname], elem.get('id'), [], []]
+
+                # 'Map' is not recursive in 2019 schema
+                if localname != 'MapRegion' or len(stack) == 1:
+                    stack[-1][2].append(region)
+
+                stack.append(region)
+            continue
+
+        if localname == 'TextLine':
+            stack[-1][3].append((elem.get('id'), bbox_from_coords(elem, ns), _text_equivs(elem, ns),
+                                 [(bbox_from_coords(word, ns), (_text_equivs(word, ns) or [('', None)])[0][0])
+                                  for word in elem.iterfind(ns + 'Word')]))
+
+        elif localname == 'ReadingOrder':
+            group = elem.find(ns + 'OrderedGroup')
+            if group is None:
+                group = elem.find(ns + 'UnorderedGroup')
+            if group is not None:
+                reading_order = _reading_order(group, ns)
+
+        elif localname in REGION_RANK:
+            stack.pop()
+
+        elif localname == 'PcGts':
+            continue
+
+        if not clear:
+            continue
+
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+    regions = []
+
+    def _flatten(region):
+        for child in sorted(region[2], key=lambda r: r[0]):
+            if child[0] == REGION_RANK['TextRegion']:
+                regions.append(child)
+            _flatten(child)
+
+    _flatten(page)
+
+    if len(reading_order) > 0:
+        id2region = {region[1]: region for region in regions}
+        in_reading_order = [id2region[region_id] for region_id in reading_order if region_id in id2region]
+
+        ids_in_reading_order = set(id(region) for region in in_reading_order)
+        regions = in_reading_order + [r for r in regions if id(r) not in ids_in_reading_order]
+
+    for region in regions:
+        yield region[3]
+
+
+PAGE_PARSERS = {'ocrd': ocrd_page_regions, 'fast': fast_page_regions}
@@ -0,0 +1,172 @@
+import json
+from io import BytesIO
+
+import pandas as pd
+
+from .doclinks import is_doc_link, parse_doc_link
+
+# key of the neat TSV structure (header line, doc links, rows per part) in the Parquet schema metadata
+METADATA_KEY = b'neat'
+
+PARQUET_SUFFIXES = ('.parquet', '.pq')
+
+# tag columns that are always stored as categoricals
+CATEGORICAL_COLUMNS = ['NE-TAG', 'NE-EMB', 'ID', 'GND-ID']
+
+
+def is_parquet_file(filename):
+
+    return str(filename).lower().endswith(PARQUET_SUFFIXES)
+
+
+def parquet_sidecar_file(tsv_file):
+
+    return str(tsv_file) + '.parquet'
+
+
+def _pyarrow():
+    """
+    pyarrow is an optional dependency (extra 'parquet').
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet support requires pyarrow: pip install qurator_tsvtools[parquet]") from e
+
+    return pyarrow
+
+
+def _typed_column(values, numbers):
+    """
+    `numbers` are the `values` (TSV fields, str) as parsed by pandas. Numeric columns are taken over if that does
+    not change the fields, i.e., if the column is written back exactly as it was read. Tag columns and columns with
+    few distinct values become categoricals.
+    """
+    if len(values) == 0:
+        return values
+
+    if pd.api.types.is_numeric_dtype(numbers) and not pd.api.types.is_bool_dtype(numbers) and \
+            (numbers.to_numpy().astype(str) == values.to_numpy().astype(str)).all():
+        return numbers
+
+    if values.name in CATEGORICAL_COLUMNS or values.nunique() <= len(values) // 2:
+        return values.astype('category')
+
+    return values
+
+
+def read_neat_tsv(tsv_file):
+    """
+    Read a neat TSV file as it is, i.e., without type inference by pandas and including its doc links.
+
+    Returns (tsv, metadata): `tsv` contains the typed columns (see _typed_column), `metadata` the header line and
+    one {'link', 'url', 'context', 'rows'} entry per document part. Rows in front of the first doc link make up a
+    part with link None. Empty lines and comment lines that are not doc links are dropped.
+    """
+    parts, lines = [], []
+
+    with open(tsv_file, 'rb') as f:
+
+        header = f.readline()
+
+        part = {'link': None, 'url': None, 'context': None, 'rows': 0}
+
+        for line in f:
+
+            if is_doc_link(line):
+                if part['link'] is not None or part['rows'] > 0:
+                    parts.append(part)
+
+                url, context = parse_doc_link(line)
+
+                part = {'link': line.rstrip(b'\r\n').decode('utf-8'), 'url': url, 'context': context, 'rows': 0}
+                continue
+
+            if line.startswith(b'#') or len(line.strip()) == 0:
+                continue
+
+            lines.append(line)
+            part['rows'] += 1
+
+        if part['link'] is not None or part['rows'] > 0:
+            parts.append(part)
+
+    data = header + b''.join(lines)
+
+    tsv = pd.read_csv(BytesIO(data), sep='\t', quoting=3, dtype=object, keep_default_na=False)
+    numbers = pd.read_csv(BytesIO(data), sep='\t', quoting=3, na_filter=False)
+
+    tsv = pd.DataFrame({column: _typed_column(tsv[column], numbers[column]) for column in tsv.columns})
+
+    return tsv, {'header': header.rstrip(b'\r\n').decode('utf-8'), 'parts': parts}
+
+
+def write_parquet(tsv, metadata, parquet_file):
+
+    pa = _pyarrow()
+
+    table = pa.Table.from_pandas(tsv, preserve_index=False)
+
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           METADATA_KEY: json.dumps(metadata).encode('utf-8')})
+
+    pa.parquet.write_table(table, parquet_file)
+
+
+def read_parquet(parquet_file, columns=None):
+    """
+    Returns (tsv, metadata) as read_neat_tsv.
+    """
+    table = _pyarrow().parquet.read_table(parquet_file, columns=columns)
+
+    metadata = json.loads(table.schema.metadata[METADATA_KEY])
+
+    return table.to_pandas(), metadata
+
+
+def read_parquet_tsv(parquet_file):
+    """
+    Parquet counterpart of qurator.utils.tsv.read_tsv: (tsv, urls, contexts) where urls/contexts are indexed by url_id.
+    """
+    tsv, metadata = read_parquet(parquet_file)
+
+    # the tsv tools modify these columns in place
+    tsv = tsv.astype({column: object for column in tsv.columns if isinstance(tsv[column].dtype, pd.CategoricalDtype)})
+
+    parts = [part for part in metadata['parts'] if part['link'] is not None]
+
+    return tsv.rename(columns={'GND-ID': 'ID'}), [part['url'] for part in parts], [part['context'] for part in parts]
+
+
+def write_neat_tsv(tsv, metadata, tsv_file):
+
+    lines = tsv.to_csv(sep="\t", quoting=3, index=False, header=False, lineterminator="\n").split('\n')
+
+    with open(tsv_file, 'w', encoding='utf-8') as f:
+
+        f.write(metadata['header'] + '\n')
+
+        pos = 0
+        for part in metadata['parts']:
+            if part['link'] is not None:
+                f.write(part['link'] + '\n')
+
+            if part['rows'] > 0:
+                f.write('\n'.join(lines[pos:pos + part['rows']]) + '\n')
+
+            pos += part['rows']
+
+
+def tsv2parquet(tsv_file, parquet_file):
+
+    tsv, metadata = read_neat_tsv(tsv_file)
+
+    write_parquet(tsv, metadata, parquet_file)
+
+
+def parquet2tsv(parquet_file, tsv_file):
+
+    tsv, metadata = read_parquet(parquet_file)
+
+    write_neat_tsv(tsv, metadata, tsv_file)
@@ -0,0 +1,211 @@
+"""
+page2tsv-run: converts the jobs of make-page2tsv-commands (see page.page2tsv_jobs) by a process pool.
+
+Every output file is written to a temporary file in its directory first and moved into place by os.replace, i.e.,
+an interrupted run never leaves a partial TSV file behind. The jobs are recorded in a state file (see JobState),
+such that a restarted run skips all outputs that are up to date.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from .page import page2tsv
+
+CHECKS = ['mtime', 'hash']
+
+
+class JobState:
+    """
+    Persistent job state of page2tsv_run (SQLite): per output file the signature (see input_signature) of the
+    input and options it was made from, and the status ('done' or 'failed') of the last attempt.
+
+    Updates are committed at most every `commit_interval` seconds (and on close), i.e., after a crash at most the
+    jobs of the last interval are repeated.
+    """
+
+    def __init__(self, filename, commit_interval=1.0):
+
+        self.filename = filename
+        self.commit_interval = commit_interval
+
+        self._con = sqlite3.connect(filename, timeout=60)
+        self._con.execute('CREATE TABLE IF NOT EXISTS jobs '
+                          '(tsv_out_file TEXT PRIMARY KEY, signature TEXT, status TEXT, error TEXT, finished REAL)')
+        self._con.commit()
+        self._last_commit = time.time()
+
+    def signature(self, tsv_out_file):
+        """
+        Signature of the last successful conversion into `tsv_out_file` or None.
+        """
+        row = self._con.execute("SELECT signature FROM jobs WHERE tsv_out_file = ? AND status = 'done'",
+                                (tsv_out_file,)).fetchone()
+
+        return None if row is None else row[0]
+
+    def update(self, tsv_out_file, signature, status, error=''):
+
+        self._con.execute('INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?)',
+                          (tsv_out_file, signature, status, error, time.time()))
+
+        if time.time() - self._last_commit >= self.commit_interval:
+            self._con.commit()
+            self._last_commit = time.time()
+
+    def close(self):
+
+        self._con.commit()
+        self._con.close()
+
+
+def _file_signature(filename, check):
+    """
+    Modification time and size (`check` 'mtime') or SHA-256 of the content (`check` 'hash') of `filename`.
+    """
+    if check == 'mtime':
+        stat = os.stat(filename)
+        return [stat.st_mtime_ns, stat.st_size]
+
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def input_signature(page_xml_file, image_url, scale_factor, options, check='mtime'):
+    """
+    Hash of everything that determines an output file: the job parameters, the conversion `options` and the input
+    files, i.e., the PAGE-XML file and the normalization file of the options (if any), either by their modification
+    time and size (`check` 'mtime') or by their content (`check` 'hash').
+    """
+    if check not in CHECKS:
+        raise ValueError("Unknown check: {}".format(check))
+
+    content = _file_signature(page_xml_file, check)
+
+    normalization_content = None
+    if options.get('normalization_file') is not None:
+        normalization_content = _file_signature(options['normalization_file'], check)
+
+    return hashlib.sha256(json.dumps([str(page_xml_file), image_url, float(scale_factor), options, content,
+                                      normalization_content], sort_keys=True).encode('utf-8')).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _annotation_client(ner_rest_endpoint, ned_rest_endpoint, ned_threshold, ned_priority, max_retries):
+    """
+    The annotate.AnnotationClient of all jobs of this (worker) process, i.e., HTTP connections are kept across jobs.
+    """
+    from .annotate import AnnotationClient
+
+    return AnnotationClient(ner_rest_endpoint, ned_rest_endpoint, ned_threshold, ned_priority,
+                            max_retries=max_retries)
+
+
+def run_job(page_xml_file, tsv_out_file, image_url, scale_factor, options, check, known_signature):
+    """
+    Convert a single page unless `known_signature` (see JobState.signature) is still valid.
+    Returns (tsv_out_file, status, signature, error), where status is 'done', 'skipped' or 'failed'.
+    """
+    try:
+        signature = input_signature(page_xml_file, image_url, scale_factor, options, check)
+    except OSError as e:
+        return tsv_out_file, 'failed', None, str(e)
+
+    if signature == known_signature and os.path.exists(tsv_out_file):
+        return tsv_out_file, 'skipped', signature, ''
+
+    annotation_client = None
+    if options['purpose'] == 'NERD' and options['ner_rest_endpoint'] is not None:
+        annotation_client = _annotation_client(options['ner_rest_endpoint'], options['ned_rest_endpoint'],
+                                               options['ned_threshold'], options['ned_priority'],
+                                               options['annotation_retries'])
+
+    tmp_file = '{}.{}.tmp'.format(tsv_out_file, os.getpid())
+    try:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+        page2tsv(page_xml_file, tmp_file, options['purpose'], image_url, options['ner_rest_endpoint'],
+                 options['ned_rest_endpoint'], options['noproxy'], scale_factor, options['ned_threshold'],
+                 options['min_confidence'], options['max_confidence'], options['ned_priority'],
+                 options['normalization_file'], parser=options['parser'],
+                 annotation_retries=options['annotation_retries'], annotation_client=annotation_client)
+
+        os.replace(tmp_file, tsv_out_file)
+
+    except Exception as e:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+        return tsv_out_file, 'failed', signature, '{}: {}'.format(type(e).__name__, e)
+
+    return tsv_out_file, 'done', signature, ''
+
+
+def _run_jobs(fn, jobs, num_workers):
+    """
+    Yields fn(*job) for all jobs in order. With more than one worker, the jobs are run by a process pool that
+    holds only a bounded number of pending jobs, i.e., `jobs` can be a (long) generator.
+    """
+    if num_workers <= 1:
+        for job in jobs:
+            yield fn(*job)
+        return
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        pending = deque()
+        for job in jobs:
+            pending.append(executor.submit(fn, *job))
+
+            if len(pending) > 4 * num_workers:
+                yield pending.popleft().result()
+
+        while len(pending) > 0:
+            yield pending.popleft().result()
+
+
+def page2tsv_run(jobs, state_file, options, num_workers=1, check='mtime'):
+    """
+    Run the (page_xml_file, tsv_out_file, image_url, scale_factor) `jobs` with `num_workers` processes (0: one per
+    CPU). `options` are the page2tsv arguments (purpose, ner_rest_endpoint, ned_rest_endpoint, noproxy,
+    ned_threshold, min_confidence, max_confidence, ned_priority, normalization_file, parser, annotation_retries).
+
+    Outputs whose signature (see input_signature, `check`) did not change since their last conversion according
+    to `state_file` (see JobState) are skipped. Returns the number of {'done', 'skipped', 'failed'} jobs.
+    """
+    if num_workers <= 0:
+        num_workers = os.cpu_count()
+
+    state = JobState(state_file)
+
+    counts = {'done': 0, 'skipped': 0, 'failed': 0}
+    try:
+        def tasks():
+            for page_xml_file, tsv_out_file, image_url, scale_factor in jobs:
+                yield (page_xml_file, tsv_out_file, image_url, scale_factor, options, check,
+                       state.signature(str(tsv_out_file)))
+
+        for tsv_out_file, status, signature, error in _run_jobs(run_job, tasks(), num_workers):
+            tsv_out_file = str(tsv_out_file)
+
+            counts[status] += 1
+
+            if status == 'failed':
+                print("page2tsv-run - failed: {}: {}".format(tsv_out_file, error))
+
+            if status != 'skipped':
+                state.update(tsv_out_file, signature, status, error)
+    finally:
+        state.close()
+
+    print("page2tsv-run - {done} converted, {skipped} up to date, {failed} failed.".format(**counts))
+
+    return counts
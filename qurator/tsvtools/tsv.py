@@ -0,0 +1,485 @@
+import json
+import os
+from io import BytesIO, StringIO
+
+import numpy as np
+import pandas as pd
+
+from qurator.utils.tsv import write_tsv
+
+from . import metrics
+from .doclinks import is_doc_link, iter_doc_parts, parse_doc_link, read_doc_links
+from .parquet import is_parquet_file, read_parquet_tsv
+
+
+def read_tsv(tsv_file):
+    """
+    qurator.utils.tsv.read_tsv with the doc link rule of doclinks.is_doc_link: (tsv, urls, contexts) where
+    urls/contexts are indexed by url_id.
+    """
+    tsv = pd.read_csv(tsv_file, sep='\t', comment='#', quoting=3).rename(columns={'GND-ID': 'ID'})
+
+    links = read_doc_links(tsv_file)
+
+    return tsv, [url for url, _ in links], [context for _, context in links]
+
+
+def iter_doc_lines(tsv_file):
+    """
+    Read a neat TSV file in one pass with the doc link rule of doclinks.is_doc_link and otherwise the same rules as
+    qurator.utils.tsv.extract_doc_links.
+
+    Yields ('header', fields), then ('url', url) or ('context', context) for each doc link line and
+    ('row', fields) for each data row that follows a doc link. Rows in front of the first doc link are skipped.
+    """
+    with open(tsv_file, 'rb') as f:
+
+        header = f.readline()
+        if len(header) == 0:
+            return
+
+        yield 'header', header.decode('utf-8').split()
+
+        in_part = False
+        for line in f:
+
+            if is_doc_link(line):
+                in_part = True
+
+                url, context = parse_doc_link(line)
+                if url is None:
+                    yield 'context', context
+                else:
+                    yield 'url', url
+                continue
+
+            if not in_part:
+                continue
+
+            line = '\t'.join(line.decode('utf-8').split())
+
+            if line.count('\t') == 2:
+                line = "\t" + line
+
+            if line.count('\t') >= 3:
+                # comment lines are skipped by pandas
+                if not line.startswith('#'):
+                    yield 'row', line.split('\t')
+                continue
+
+            if line.startswith('#'):
+                continue
+
+            if len(line) == 0:
+                continue
+
+            print('Line error: |', line, '|Number of Tabs: ', line.count('\t'))
+
+
+def extract_document_links(tsv_file, url_file):
+
+    url = None
+    with open(url_file, 'w') as f:
+
+        f.write('url\n')
+
+        for kind, value in iter_doc_lines(tsv_file):
+
+            if kind == 'url':
+                url = value
+            elif kind != 'context':
+                continue
+
+            # the url of a context part is the one of the preceding part, as in extract_doc_links
+            f.write((url if url is not None else '') + '\n')
+
+
+def annotate_tsv(tsv_file, annotated_tsv_file):
+    """
+    Set the url_id column of each row to the index of its document part. The file is processed in one pass,
+    row by row.
+    """
+    url_id = -1
+    with open(annotated_tsv_file, 'w') as f:
+
+        for kind, value in iter_doc_lines(tsv_file):
+
+            if kind == 'header':
+                header = value
+                url_id_column = header.index('url_id') if 'url_id' in header else len(header)
+
+                f.write('\t'.join(header[:url_id_column] + ['url_id'] + header[url_id_column + 1:]) + '\n')
+
+            elif kind == 'row':
+                fields = value + [''] * (len(header) - len(value))
+
+                f.write('\t'.join(fields[:url_id_column] + [str(url_id)] + fields[url_id_column + 1:]) + '\n')
+
+            else:
+                url_id += 1
+
+
+def sanitized_sentence_numbers_legacy(tsv, prev=None):
+    """
+    Row by row reference implementation of sanitized_sentence_numbers.
+    """
+    tsv = tsv.copy()
+
+    word_pos = 0 if prev is None else prev + 1
+    prev_pos = 0 if prev is None else prev
+    for idx, _ in tsv.iterrows():
+
+        if prev_pos != 0 and not str(tsv.loc[idx, 'NE-TAG']).startswith('I-') and  \
+                tsv.loc[idx, 'No.'] == 0 or len(tsv.loc[idx, 'TOKEN']) == 0:
+            word_pos = 0
+
+        prev_pos = word_pos
+
+        tsv.loc[idx, 'No.'] = word_pos
+
+        word_pos += 1
+
+    return tsv['No.']
+
+
+def sanitized_sentence_numbers(tsv, prev=None):
+    """
+    Renumber the words of the sentences of `tsv` (column No.). A new sentence starts at an empty TOKEN and at a
+    token with No. 0 that is not inside of an entity (NE-TAG I-...), unless the previous token already started a
+    sentence.
+
+    `prev` is the new No. of the token in front of `tsv` if `tsv` continues a previous part of the file.
+
+    Returns the new No. column.
+    """
+    if len(tsv) == 0:
+        return tsv['No.']
+
+    empty = (tsv.TOKEN.astype(str).str.len() == 0).to_numpy()
+    candidate = ((tsv['No.'] == 0) & ~tsv['NE-TAG'].astype(str).str.startswith('I-')).to_numpy()
+
+    # start[i] = empty[i] or (candidate[i] and not start[i-1]), start[0] = True:
+    # within a run of non-empty candidates the starts alternate, beginning with the negation of the start value
+    # in front of the run. That one is known: True if forced (empty or first token), False otherwise.
+    forced = empty.copy()
+    if prev is None:
+        forced[0] = True
+
+    toggle = candidate & ~forced
+
+    run_start = toggle & ~np.concatenate([[False], toggle[:-1]])
+    run_first = np.flatnonzero(run_start)
+    run_id = np.cumsum(run_start) - 1
+
+    pos_in_run = np.flatnonzero(toggle) - run_first[run_id[toggle]]
+
+    # a run at the beginning of a continued part follows the previous token
+    start_before_run = np.where(run_first > 0, forced[run_first - 1], prev == 0)
+
+    start = forced.copy()
+    start[toggle] = start_before_run[run_id[toggle]] ^ (pos_in_run % 2 == 0)
+
+    positions = np.arange(len(tsv))
+
+    sentence_first = np.maximum.accumulate(np.where(start, positions, -1 - (prev or 0)))
+
+    return pd.Series(positions - sentence_first, index=tsv.index, name='No.')
+
+
+# the columns that qurator.utils.ner.ner copies from the input row of each output token
+NER_ROW_COLUMNS = ['url_id', 'left', 'right', 'top', 'bottom']
+
+
+def _ner(tsv, ner_rest_endpoint, keep_tokenization, annotation_cache):
+    """
+    qurator.utils.ner.ner of `tsv`. Results are cached under the token sequence, i.e., the request payload:
+    ner runs on a copy whose NER_ROW_COLUMNS hold the row positions, which are mapped back to the values of the
+    rows of `tsv`, such that changes of other columns or coordinates do not cause a cache miss.
+    """
+    from qurator.utils.ner import ner
+
+    if annotation_cache is None:
+        tsv_tmp, _ = ner(tsv, ner_rest_endpoint, keep_tokenization=keep_tokenization)
+
+        return tsv_tmp
+
+    key = annotation_cache.key('tsv2tsv', ner_rest_endpoint, keep_tokenization, tsv.TOKEN.astype(str).tolist())
+
+    cached = annotation_cache.get(key)
+    if cached is not None:
+        tsv_tmp = pd.read_json(StringIO(cached), orient='split', dtype=False)
+    else:
+        positions = tsv.reset_index(drop=True).assign(**{column: np.arange(len(tsv)) for column in NER_ROW_COLUMNS})
+
+        tsv_tmp, _ = ner(positions, ner_rest_endpoint, keep_tokenization=keep_tokenization)
+
+        annotation_cache.put(key, tsv_tmp.to_json(orient='split'))
+
+    rows = tsv_tmp['url_id'].to_numpy(dtype=int)
+    for column in NER_ROW_COLUMNS:
+        tsv_tmp[column] = tsv[column].to_numpy()[rows]
+
+    return tsv_tmp
+
+
+def _ner_output(tsv, tsv_tmp, keep_tokenization, sentence_split_only):
+
+    num_diff = -1
+    if keep_tokenization:
+        num_diff = sum(tsv.TOKEN != tsv_tmp.TOKEN)
+
+    if keep_tokenization and num_diff > 0:
+        print("Number of token differences: {}".format(num_diff))
+        raise AssertionError()
+
+    if sentence_split_only:
+        tsv_out = tsv
+        tsv_out['No.'] = tsv_tmp['No.']
+    else:
+        tsv_out = tsv_tmp
+
+    return tsv_out
+
+
+def _print_counts(counts, num_tokens, sentence_count, max_sentence_len):
+
+    if num_tokens:
+        print("Number of tokens {}". format(counts['num_tokens']), end=" ")
+
+    if sentence_count:
+        print("Number of sentences {}". format(counts['sentence_count']), end=" ")
+
+    if max_sentence_len:
+        print("Maximum sentence length {}.".format(counts['max_sentence_len']), end=" ")
+
+
+def _counts(tsv, counts=None):
+    """
+    Add the token/sentence counts of `tsv` to `counts`.
+    """
+    if counts is None:
+        counts = {'num_tokens': 0, 'sentence_count': 0, 'max_sentence_len': None}
+
+    counts['num_tokens'] += len(tsv)
+    counts['sentence_count'] += sum(tsv['No.'] == 0)
+
+    max_len = tsv['No.'].max()
+    if counts['max_sentence_len'] is None or pd.isna(counts['max_sentence_len']) or \
+            max_len > counts['max_sentence_len']:
+        counts['max_sentence_len'] = max_len
+
+    return counts
+
+
+def _out_columns(tsv):
+    # same columns as qurator.utils.tsv.write_tsv
+    if 'conf' in tsv.columns:
+        return ['No.', 'TOKEN', 'NE-TAG', 'NE-EMB', 'ID', 'url_id', 'left', 'right', 'top', 'bottom', 'conf']
+    else:
+        return ['No.', 'TOKEN', 'NE-TAG', 'NE-EMB', 'ID', 'url_id', 'left', 'right', 'top', 'bottom']
+
+
+def tsv2tsv(tsv_in_file, tsv_out_file, ner_rest_endpoint, noproxy,
+            num_tokens, sentence_count, max_sentence_len, keep_tokenization, sentence_split_only,
+            show_urls, just_zero, sanitize_sentence_numbers, show_columns, drop_column, annotation_cache=None,
+            legacy_sanitize=False, stream=False):
+    """
+    NER results are looked up in/stored to `annotation_cache` (cache.AnnotationCache) if given.
+    `legacy_sanitize` selects the row by row implementation of the sentence number sanitization.
+    `stream`: see tsv2tsv_stream.
+
+    `tsv_in_file` can also be a Parquet file (see parquet.tsv2parquet). It is always processed as a whole, i.e.,
+    `stream` is ignored (with a warning).
+    """
+
+    if noproxy:
+        os.environ['no_proxy'] = '*'
+
+    keep_tokenization = keep_tokenization or sentence_split_only
+
+    if stream and is_parquet_file(tsv_in_file):
+        print("Warning: {} is a Parquet file, --stream is ignored and the whole file is read.".format(tsv_in_file))
+
+    elif stream:
+        return tsv2tsv_stream(tsv_in_file, tsv_out_file, ner_rest_endpoint, num_tokens, sentence_count,
+                              max_sentence_len, keep_tokenization, sentence_split_only, show_urls, just_zero,
+                              sanitize_sentence_numbers, show_columns, drop_column, annotation_cache,
+                              legacy_sanitize)
+
+    with metrics.stage('read'):
+        if is_parquet_file(tsv_in_file):
+            tsv, urls, contexts = read_parquet_tsv(tsv_in_file)
+        else:
+            tsv, urls, contexts = read_tsv(tsv_in_file)
+
+        tsv.loc[tsv.TOKEN.isnull(), 'TOKEN'] = ""
+
+    metrics.count('tokens', len(tsv))
+
+    print("Input file: {}".format(tsv_in_file))
+
+    if show_urls:
+        if urls is None or len(urls) == 0:
+            print("URLS missing!")
+        else:
+            print("URLS:{}".format(urls))
+
+    if show_columns:
+        print("Columns: ", " ".join([ c for c in tsv.columns]))
+
+    if tsv['No.'].max() > 0 and just_zero:
+
+        print("File {} already has sentence splitting (--just-zero). Skipping.".format(tsv_in_file))
+        return
+
+    _print_counts(_counts(tsv), num_tokens, sentence_count, max_sentence_len)
+
+    if ner_rest_endpoint is None:
+        tsv_tmp = tsv
+    else:
+        with metrics.stage('ner'):
+            tsv_tmp = _ner(tsv, ner_rest_endpoint, keep_tokenization, annotation_cache)
+
+    if tsv_out_file is None:
+        print("\n")
+        return
+
+    print("\n==>")
+
+    print("Output file: {}".format(tsv_out_file))
+
+    _print_counts(_counts(tsv_tmp), num_tokens, sentence_count, max_sentence_len)
+
+    tsv_out = _ner_output(tsv, tsv_tmp, keep_tokenization, sentence_split_only)
+
+    if sanitize_sentence_numbers:
+        with metrics.stage('sanitize'):
+            tsv_out['No.'] = sanitized_sentence_numbers_legacy(tsv_out) if legacy_sanitize else \
+                sanitized_sentence_numbers(tsv_out)
+
+    tsv_out = tsv_out.drop(columns=[dc for dc in drop_column if dc in tsv_out.columns])
+
+    with metrics.stage('write'):
+        write_tsv(tsv_out, urls, contexts, tsv_out_file)
+
+    print("\n")
+
+
+def tsv2tsv_stream(tsv_in_file, tsv_out_file, ner_rest_endpoint, num_tokens, sentence_count, max_sentence_len,
+                   keep_tokenization, sentence_split_only, show_urls, just_zero, sanitize_sentence_numbers,
+                   show_columns, drop_column, annotation_cache=None, legacy_sanitize=False):
+    """
+    tsv2tsv that processes and writes one document part ('# <url>' or '#__CONTEXT__:' section) after the other,
+    i.e., memory use is bounded by the largest part instead of the whole file.
+
+    Differences to tsv2tsv: NER requests are made per part, the column types are determined per part and
+    empty parts are kept in the output.
+    """
+
+    print("Input file: {}".format(tsv_in_file))
+
+    if show_urls:
+        urls = [url for url, context, _ in iter_doc_parts(tsv_in_file) if url is not None or context is not None]
+        if len(urls) == 0:
+            print("URLS missing!")
+        else:
+            print("URLS:{}".format(urls))
+
+    if show_columns:
+        print("Columns: ", " ".join([c for c in _read_header(tsv_in_file).columns]))
+
+    if just_zero:
+        max_no = max([chunk['No.'].max() for chunk in pd.read_csv(tsv_in_file, sep='\t', comment='#', quoting=3,
+                                                                  usecols=['No.'], chunksize=1 << 20)])
+        if max_no > 0:
+            print("File {} already has sentence splitting (--just-zero). Skipping.".format(tsv_in_file))
+            return
+
+    in_counts, out_counts = None, None
+
+    if tsv_out_file is None:
+        for _, _, data in iter_doc_parts(tsv_in_file):
+            in_counts = _counts(_read_part(data), in_counts)
+
+        _print_counts(in_counts, num_tokens, sentence_count, max_sentence_len)
+        print("\n")
+        return
+
+    out_columns = None
+    pending = []
+    prev_no = None
+
+    with open(tsv_out_file, 'w') as f:
+
+        for url, context, data in iter_doc_parts(tsv_in_file):
+
+            with metrics.stage('read'):
+                tsv = _read_part(data)
+
+            metrics.count('tokens', len(tsv))
+
+            in_counts = _counts(tsv, in_counts)
+
+            if ner_rest_endpoint is not None and len(tsv) > 0:
+                with metrics.stage('ner'):
+                    tsv_tmp = _ner(tsv, ner_rest_endpoint, keep_tokenization, annotation_cache)
+
+                tsv_out = _ner_output(tsv, tsv_tmp, keep_tokenization, sentence_split_only)
+            else:
+                tsv_tmp = tsv_out = tsv
+
+            out_counts = _counts(tsv_tmp, out_counts)
+
+            if sanitize_sentence_numbers and len(tsv_out) > 0:
+                with metrics.stage('sanitize'):
+                    tsv_out['No.'] = sanitized_sentence_numbers_legacy(tsv_out, prev_no) if legacy_sanitize else \
+                        sanitized_sentence_numbers(tsv_out, prev_no)
+                prev_no = tsv_out['No.'].iloc[-1]
+
+            tsv_out = tsv_out.drop(columns=[dc for dc in drop_column if dc in tsv_out.columns])
+
+            if url is not None:
+                pending.append('# ' + url + '\n')
+            elif context is not None:
+                pending.append('#__CONTEXT__:' + json.dumps(context) + '\n')
+
+            # the header is determined by the first annotated part
+            if out_columns is None and (len(tsv_out) > 0 or ner_rest_endpoint is None):
+                out_columns = _out_columns(tsv_out)
+                f.write('\t'.join(out_columns) + '\n')
+
+            if out_columns is None:
+                continue
+
+            f.write(''.join(pending))
+            pending = []
+
+            with metrics.stage('write'):
+                tsv_out.reindex(columns=out_columns).to_csv(f, sep="\t", quoting=3, index=False, header=False)
+
+        if out_columns is None:
+            f.write('\t'.join(_out_columns(_read_header(tsv_in_file))) + '\n' + ''.join(pending))
+
+    _print_counts(in_counts, num_tokens, sentence_count, max_sentence_len)
+
+    print("\n==>")
+
+    print("Output file: {}".format(tsv_out_file))
+
+    _print_counts(out_counts, num_tokens, sentence_count, max_sentence_len)
+
+    print("\n")
+
+
+def _read_header(tsv_file):
+
+    return pd.read_csv(tsv_file, sep='\t', comment='#', quoting=3, nrows=0).rename(columns={'GND-ID': 'ID'})
+
+
+def _read_part(data):
+
+    tsv = pd.read_csv(BytesIO(data), sep='\t', comment='#', quoting=3).rename(columns={'GND-ID': 'ID'})
+
+    tsv.loc[tsv.TOKEN.isnull(), 'TOKEN'] = ""
+
+    return tsv
@@ -0,0 +1,119 @@
+"""
+Direct writer of neat TSV files that does not go through DataFrame.to_csv for every page.
+"""
+import os
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+
+def tsv_header(columns):
+
+    return '\t'.join([str(column) for column in columns]) + '\n'
+
+
+def _formats_natively(dtype):
+    """
+    Whether tsv_rows formats columns of `dtype` itself (see tsv_rows).
+    """
+    if isinstance(dtype, pd.StringDtype):
+        return True
+
+    return isinstance(dtype, np.dtype) and (dtype.kind in 'iub' or dtype == np.float64 or dtype == object)
+
+
+def tsv_rows(tsv):
+    """
+    The rows of the DataFrame `tsv` as text, byte-identical to tsv.to_csv(sep='\t', quoting=3, index=False,
+    header=False). Columns of other types than int, float64, bool, object and str as well as fields that to_csv
+    refuses to write (tabs or newlines) are left to to_csv.
+    """
+    if len(tsv) == 0:
+        return ''
+
+    if len(tsv.columns) > 1 and all(_formats_natively(dtype) for dtype in tsv.dtypes):
+        values = tsv.to_numpy(dtype=object)
+        missing = pd.isna(values)
+
+        columns = []
+        for pos, dtype in enumerate(tsv.dtypes):
+            column = values[:, pos].tolist()
+
+            if isinstance(dtype, np.dtype) and dtype.kind in 'iub':
+                columns.append(list(map(str, column)))
+                continue
+
+            if missing[:, pos].any():
+                column = ['' if is_missing else value for value, is_missing in zip(column, missing[:, pos].tolist())]
+
+            # str of a float is its repr, as written by to_csv
+            columns.append([value if type(value) is str else str(value) for value in column])
+
+        text = '\n'.join(['\t'.join(row) for row in zip(*columns)]) + '\n'
+
+        if text.count('\n') == len(tsv) and text.count('\t') == len(tsv) * (len(columns) - 1):
+            return text
+
+    out = StringIO()
+    tsv.to_csv(out, sep="\t", quoting=3, index=False, header=False)
+
+    return out.getvalue()
+
+
+class TSVWriter:
+    """
+    Buffered writer of a neat TSV file: the header line (new files only) followed by document parts, i.e., a
+    '# <url>' line and the rows of a DataFrame (see tsv_rows). The text is written in blocks of at least
+    `buffer_size` characters and at close, i.e., small pages do not cost a write (or to_csv call) each.
+
+    `append`: continue an existing file, otherwise it is overwritten.
+    """
+
+    def __init__(self, tsv_out_file, columns, append=True, buffer_size=1 << 20):
+
+        self.buffer_size = buffer_size
+
+        new_file = not append or not os.path.exists(tsv_out_file)
+
+        self._f = open(tsv_out_file, 'a' if append else 'w', encoding='utf-8')
+        self._buffer = [tsv_header(columns)] if new_file else []
+        self._size = sum(len(text) for text in self._buffer)
+
+    def _add(self, text):
+
+        self._buffer.append(text)
+        self._size += len(text)
+
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def write_part(self, url, tsv=None):
+        """
+        A '# `url`' line followed by the rows of `tsv` (if any).
+        """
+        self._add('# ' + url + '\n')
+
+        if tsv is not None and len(tsv) > 0:
+            self._add(tsv_rows(tsv))
+
+    def flush(self):
+
+        self._f.write(''.join(self._buffer))
+        self._f.flush()
+
+        self._buffer = []
+        self._size = 0
+
+    def close(self):
+
+        self.flush()
+        self._f.close()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc):
+
+        self.close()
@@ -21,6 +21,9 @@ setup(
     packages=find_packages(exclude=["*.tests", "*.tests.*",
                                     "tests.*", "tests"]),
     install_requires=install_requires,
+    extras_require={
+        'parquet': ['pyarrow'],
+    },
     namespace_packages=['qurator'],
     package_data={
         '': ['*.json']
@@ -35,10 +38,13 @@ setup(
         "tsv2page=qurator.tsvtools.cli:tsv2page_cli",
         "alto2tsv=qurator.tsvtools.cli:alto2tsv_cli",
         "tsv2tsv=qurator.tsvtools.cli:tsv2tsv",
-        "make-page2tsv-commands=qurator.tsvtools.cli:make_page2tsv_commands"
+        "make-page2tsv-commands=qurator.tsvtools.cli:make_page2tsv_commands",
+        "page2tsv-run=qurator.tsvtools.cli:page2tsv_run_cli",
+        "tsv2parquet=qurator.tsvtools.cli:tsv2parquet_cli",
+        "parquet2tsv=qurator.tsvtools.cli:parquet2tsv_cli"
       ]
     },
-    python_requires='>=3.6.0',
+    python_requires='>=3.8',
     tests_require=['pytest'],
     classifiers=[
           'Intended Audience :: Science/Research',
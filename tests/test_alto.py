@@ -0,0 +1,191 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+
+from qurator.tsvtools.alto import ALTO_NAMESPACES, alto2tsv, alto_iterate_textblocks, alto_iterparse_textblocks
+from qurator.tsvtools.cli import alto2tsv_cli
+
+ALTO = """<?xml version="1.0" encoding="UTF-8"?>
+<alto {xmlns}>
+  <Layout>
+    <Page ID="P1">
+      <PrintSpace>
+        <TextBlock ID="TB1">
+          <TextLine HPOS="10" VPOS="10" WIDTH="300" HEIGHT="20">
+            <String CONTENT="Die" HPOS="10" VPOS="10" WIDTH="30" HEIGHT="20" WC="0.9"/>
+            <SP WIDTH="10" HPOS="40" VPOS="10"/>
+            <String CONTENT="Zei" HPOS="50" VPOS="10" WIDTH="30" HEIGHT="20" WC="0.7"/>
+            <HYP CONTENT="-" HPOS="80" VPOS="10" WIDTH="5"/>
+          </TextLine>
+          <TextLine HPOS="10.5" VPOS="40" WIDTH="300" HEIGHT="20">
+            <String CONTENT="tung" HPOS="10.5" VPOS="40" WIDTH="40.5" HEIGHT="20"/>
+          </TextLine>
+        </TextBlock>
+      </PrintSpace>
+    </Page>
+    <Page ID="P2">
+      <PrintSpace>
+        <TextBlock>
+          <TextLine HPOS="10" VPOS="10" WIDTH="300" HEIGHT="20">
+            <String CONTENT="Berlin" HPOS="10" VPOS="10" WIDTH="60" HEIGHT="20"/>
+          </TextLine>
+        </TextBlock>
+      </PrintSpace>
+    </Page>
+  </Layout>
+</alto>
+"""
+
+
+def write_alto(tmpdir, namespace):
+    alto_file = Path(tmpdir, 'alto.xml')
+    alto_file.write_text(ALTO.format(xmlns='xmlns="{}"'.format(namespace) if namespace else ''))
+
+    return str(alto_file)
+
+
+def convert(alto_file, tmpdir, purpose):
+    tsv_file = Path(tmpdir, purpose + '.tsv')
+    alto2tsv(alto_file, str(tsv_file), purpose, 'http://empty', None, None, False, 1.0, None, 1)
+
+    return pd.read_csv(tsv_file, sep='\t', comment='#', quoting=3)
+
+
+@pytest.mark.parametrize('namespace', ALTO_NAMESPACES)
+def test_alto_versions(tmpdir, namespace):
+    alto_file = write_alto(tmpdir, namespace)
+
+    tsv = convert(alto_file, tmpdir, 'NERD')
+    # HYP elements are not part of the tokens
+    assert tsv.TOKEN.to_list() == ['Die', 'Zei', 'tung', 'Berlin']
+    # word confidences (WC) only go into the OCR line conf, NERD conf is always '-'
+    assert tsv.conf.to_list() == ['-', '-', '-', '-']
+    assert tsv.right.to_list() == [40, 80, 51, 70]
+
+    tsv = convert(alto_file, tmpdir, 'OCR')
+    assert tsv.TEXT.to_list() == ['Die Zei', 'tung', 'Berlin']
+    assert tsv.conf.to_list()[0] == pytest.approx(0.8)
+    assert tsv.conf.isnull().to_list() == [False, True, True]
+
+
+def test_iterparse_equals_parse(tmpdir):
+    alto_file = write_alto(tmpdir, ALTO_NAMESPACES[2])
+
+    expected = [(block_id, len(block)) for block_id, block in alto_iterate_textblocks(alto_file)]
+
+    assert [(block_id, len(block)) for block_id, block in alto_iterparse_textblocks(alto_file)] == expected
+    assert [block_id for block_id, _ in expected] == ['TB1', '1']
+
+
+def test_unknown_namespace(tmpdir):
+    alto_file = write_alto(tmpdir, 'http://example.com/alto')
+
+    with pytest.raises(RuntimeError):
+        convert(alto_file, tmpdir, 'NERD')
+
+
+METS = """<?xml version="1.0" encoding="UTF-8"?>
+<mets:mets xmlns:mets="http://www.loc.gov/METS/" xmlns:xlink="http://www.w3.org/1999/xlink">
+  <mets:fileSec>
+    <mets:fileGrp USE="FULLTEXT">
+{alto_files}
+    </mets:fileGrp>
+    <mets:fileGrp USE="PRESENTATION">
+{image_files}
+    </mets:fileGrp>
+  </mets:fileSec>
+  <mets:structMap TYPE="PHYSICAL">
+    <mets:div ID="PHYS_0000" TYPE="physSequence">
+{pages}
+    </mets:div>
+  </mets:structMap>
+</mets:mets>
+"""
+
+
+def write_mets(tmpdir, num_pages):
+    files, images, pages = [], [], []
+    for n in range(1, num_pages + 1):
+        Path(tmpdir, 'FULLTEXT').mkdir(exist_ok=True)
+        Path(tmpdir, 'FULLTEXT', 'alto_{}.xml'.format(n)).write_text(
+            ALTO.format(xmlns='xmlns="{}"'.format(ALTO_NAMESPACES[n % 3 + 2])).replace('Berlin', 'Seite{}'.format(n)))
+
+        files.append('<mets:file ID="ALTO_{0}"><mets:FLocat LOCTYPE="URL" xlink:href="FULLTEXT/alto_{0}.xml"/>'
+                     '</mets:file>'.format(n))
+        images.append('<mets:file ID="IMG_{0}"><mets:FLocat LOCTYPE="URL" '
+                      'xlink:href="https://example.com/iiif/{0}/full/full/0/default.jpg"/></mets:file>'.format(n))
+        pages.append('<mets:div ID="PHYS_{0:04d}" ORDER="{0}" TYPE="page"><mets:fptr FILEID="ALTO_{0}"/>'
+                     '<mets:fptr FILEID="IMG_{0}"/></mets:div>'.format(n))
+
+    mets_file = Path(tmpdir, 'mets.xml')
+    mets_file.write_text(METS.format(alto_files='\n'.join(files), image_files='\n'.join(images),
+                                     pages='\n'.join(pages)))
+
+    return str(mets_file)
+
+
+@pytest.mark.parametrize('num_workers', [1, 2])
+def test_mets_equals_successive_calls(tmpdir, num_workers):
+    mets_file = write_mets(tmpdir, 5)
+
+    expected = Path(tmpdir, 'expected.tsv')
+    for n in range(1, 6):
+        alto2tsv(str(Path(tmpdir, 'FULLTEXT', 'alto_{}.xml'.format(n))), str(expected), 'NERD',
+                 'https://example.com/iiif/{}/full/full/0/default.jpg'.format(n), None, None, False, 1.0, None, 1)
+
+    tsv_file = Path(tmpdir, 'mets.tsv')
+    result = CliRunner().invoke(alto2tsv_cli, [mets_file, str(tsv_file), '--mets', '--image-file-grp',
+                                               'PRESENTATION', '--num-workers', str(num_workers)])
+    assert result.exit_code == 0, result.output
+
+    assert tsv_file.read_text() == expected.read_text()
+
+    tsv = pd.read_csv(tsv_file, sep='\t', comment='#', quoting=3)
+    assert tsv.url_id.unique().tolist() == [0, 1, 2, 3, 4]
+    assert tsv.loc[tsv.url_id == 3].TOKEN.to_list()[-1] == 'Seite4'
+
+
+def test_split_pages(tmpdir):
+    alto_file = write_alto(tmpdir, ALTO_NAMESPACES[4])
+
+    tsv_file = Path(tmpdir, 'pages.tsv')
+    result = CliRunner().invoke(alto2tsv_cli, [alto_file, str(tsv_file), '--split-pages', '--image-url',
+                                               'http://example.com/{{ page_id }}/{{ page_no }}'])
+    assert result.exit_code == 0, result.output
+
+    assert [line for line in tsv_file.read_text().splitlines() if line.startswith('#')] == \
+        ['# http://example.com/P1/1', '# http://example.com/P2/2']
+
+    tsv = pd.read_csv(tsv_file, sep='\t', comment='#', quoting=3)
+    assert tsv.url_id.to_list() == [0, 0, 0, 1]
+
+
+def test_split_pages_one_page_at_a_time(tmpdir, monkeypatch):
+    from qurator.tsvtools import alto
+    from qurator.tsvtools.writer import TSVWriter
+
+    alto_file = write_alto(tmpdir, ALTO_NAMESPACES[4])
+
+    events = []
+
+    alto_blocks_frame = alto.alto_blocks_frame
+    write_part = TSVWriter.write_part
+
+    def parse(blocks, purpose, url_id, scale_factor=1.0):
+        events.append(('parse', url_id))
+        return alto_blocks_frame(blocks, purpose, url_id, scale_factor)
+
+    def write(self, url, tsv=None):
+        events.append(('write', url))
+        return write_part(self, url, tsv)
+
+    monkeypatch.setattr(alto, 'alto_blocks_frame', parse)
+    monkeypatch.setattr(TSVWriter, 'write_part', write)
+
+    alto2tsv(alto_file, str(Path(tmpdir, 'pages.tsv')), 'NERD', 'http://example.com/{{ page_id }}', None, None, False,
+             1.0, None, 1, split_pages=True)
+
+    assert events == [('parse', 0), ('write', 'http://example.com/P1'),
+                      ('parse', 1), ('write', 'http://example.com/P2')]
@@ -0,0 +1,210 @@
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from qurator.utils.ner import ner
+from qurator.utils.ned import ned
+
+from qurator.tsvtools.annotate import AnnotationClient, _ner_tokens, align_ner_result
+from qurator.tsvtools.cache import AnnotationCache
+from qurator.tsvtools.page import page2tsv, page2tsv_batch, page2tsv_frame
+
+# an empty page followed by four pages with text
+PAGES = sorted(Path(__file__).parent.joinpath('testws', 'TESS').glob('*.xml'))[7:12]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Minimal sbb_ner/sbb_ned: punctuation is split off, sentences end at '.', capitalized words are locations.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server
+        data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+
+        with server.lock:
+            server.requests += 1
+            server.connections.add(self.client_address)
+            fail = server.fail > 0
+            server.fail -= 1
+
+        if fail:
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if self.path == '/ner':
+            sentences = [[]]
+            for word in re.findall(r'\w+|[^\w\s]', data['text']):
+                sentences[-1].append({'word': word, 'prediction': 'B-LOC' if word.istitle() else 'O'})
+                if word == '.':
+                    sentences.append([])
+            result = [sen for sen in sentences if len(sen) > 0]
+
+        elif self.path == '/ned/parse':
+            result = {token['word'] + '-LOC': {} for sen in data for token in sen if token['prediction'] != 'O'}
+
+        else:
+            result = {eid: {'ranking': [[eid, {'wikidata': 'Q{}'.format(len(eid)), 'proba_1': 0.9}]]}
+                      for eid in data}
+
+        body = json.dumps(result).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.connections = set()
+    server.fail = 0
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server, 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+    server.shutdown()
+    server.server_close()
+
+
+def _frames():
+    return [page2tsv_frame(str(page), 'NERD', n) for n, page in enumerate(PAGES)]
+
+
+def test_client_equals_ner_ned(stub_server):
+    _, url = stub_server
+
+    expected = []
+    for tsv in _frames():
+        # empty pages are not sent to the services
+        if len(tsv) > 0:
+            tsv, ner_result = ner(tsv, url + '/ner')
+            tsv, _ = ned(tsv, ner_result, url + '/ned', threshold=0.5, priority=1)
+        expected.append(tsv)
+
+    client = AnnotationClient(url + '/ner', url + '/ned', ned_threshold=0.5, ned_priority=1)
+
+    for (tsv, error), expected_tsv in zip(client.annotate(_frames()), expected):
+        assert error is None
+        pd.testing.assert_frame_equal(tsv, expected_tsv)
+
+
+def test_batches_and_workers(stub_server):
+    server, url = stub_server
+
+    single = list(AnnotationClient(url + '/ner', url + '/ned').annotate(_frames()))
+    num_requests = server.requests
+
+    batched = list(AnnotationClient(url + '/ner', url + '/ned', num_workers=2, batch_size=2).annotate(_frames()))
+
+    # NER, NED parse and NED request per batch
+    assert num_requests == 4 * 3
+    assert server.requests - num_requests == 3 * 3
+
+    for (tsv, error), (expected_tsv, _) in zip(batched, single):
+        assert error is None
+        pd.testing.assert_frame_equal(tsv, expected_tsv)
+
+
+def test_retries(stub_server):
+    server, url = stub_server
+    server.fail = 2
+
+    [(tsv, error)] = AnnotationClient(url + '/ner', max_retries=2, backoff=0).annotate_batch(_frames()[1:2])
+
+    assert error is None
+    assert server.requests == 3
+    assert (tsv['NE-TAG'] == 'B-LOC').any()
+
+
+def test_failure_report(stub_server, tmpdir):
+    server, url = stub_server
+    server.fail = 1
+
+    tsv_file = Path(tmpdir, 'out.tsv')
+    report_file = Path(tmpdir, 'report.tsv')
+    page2tsv_batch([(str(page), 'http://empty/{}'.format(n), 1.0) for n, page in enumerate(PAGES[1:3])],
+                   str(tsv_file), 'NERD', url + '/ner', None, False, None, None, None, 1, None,
+                   annotation_retries=0, annotation_report=str(report_file))
+
+    report = pd.read_csv(report_file, sep='\t', quoting=3)
+    assert report.status.to_list() == ['failed', 'ok']
+
+    tsv = pd.read_csv(tsv_file, sep='\t', comment='#', quoting=3)
+    expected = page2tsv_frame(str(PAGES[1]), 'NERD', 0)
+    assert tsv.loc[tsv.url_id == 0].TOKEN.to_list() == expected.TOKEN.to_list()
+    assert (tsv.loc[tsv.url_id == 1, 'NE-TAG'] == 'B-LOC').any()
+
+
+def test_cache(stub_server, tmpdir):
+    server, url = stub_server
+
+    cache = AnnotationCache(str(Path(tmpdir, 'cache.sqlite')))
+
+    first = list(AnnotationClient(url + '/ner', url + '/ned', cache=cache).annotate(_frames()))
+    num_requests = server.requests
+
+    second = list(AnnotationClient(url + '/ner', url + '/ned', cache=cache).annotate(_frames()))
+
+    assert server.requests == num_requests
+    assert cache.stats()['hits'] == 2 * 4
+
+    for (tsv, _), (expected_tsv, _) in zip(second, first):
+        pd.testing.assert_frame_equal(tsv, expected_tsv)
+
+    # other NED parameters are not taken from the cache
+    list(AnnotationClient(url + '/ner', url + '/ned', ned_threshold=0.5, cache=cache).annotate(_frames()))
+    assert server.requests == num_requests + 4 * 2
+
+
+def test_single_pages_share_client(stub_server, tmpdir):
+    server, url = stub_server
+
+    client = AnnotationClient(url + '/ner', url + '/ned')
+    for n, page in enumerate(PAGES[1:4]):
+        page2tsv(str(page), str(Path(tmpdir, 'out.tsv')), 'NERD', 'http://empty/{}'.format(n), url + '/ner',
+                 url + '/ned', False, 1.0, None, None, None, 1, None, annotation_client=client)
+
+    assert server.requests == 3 * 3
+    assert len(server.connections) == 1
+
+
+def test_failed_page_is_written_unannotated(stub_server, tmpdir):
+    server, url = stub_server
+    server.fail = 1
+
+    tsv_file = Path(tmpdir, 'out.tsv')
+    page2tsv(str(PAGES[1]), str(tsv_file), 'NERD', 'http://empty/0', url + '/ner', None, False, 1.0, None, None,
+             None, 1, None, annotation_retries=0)
+
+    tsv = pd.read_csv(tsv_file, sep='\t', comment='#', quoting=3)
+    assert tsv.TOKEN.to_list() == page2tsv_frame(str(PAGES[1]), 'NERD', 0).TOKEN.to_list()
+    assert (tsv['NE-TAG'] == 'O').all()
+
+
+def test_align_leading_sentence_break():
+    tsv = pd.DataFrame({'TOKEN': ['Berlin', '.'], 'url_id': 0, 'left': 0, 'right': 1, 'top': 0, 'bottom': 1})
+    ner_result = [[], [{'word': 'Berlin', 'prediction': 'B-LOC'}, {'word': '.', 'prediction': 'O'}]]
+
+    # kept at the start of a NER result, as by qurator.utils.ner.ner
+    assert align_ner_result(tsv, _ner_tokens(ner_result)).TOKEN.to_list() == ['', 'Berlin', '.']
+
+    # the sentence break behind the previous page of a batch
+    ner_tokens = _ner_tokens([[{'word': 'a', 'prediction': 'O'}]] + ner_result[1:])
+    assert align_ner_result(tsv.iloc[:1].assign(TOKEN='a'), ner_tokens).TOKEN.to_list() == ['a']
+    assert align_ner_result(tsv, ner_tokens, drop_leading_breaks=True).TOKEN.to_list() == ['Berlin', '.']
@@ -0,0 +1,103 @@
+from pathlib import Path
+
+import pandas as pd
+
+from qurator.tsvtools.cache import AnnotationCache
+from qurator.tsvtools.tsv import _ner
+
+
+def test_hits_and_misses(tmpdir):
+    cache = AnnotationCache(str(Path(tmpdir, 'cache.sqlite')))
+
+    key = cache.key('ner', 'http://localhost/ner', 'Hallo Welt')
+    assert key != cache.key('ner', 'http://localhost/ner', 'Hallo  Welt')
+
+    assert cache.get(key) is None
+    cache.put(key, '[[]]')
+    assert cache.get(key) == '[[]]'
+
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'entries': 1, 'size': 4}
+    cache.close()
+
+    # persistent
+    cache = AnnotationCache(str(Path(tmpdir, 'cache.sqlite')))
+    assert cache.get(key) == '[[]]'
+
+
+def test_lru_eviction(tmpdir):
+    cache = AnnotationCache(str(Path(tmpdir, 'cache.sqlite')), max_size=30)
+
+    for key in 'abc':
+        cache.put(key, key * 10)
+
+    # 'a' is used recently, i.e., 'b' is evicted by 'd'
+    assert cache.get('a') is not None
+    cache.put('d', 'd' * 10)
+
+    assert cache.get('b') is None
+    assert [cache.get(key) is not None for key in 'acd'] == [True, True, True]
+    assert cache.stats()['size'] == 30
+
+
+def test_tsv2tsv_ner_key(tmpdir, monkeypatch):
+    calls = []
+
+    def ner(tsv, ner_rest_endpoint, keep_tokenization=False):
+        """
+        Splits tokens at '-' and copies the row columns like qurator.utils.ner.ner.
+        """
+        calls.append(tsv.TOKEN.to_list())
+
+        return pd.DataFrame([(0, part, 'B-LOC' if part.istitle() else 'O', 'O', '-', row.url_id, row.left, row.right,
+                              row.top, row.bottom) for row in tsv.itertuples() for part in row.TOKEN.split('-')],
+                            columns=['No.', 'TOKEN', 'NE-TAG', 'NE-EMB', 'ID', 'url_id', 'left', 'right', 'top',
+                                     'bottom']), None
+
+    monkeypatch.setattr('qurator.utils.ner.ner', ner)
+
+    cache = AnnotationCache(str(Path(tmpdir, 'cache.sqlite')))
+
+    tsv = pd.DataFrame({'No.': [0, 1, 2], 'TOKEN': ['Groß-Berlin', 'und', 'Potsdam'], 'NE-TAG': 'O', 'NE-EMB': 'O',
+                        'ID': '-', 'url_id': [3, 3, 4], 'left': [0, 10, 20], 'right': [9, 19, 29], 'top': [5, 5, 7],
+                        'bottom': [6, 6, 8], 'conf': '-'})
+
+    expected = _ner(tsv, 'http://localhost/ner', False, None)
+    pd.testing.assert_frame_equal(_ner(tsv, 'http://localhost/ner', False, cache), expected)
+
+    # other tags and coordinates: a cache hit with the coordinates of the new rows
+    moved = tsv.assign(**{'NE-TAG': ['B-LOC', 'O', 'B-LOC'], 'left': [1, 11, 21], 'No.': 0})
+    pd.testing.assert_frame_equal(_ner(moved, 'http://localhost/ner', False, cache), _ner(moved, None, False, None))
+
+    assert len(calls) == 3 and cache.stats()['hits'] == 1
+
+    # other tokens
+    _ner(tsv.assign(TOKEN=['Groß', 'und', 'Potsdam']), 'http://localhost/ner', False, cache)
+    assert cache.stats()['misses'] == 2
+
+
+def test_running_size(tmpdir):
+    cache = AnnotationCache(str(Path(tmpdir, 'cache.sqlite')), max_size=100)
+
+    cache.put('a', 'a' * 10)
+    cache.put('a', 'a' * 20)
+    cache.put('b', 'b' * 30)
+    assert cache.stats()['size'] == 50
+    cache.close()
+
+    cache = AnnotationCache(str(Path(tmpdir, 'cache.sqlite')), max_size=100)
+    cache.put('c', 'c' * 60)
+    assert cache.stats() == {'hits': 0, 'misses': 0, 'entries': 2, 'size': 90}
+
+
+def test_batched_touches(tmpdir):
+    cache = AnnotationCache(str(Path(tmpdir, 'cache.sqlite')), max_size=30, touch_interval=1000)
+
+    for key in 'abc':
+        cache.put(key, key * 10)
+
+    # a hit is not committed at once, but before the next eviction
+    assert cache.get('a') is not None
+    assert cache._con.in_transaction is False
+
+    cache.put('d', 'd' * 10)
+    assert cache.get('b') is None and cache.get('a') is not None
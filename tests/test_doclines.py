@@ -0,0 +1,83 @@
+from io import StringIO
+from pathlib import Path
+
+import pandas as pd
+
+from qurator.utils.tsv import extract_doc_links
+
+from qurator.tsvtools.page import page2tsv_batch
+from qurator.tsvtools.tsv import annotate_tsv, extract_document_links
+
+PAGES = sorted(Path(__file__).parent.joinpath('testws', 'TESS').glob('*.xml'))[6:12]
+
+
+def legacy_extract_document_links(tsv_file, url_file):
+
+    parts = extract_doc_links(tsv_file)
+
+    urls = [part['url'] for part in parts]
+
+    urls = pd.DataFrame(urls, columns=['url'])
+
+    urls.to_csv(url_file, sep="\t", quoting=3, index=False)
+
+
+def legacy_annotate_tsv(tsv_file, annotated_tsv_file):
+
+    parts = extract_doc_links(tsv_file)
+
+    annotated_parts = []
+
+    for part in parts:
+
+        part_data = StringIO(part['header'] + part['text'])
+
+        df = pd.read_csv(part_data, sep="\t", comment='#', quoting=3)
+
+        df['url_id'] = len(annotated_parts)
+
+        annotated_parts.append(df)
+
+    df = pd.concat(annotated_parts)
+
+    df.to_csv(annotated_tsv_file, sep="\t", quoting=3, index=False)
+
+
+def _multi_page_tsv(tmpdir, purpose):
+    tsv_file = Path(tmpdir, 'pages.tsv')
+    page2tsv_batch([(str(page), 'http://empty/{}'.format(n), 1.0) for n, page in enumerate(PAGES)], str(tsv_file),
+                   purpose, None, None, False, None, None, None, 1, None)
+
+    # a context part and wrong url_ids
+    text = tsv_file.read_text().replace('# http://empty/3\n', '#__CONTEXT__:{"time": 1900}\n')
+    tsv_file.write_text(text.replace('\t2\t', '\t7\t'))
+
+    return tsv_file
+
+
+def test_annotate_tsv(tmpdir):
+    tsv_file = _multi_page_tsv(tmpdir, 'NERD')
+
+    annotate_tsv(str(tsv_file), str(Path(tmpdir, 'annotated.tsv')))
+    legacy_annotate_tsv(str(tsv_file), str(Path(tmpdir, 'legacy.tsv')))
+
+    assert Path(tmpdir, 'annotated.tsv').read_text() == Path(tmpdir, 'legacy.tsv').read_text()
+
+
+def test_annotate_tsv_without_url_id_column(tmpdir):
+    tsv_file = Path(tmpdir, 'in.tsv')
+    tsv_file.write_text('No.\tTOKEN\tNE-TAG\tNE-EMB\n# http://empty/0\n0\ta\tO\tO\n# http://empty/1\n0\tb\tO\tO\n')
+
+    annotate_tsv(str(tsv_file), str(Path(tmpdir, 'annotated.tsv')))
+    legacy_annotate_tsv(str(tsv_file), str(Path(tmpdir, 'legacy.tsv')))
+
+    assert Path(tmpdir, 'annotated.tsv').read_text() == Path(tmpdir, 'legacy.tsv').read_text()
+
+
+def test_extract_document_links(tmpdir):
+    tsv_file = _multi_page_tsv(tmpdir, 'NERD')
+
+    extract_document_links(str(tsv_file), str(Path(tmpdir, 'urls.tsv')))
+    legacy_extract_document_links(str(tsv_file), str(Path(tmpdir, 'legacy.tsv')))
+
+    assert Path(tmpdir, 'urls.tsv').read_text() == Path(tmpdir, 'legacy.tsv').read_text()
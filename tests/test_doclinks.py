@@ -0,0 +1,40 @@
+from pathlib import Path
+
+from qurator.tsvtools.doclinks import count_doc_links, doc_index_file
+
+HEADER = 'No.\tTOKEN\tNE-TAG\tNE-EMB\tID\turl_id\tleft\tright\ttop\tbottom\tconf\n'
+
+
+def _row(url_id, token):
+    return f'0\t{token}\tO\tO\t-\t{url_id}\t0\t1\t0\t1\t-\n'
+
+
+def test_count_doc_links(tmpdir):
+    tsv_file = Path(tmpdir, 'doc.tsv')
+    tsv_file.write_text(HEADER + '# http://empty/0\n' + _row(0, 'a') + '#__CONTEXT__:{}\n' + _row(1, 'b'))
+
+    assert count_doc_links(str(tsv_file)) == 2
+    assert not Path(doc_index_file(tsv_file)).exists()
+
+
+def test_doc_index_is_updated_incrementally(tmpdir):
+    tsv_file = Path(tmpdir, 'doc.tsv')
+    tsv_file.write_text(HEADER)
+
+    for url_id in range(5):
+        assert count_doc_links(str(tsv_file), use_index=True) == url_id
+        with open(tsv_file, 'a') as f:
+            f.write(f'# http://empty/{url_id}\n' + _row(url_id, 'http://not-a-part'))
+
+    assert count_doc_links(str(tsv_file), use_index=True) == 5
+
+    # a rewritten file invalidates the index
+    tsv_file.write_text(HEADER + '# http://empty/0\n' + _row(0, 'a') * 100)
+    assert count_doc_links(str(tsv_file), use_index=True) == 1
+
+
+def test_url_tokens_are_no_doc_links(tmpdir):
+    tsv_file = Path(tmpdir, 'doc.tsv')
+    tsv_file.write_text(HEADER + '# http://empty/0\n' + _row(0, 'https://example.com/a') + _row(0, 'b'))
+
+    assert count_doc_links(str(tsv_file)) == 1
@@ -1,16 +1,18 @@
+from json import loads
 from pathlib import Path
 from shutil import copytree
 from pytest import fixture
+from PIL import Image
 
 from ocrd_utils import pushd_popd
 from ocrd_models.ocrd_page import parse
 from ocrd import Resolver
 
-from qurator.tsvtools.ocrd_processors import OcrdNeatExportProcessor, OcrdNeatImportProcessor
+from qurator.tsvtools.ocrd_processors import OcrdNeatExportProcessor, OcrdNeatImportProcessor, export_page
 
 @fixture
 def testws(tmpdir):
-    copytree('tests/testws', f'{tmpdir}/ws')
+    copytree(Path(__file__).parent.joinpath('testws'), f'{tmpdir}/ws')
     return Resolver().workspace_from_url(f'{tmpdir}/ws/mets.xml')
 
 def test_imexport(testws):
@@ -44,3 +46,73 @@ def test_imexport(testws):
 
     assert 'Staatenbund' not in origline
     assert 'Staatenbund' in corrline
+
+def test_imexport_parallel(testws, monkeypatch):
+    monkeypatch.setenv('OCRD_NEAT_WORKERS', '3')
+    wsdir = testws.directory
+    exporter = OcrdNeatExportProcessor(workspace=testws, input_file_grp='TESS', output_file_grp='OUT')
+    exporter.process()
+    importer = OcrdNeatImportProcessor(workspace=testws, input_file_grp='TESS,OUT', output_file_grp='TESS-CORRECTED')
+    importer.process()
+
+    outfiles = [f.local_filename for f in testws.mets.find_files(fileGrp='OUT')]
+    corrfiles = [f.local_filename for f in testws.mets.find_files(fileGrp='TESS-CORRECTED')]
+    assert len(outfiles) == len(corrfiles) == 21
+    assert outfiles == sorted(outfiles)
+    assert corrfiles == sorted(corrfiles)
+    assert 'Ein Welt-Stantenbund' in Path(wsdir, 'OUT/FILE_0005_OUT.tsv').read_text()
+    assert 'Ein Welt-Stantenbund' in Path(wsdir, 'TESS-CORRECTED/FILE_0005_TESS-CORRECTED.xml').read_text()
+
+
+def test_export_scale_filegrp(testws):
+    wsdir = testws.directory
+    Path(wsdir, 'FULL').mkdir()
+    Image.new('L', (2 * 1323, 2 * 1959)).save(Path(wsdir, 'FULL/FILE_0005_FULL.png'))
+    testws.add_file('FULL', file_id='FILE_0005_FULL', page_id='PHYS_0005', mimetype='image/png',
+                    local_filename='FULL/FILE_0005_FULL.png')
+
+    exporter = OcrdNeatExportProcessor(workspace=testws, input_file_grp='TESS', output_file_grp='OUT',
+                                       parameter={'scale_filegrp': 'FULL'})
+    exporter.process()
+
+    assert 'Ein Welt-Stantenbund	0	348	2232	338	560		region0000_line0001' in \
+        Path(wsdir, 'OUT/FILE_0005_OUT.tsv').read_text()
+
+
+def test_export_aspect_ratio_warning(tmpdir, caplog):
+    page = str(Path(__file__).parent.joinpath('testws', 'TESS', 'FILE_0005_TESS.xml'))
+
+    export_page(page, str(Path(tmpdir, 'same.tsv')), 'http://empty', (2 * 1323, 2 * 1959))
+    assert 'aspect ratio' not in caplog.text
+
+    export_page(page, str(Path(tmpdir, 'other.tsv')), 'http://empty', (2 * 1323, 1959))
+    assert 'aspect ratio' in caplog.text
+
+    assert Path(tmpdir, 'same.tsv').read_text() == Path(tmpdir, 'other.tsv').read_text()
+
+
+def test_import_delta(testws):
+    wsdir = testws.directory
+    exporter = OcrdNeatExportProcessor(workspace=testws, input_file_grp='TESS', output_file_grp='OUT')
+    exporter.process()
+
+    outfile = Path(wsdir, 'OUT/FILE_0005_OUT.tsv')
+    outfile.write_text(outfile.read_text().replace('Stantenbund', 'Staatenbund'))
+
+    importer = OcrdNeatImportProcessor(workspace=testws, input_file_grp='TESS,OUT', output_file_grp='TESS-CORRECTED',
+                                       parameter={'delta': True, 'change_report': 'changes.json'})
+    importer.process()
+
+    report = loads(Path(wsdir, 'changes.json').read_text())
+    assert (report['pages'], report['pages_changed'], report['lines_changed']) == (21, 1, 1)
+
+    corrfiles = [f.local_filename for f in testws.mets.find_files(fileGrp='TESS-CORRECTED')]
+    assert len(corrfiles) == 21
+
+    corrfile = Path(wsdir, 'TESS-CORRECTED/FILE_0005_TESS-CORRECTED.xml')
+    assert 'Ein Welt-Staatenbund' in corrfile.read_text()
+    assert parse(str(corrfile)).get_pcGtsId() == 'FILE_0005_TESS-CORRECTED'
+
+    # unchanged pages are hardlinks of the input pages
+    assert Path(wsdir, 'TESS-CORRECTED/FILE_0006_TESS-CORRECTED.xml').samefile(Path(wsdir, 'TESS/FILE_0006_TESS.xml'))
+    assert not corrfile.samefile(Path(wsdir, 'TESS/FILE_0005_TESS.xml'))
@@ -0,0 +1,76 @@
+import json
+import shutil
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+from click.testing import CliRunner
+
+from qurator.tsvtools import metrics
+from qurator.tsvtools.cli import page2tsv_cli
+
+PAGES = sorted(Path(__file__).parent.joinpath('testws', 'TESS').glob('*.xml'))[8:11]
+
+
+def test_page2tsv_metrics(tmpdir):
+    for page in PAGES:
+        shutil.copy(page, str(tmpdir))
+
+    tsv_file, metrics_file = Path(tmpdir, 'out.tsv'), Path(tmpdir, 'metrics.jsonl')
+
+    result = CliRunner().invoke(page2tsv_cli, [str(tmpdir), str(tsv_file), '--batch', '--metrics-file',
+                                               str(metrics_file)])
+    assert result.exit_code == 0, result.output
+
+    records = [json.loads(line) for line in metrics_file.read_text().splitlines()]
+    pages, summary = records[:-1], records[-1]
+
+    assert [Path(record['page']).name for record in pages] == [page.name for page in PAGES]
+    assert all(set(record['stages']) == {'parse', 'normalize', 'reading_order', 'write'} for record in pages)
+
+    assert summary['summary'] and summary['pages'] == len(PAGES)
+    assert summary['counts']['tokens'] == len(pd.read_csv(tsv_file, sep='\t', comment='#', quoting=3))
+    assert summary['counts']['tokens'] == sum(record['counts']['tokens'] for record in pages)
+
+
+def work(page_id, seconds):
+    with metrics.page(page_id), metrics.stage('parse'):
+        metrics.count('tokens', 10)
+        metrics.observe_http('http://ner', seconds)
+
+    return page_id
+
+
+def test_pool_map_prometheus(tmpdir):
+    metrics_file = Path(tmpdir, 'metrics.prom')
+
+    with metrics.session(str(metrics_file)):
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            assert list(metrics.pool_map(executor, work, ['p1', 'p2', 'p3'], [0.001, 0.2, 7.0],
+                                         max_pending=2)) == ['p1', 'p2', 'p3']
+
+    assert not metrics.enabled()
+
+    lines = metrics_file.read_text().splitlines()
+
+    assert 'tsvtools_pages_total 3' in lines
+    assert 'tsvtools_items_total{kind="tokens"} 30' in lines
+    assert 'tsvtools_http_request_seconds_bucket{url="http://ner",le="0.005"} 1' in lines
+    assert 'tsvtools_http_request_seconds_bucket{url="http://ner",le="0.25"} 2' in lines
+    assert 'tsvtools_http_request_seconds_bucket{url="http://ner",le="+Inf"} 3' in lines
+    assert 'tsvtools_http_request_seconds_count{url="http://ner"} 3' in lines
+
+
+def test_pool_map_max_pending():
+    consumed = []
+
+    def pages():
+        for n in range(100):
+            consumed.append(n)
+            yield n
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = metrics.pool_map(executor, abs, pages(), max_pending=4)
+
+        assert next(results) == 0 and len(consumed) == 4
+        assert list(results) == list(range(1, 100))
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from qurator.tsvtools.ocr import DEFAULT_CONF_PALETTE, get_conf_color, get_conf_colors, parse_conf_palette
+
+GRAY = [[0, 0, 0], [85, 85, 85], [170, 170, 170], [255, 255, 255]]
+
+
+def original_get_conf_color(conf, min_conf, max_conf):
+
+    conf = min_conf if conf < min_conf else conf
+    conf = max_conf if conf > max_conf else conf
+
+    interval_size = (max_conf - min_conf) / 2.0
+
+    colors = np.array([[216, 108, 117], [216, 206, 108], [108, 216, 146]])
+
+    colors = pd.DataFrame(colors, index=[0, 1, 2], columns=['R', 'G', 'B'])
+
+    lower = np.floor((conf - min_conf) / interval_size)
+    upper = np.ceil((conf - min_conf) / interval_size)
+
+    pos = (conf - min_conf) / (2.0*interval_size)
+
+    col = (colors.loc[lower] * (1.0 - pos) + colors.loc[upper] * pos).astype(int)
+
+    return '#{:02x}'.format(col.R) + '{:02x}'.format(col.G) + '{:02x}'.format(col.B)
+
+
+def rgb(color):
+    return np.array([int(color[i:i + 2], 16) for i in (1, 3, 5)])
+
+
+@pytest.mark.parametrize('palette', [None, GRAY, [[0, 0, 0], [255, 0, 255]]])
+def test_continuity(palette):
+    conf = np.linspace(0.2, 1.0, 8001)
+    colors = np.array([rgb(color) for color in get_conf_colors(conf, 0.2, 1.0, palette, continuous=True)])
+
+    # at most one step per channel and per 1e-4 of confidence (plus rounding)
+    assert np.abs(np.diff(colors, axis=0)).max() <= 2
+
+
+def test_stops():
+    assert get_conf_color(0.0, 0.0, 1.0, GRAY, continuous=True) == '#000000'
+    assert get_conf_color(1 / 3, 0.0, 1.0, GRAY, continuous=True) == '#555555'
+    assert get_conf_color(2 / 3, 0.0, 1.0, GRAY, continuous=True) == '#aaaaaa'
+    assert get_conf_color(1.0, 0.0, 1.0, GRAY, continuous=True) == '#ffffff'
+
+    assert get_conf_color(0.5, 0.0, 1.0, GRAY, continuous=True) == '#7f7f7f'
+
+    # clipped to the end colors
+    for continuous in [False, True]:
+        assert get_conf_color(-1.0, 0.0, 1.0, continuous=continuous) == '#d86c75'
+        assert get_conf_color(2.0, 0.0, 1.0, continuous=continuous) == '#6cd892'
+        assert get_conf_color(0.5, 0.0, 1.0, continuous=continuous) == '#d8ce6c'
+
+
+def test_nan():
+    assert get_conf_colors([np.nan, 1.0], 0.0, 1.0).tolist() == ['', '#6cd892']
+
+
+def test_default_equals_original():
+    conf = np.linspace(-0.1, 1.1, 241)
+
+    for min_conf, max_conf in [(0.0, 1.0), (0.2, 0.9)]:
+        expected = [original_get_conf_color(c, min_conf, max_conf) for c in conf]
+
+        assert get_conf_colors(conf, min_conf, max_conf).tolist() == expected
+        assert [get_conf_color(c, min_conf, max_conf) for c in conf] == expected
+
+    # both agree on the colors of the stops
+    for conf in [0.0, 0.5, 1.0]:
+        assert get_conf_color(conf, 0.0, 1.0, continuous=True) == original_get_conf_color(conf, 0.0, 1.0)
+
+
+def test_parse_conf_palette():
+    assert parse_conf_palette('#d86c75, #D8CE6C,6cd892') == DEFAULT_CONF_PALETTE
+
+    for palette in ['#d86c75', '', '#d86c75,#d8ce6', '#d86c75,#d8ce6cc', '#d86c75,#g8ce6c', '#d86c75,,#6cd892']:
+        with pytest.raises(ValueError):
+            parse_conf_palette(palette)
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from qurator.tsvtools.order import join_lines, reading_order
+
+
+def legacy_order(tsv):
+    """
+    Ordering stage of page2tsv/alto2tsv before reading_order.
+    """
+    vlinecenter = pd.DataFrame(tsv[['line', 'top']].groupby('line', sort=False).mean().top +
+                               (tsv[['line', 'bottom']].groupby('line', sort=False).mean().bottom -
+                                tsv[['line', 'top']].groupby('line', sort=False).mean().top) / 2,
+                               columns=['vlinecenter'])
+
+    tsv = tsv.merge(vlinecenter, left_on='line', right_index=True)
+    regions = [region.sort_values(['vlinecenter', 'hcenter']) for rid, region in tsv.groupby('rid', sort=False)]
+
+    return pd.concat(regions)
+
+
+def random_page(seed, num_tokens):
+    rng = np.random.default_rng(seed)
+
+    # coarse coordinates, such that there are many ties
+    line = np.sort(rng.integers(0, num_tokens // 4 + 1, num_tokens))
+    rid = np.array(['r{}'.format(n) for n in rng.permutation(10)])[line % 10]
+    left = rng.integers(0, 20, num_tokens) * 10
+    top = rng.integers(0, 5, num_tokens) * 10 + line * 3
+
+    return pd.DataFrame({'rid': rid, 'line': line, 'hcenter': left + 5 / 2.0, 'top': top, 'bottom': top + 7,
+                         'TEXT': ['t{}'.format(n) for n in range(num_tokens)]})
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_reading_order_equals_legacy(seed):
+    tsv = random_page(seed, 200)
+
+    expected = legacy_order(tsv)
+
+    order = reading_order(tsv.rid.to_numpy(), tsv.line.to_numpy(), tsv.hcenter.to_numpy(), tsv.top.to_numpy(),
+                          tsv.bottom.to_numpy())
+
+    assert order.tolist() == expected.index.tolist()
+
+    lines, texts = join_lines(tsv.line.to_numpy(), tsv.TEXT.to_list(), order)
+
+    expected = [(line, " ".join(part.TEXT.to_list())) for line, part in expected.groupby('line')]
+
+    assert list(zip(lines.tolist(), texts)) == expected
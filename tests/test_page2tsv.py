@@ -0,0 +1,46 @@
+from pathlib import Path
+
+from lxml import etree as ET
+from ocrd_models.ocrd_page import parse
+
+from qurator.tsvtools.page import page2tsv, page2tsv_batch, page2tsv_frame, read_batch_manifest
+
+PAGES = sorted(Path(__file__).parent.joinpath('testws', 'TESS').glob('*.xml'))[:6]
+
+
+def test_batch_equals_successive_calls(tmpdir):
+    single = Path(tmpdir, 'single.tsv')
+    for n, page in enumerate(PAGES):
+        page2tsv(str(page), str(single), 'OCR', f'http://empty/{n}', None, None, False, 1.0, None, None, None, 1, None)
+
+    manifest = Path(tmpdir, 'manifest.tsv')
+    manifest.write_text('page_xml_file\timage_url\n' +
+                        ''.join(f'{page}\thttp://empty/{n}\n' for n, page in enumerate(PAGES)))
+    batch = Path(tmpdir, 'batch.tsv')
+    page2tsv_batch(read_batch_manifest(str(manifest), None, 1.0), str(batch), 'OCR', None, None, False, None,
+                   None, None, 1, None)
+
+    assert batch.read_text() == single.read_text()
+    assert batch.read_text().count('# http://empty/') == len(PAGES)
+
+
+def test_frame_from_parsed_page():
+    page = str(PAGES[4])
+    expected = page2tsv_frame(page, 'NERD', 3)
+
+    assert len(expected) > 0
+    assert page2tsv_frame(parse(page), 'NERD', 3).equals(expected)
+    assert page2tsv_frame(ET.parse(page), 'NERD', 3).equals(expected)
+
+
+def test_manifest_comments(tmpdir):
+    manifest = Path(tmpdir, 'manifest.tsv')
+    manifest.write_text('# pages of PPN123\n'
+                        'page_xml_file\timage_url\tscale_factor\n'
+                        '# first page\n'
+                        'a.xml\thttps://iiif.example.com/a/full/full/0/default.jpg#xywh=0,0,10,10\t0.5\n'
+                        'b.xml\thttp://example.com/b.jpg\t1\n')
+
+    assert read_batch_manifest(str(manifest), None, 1.0) == \
+        [(str(Path(tmpdir, 'a.xml')), 'https://iiif.example.com/a/full/full/0/default.jpg#xywh=0,0,10,10', 0.5),
+         (str(Path(tmpdir, 'b.xml')), 'http://example.com/b.jpg', 1.0)]
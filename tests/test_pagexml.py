@@ -0,0 +1,58 @@
+from pytest import mark
+
+from qurator.tsvtools.pagexml import ocrd_page_regions, fast_page_regions
+
+PAGE_2019 = 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15'
+
+
+def _line(line_id, x, text, words=()):
+    word_xml = ''.join(f'<Word id="{line_id}_w{n}"><Coords points="{x + 10 * n},{x} {x + 10 * n + 9},{x + 5}"/>'
+                       f'<TextEquiv><Unicode>{word}</Unicode></TextEquiv></Word>' for n, word in enumerate(words))
+    return f'<TextLine id="{line_id}"><Coords points="{x},{x} {x + 50},{x} {x + 50},{x + 5}"/>{word_xml}' \
+           f'<TextEquiv conf="0.5"><Unicode>{text}</Unicode></TextEquiv></TextLine>'
+
+
+def _region(region_type, region_id, content):
+    return f'<{region_type} id="{region_id}"><Coords points="0,0 1,1"/>{content}</{region_type}>'
+
+
+PAGE_XML = f'''<?xml version="1.0" encoding="UTF-8"?>
+<PcGts xmlns="{PAGE_2019}"><Metadata><Creator/><Created>2020-01-01T00:00:00</Created>
+<LastChange>2020-01-01T00:00:00</LastChange></Metadata>
+<Page imageFilename="x.png" imageWidth="1000" imageHeight="1000">
+<ReadingOrder><OrderedGroup id="ro">
+<UnorderedGroupIndexed id="g1" index="2"><RegionRef id="rr1" regionRef="r4"/>
+<OrderedGroup id="g2"><RegionRefIndexed index="1" regionRef="r1"/><RegionRefIndexed index="0" regionRef="r5"/>
+</OrderedGroup></UnorderedGroupIndexed>
+<RegionRefIndexed index="1" regionRef="r3"/>
+<RegionRefIndexed index="3" regionRef="missing"/>
+</OrderedGroup></ReadingOrder>
+{_region('TextRegion', 'r1', _line('l1', 10, 'eins zwei') + _region('TextRegion', 'r1a', _line('l1a', 20, 'x')))}
+{_region('TableRegion', 't1', _region('TextRegion', 'r2', _line('l2', 30, 'drei', ['drei'])))}
+{_region('TextRegion', 'r3', _line('l3', 40, 'vier fünf', ['vier', 'fünf']))}
+{_region('ImageRegion', 'i1', '')}
+{_region('TextRegion', 'r4', _line('l4', 50, 'sechs'))}
+{_region('TextRegion', 'r5', _line('l5', 60, 'sieben') + _line('l6', 70, 'acht'))}
+</Page></PcGts>'''
+
+
+@mark.parametrize('reading_order', [True, False])
+def test_fast_reader_equals_ocrd_reader(tmpdir, reading_order):
+    page_xml = PAGE_XML
+    if not reading_order:
+        page_xml = page_xml[:page_xml.index('<ReadingOrder>')] + page_xml[page_xml.index('</ReadingOrder>') + 15:]
+
+    page_file = tmpdir.join('page.xml')
+    page_file.write_text(page_xml, encoding='utf-8')
+
+    assert list(fast_page_regions(str(page_file))) == list(ocrd_page_regions(str(page_file)))
+
+
+def test_fast_reader_point_coords(tmpdir):
+    page_file = tmpdir.join('page.xml')
+    page_file.write_text('''<PcGts xmlns="http://schema.primaresearch.org/PAGE/gts/pagecontent/2013-07-15"><Page>
+<TextRegion id="r0"><Coords><Point x="0" y="0"/></Coords><TextLine id="l0">
+<Coords><Point x="5" y="7"/><Point x="15" y="3"/></Coords><TextEquiv><Unicode>a b</Unicode></TextEquiv>
+</TextLine></TextRegion></Page></PcGts>''', encoding='utf-8')
+
+    assert list(fast_page_regions(str(page_file))) == [[('l0', (5, 3, 15, 7), [('a b', None)], [])]]
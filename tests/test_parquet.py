@@ -0,0 +1,87 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+
+from qurator.utils.tsv import read_tsv
+
+from qurator.tsvtools.cli import page2tsv_cli, parquet2tsv_cli, tsv2parquet_cli, tsv2tsv
+from qurator.tsvtools.page import page2tsv
+from qurator.tsvtools.parquet import parquet_sidecar_file, read_parquet, read_parquet_tsv
+
+pytest.importorskip('pyarrow')
+
+PAGES = sorted(Path(__file__).parent.joinpath('testws', 'TESS').glob('*.xml'))[6:12]
+
+NEAT_TSV = ("No.\tTOKEN\tNE-TAG\tNE-EMB\tID\turl_id\tleft\tright\ttop\tbottom\tconf\n"
+            "0\tvorab\tO\tO\t-\t0\t1\t2\t3\t4\t0.5\n"
+            "# http://example.com/1\n"
+            "0\tBerlin\tB-LOC\tO\tQ64\t0\t10\t20\t30\t40\t0.25\n"
+            "1\t\tO\tO\t-\t0\t11\t21\t31\t41\t1.0\n"
+            "# http://example.com/2\n"
+            '#__CONTEXT__:{"ppn": "PPN123", "page": 3}\n'
+            "0\t007\tB-PER\tO\t-\t2\t12\t22\t32\t42\t0.75\n"
+            "1\t#hash\tO\tO\t-\t2\t13\t23\t33\t43\t0.125\n")
+
+
+def test_round_trip(tmpdir):
+    tsv_file, parquet_file, out_file = Path(tmpdir, 'in.tsv'), Path(tmpdir, 'in.parquet'), Path(tmpdir, 'out.tsv')
+    tsv_file.write_text(NEAT_TSV)
+
+    result = CliRunner().invoke(tsv2parquet_cli, [str(tsv_file), str(parquet_file)])
+    assert result.exit_code == 0, result.output
+
+    result = CliRunner().invoke(parquet2tsv_cli, [str(parquet_file), str(out_file)])
+    assert result.exit_code == 0, result.output
+
+    assert out_file.read_text() == NEAT_TSV
+
+    tsv, metadata = read_parquet(str(parquet_file))
+    assert tsv['left'].dtype == 'int64' and tsv['conf'].dtype == 'float64'
+    assert isinstance(tsv['NE-TAG'].dtype, pd.CategoricalDtype)
+    # leading zeros and empty tokens are kept as they are
+    assert tsv.TOKEN.to_list() == ['vorab', 'Berlin', '', '007', '#hash']
+    assert [part['rows'] for part in metadata['parts']] == [1, 2, 0, 2]
+    assert metadata['parts'][3]['context'] == {'ppn': 'PPN123', 'page': 3}
+
+
+def test_read_parquet_tsv_equals_read_tsv(tmpdir):
+    tsv_file = Path(tmpdir, 'out.tsv')
+
+    for page in PAGES[:-1]:
+        page2tsv(str(page), str(tsv_file), 'NERD', 'http://empty/{}'.format(page.stem), None, None, False, 1.0, None,
+                 None, None, 1, None)
+
+    # the sidecar is written once per run, i.e., only by multi-page runs
+    result = CliRunner().invoke(page2tsv_cli, [str(PAGES[-1]), str(tsv_file), '--parquet'])
+    assert result.exit_code != 0 and '--parquet requires --batch' in result.output
+
+    manifest = Path(tmpdir, 'manifest.tsv')
+    manifest.write_text('page_xml_file\timage_url\n{}\thttp://empty/{}\n'.format(PAGES[-1], PAGES[-1].stem))
+
+    result = CliRunner().invoke(page2tsv_cli, [str(manifest), str(tsv_file), '--batch', '--parquet'])
+    assert result.exit_code == 0, result.output
+
+    expected, expected_urls, expected_contexts = read_tsv(str(tsv_file))
+    tsv, urls, contexts = read_parquet_tsv(parquet_sidecar_file(tsv_file))
+
+    assert urls == expected_urls and contexts == expected_contexts
+    for column in expected.columns:
+        assert tsv[column].fillna('').astype(str).to_list() == expected[column].fillna('').astype(str).to_list()
+
+    # tsv2tsv reads both formats the same way
+    for in_file, out_file in [(tsv_file, 'from-tsv.tsv'), (parquet_sidecar_file(tsv_file), 'from-parquet.tsv')]:
+        result = CliRunner().invoke(tsv2tsv, [str(in_file), '--tsv-out-file', str(Path(tmpdir, out_file)),
+                                              '--sanitize-sentence-numbers'])
+        assert result.exit_code == 0, result.output
+
+    assert Path(tmpdir, 'from-parquet.tsv').read_text() == Path(tmpdir, 'from-tsv.tsv').read_text()
+
+    # a Parquet file is always read as a whole
+    result = CliRunner().invoke(tsv2tsv, [str(parquet_sidecar_file(tsv_file)), '--tsv-out-file',
+                                          str(Path(tmpdir, 'stream.tsv')), '--sanitize-sentence-numbers', '--stream'])
+    assert result.exit_code == 0, result.output
+    assert 'Warning:' in result.output and '--stream is ignored' in result.output
+
+    assert Path(tmpdir, 'stream.tsv').read_text() == Path(tmpdir, 'from-tsv.tsv').read_text()
@@ -0,0 +1,98 @@
+import os
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+
+from qurator.tsvtools.cli import make_page2tsv_commands, page2tsv_run_cli
+from qurator.tsvtools.page import page2tsv
+
+PAGES = sorted(Path(__file__).parent.joinpath('testws', 'TESS').glob('*.xml'))[8:12]
+
+
+def write_collection(tmpdir):
+    for n, page in enumerate(PAGES):
+        ppn_dir = Path(tmpdir, 'collection', 'PPN12345{}'.format(n % 2))
+        ppn_dir.mkdir(parents=True, exist_ok=True)
+        shutil.copy(page, str(ppn_dir.joinpath('{:08d}.xml'.format(n + 1))))
+
+    return Path(tmpdir, 'collection')
+
+
+def run(collection, state_file, *args):
+    result = CliRunner().invoke(page2tsv_run_cli, ['--directory', str(collection), '--state-file', str(state_file),
+                                                   '--purpose', 'OCR'] + list(args))
+    assert result.exit_code == 0, result.output
+
+    return result.output
+
+
+@pytest.mark.parametrize('check', ['mtime', 'hash'])
+def test_run_and_resume(tmpdir, check):
+    collection = write_collection(tmpdir)
+    state_file = Path(tmpdir, 'state.sqlite')
+
+    output = run(collection, state_file, '--num-workers', '2', '--check', check)
+    assert '4 converted, 0 up to date, 0 failed' in output
+
+    tsv_files = sorted(collection.glob('PPN*/*.tsv'))
+    assert len(tsv_files) == 4 and not list(collection.glob('PPN*/*.tmp'))
+
+    # the same commands as make-page2tsv-commands
+    result = CliRunner().invoke(make_page2tsv_commands, ['--directory', str(collection), '--purpose', 'OCR'])
+    assert len(result.output.splitlines()) == 4
+
+    for line in result.output.splitlines():
+        page_xml_file, tsv_out_file = line.split()[1:3]
+        image_url = line.split('--image-url=')[1].split()[0]
+
+        expected = Path(tmpdir, 'expected.tsv')
+        if expected.exists():
+            expected.unlink()
+        page2tsv(page_xml_file, str(expected), 'OCR', image_url, None, None, False, 1.0, None, None, None, 1, None)
+
+        assert Path(tsv_out_file).read_text() == expected.read_text()
+
+    assert '0 converted, 4 up to date, 0 failed' in run(collection, state_file, '--check', check)
+
+    # a touched file is converted again unless its content is checked, a removed output is always written again
+    page_file = sorted(collection.glob('PPN*/*.xml'))[0]
+    os.utime(str(page_file), ns=(0, 0))
+    tsv_files[-1].unlink()
+
+    if check == 'mtime':
+        assert '2 converted, 2 up to date, 0 failed' in run(collection, state_file, '--check', check)
+    else:
+        assert '1 converted, 3 up to date, 0 failed' in run(collection, state_file, '--check', check)
+
+    # different options invalidate all outputs
+    assert '4 converted, 0 up to date, 0 failed' in run(collection, state_file, '--check', check,
+                                                        '--parser', 'fast')
+
+
+@pytest.mark.parametrize('check', ['mtime', 'hash'])
+def test_normalization_file_change(tmpdir, check):
+    collection = write_collection(tmpdir)
+    state_file = Path(tmpdir, 'state.sqlite')
+    normalization_file = Path(tmpdir, 'normalization.pkl')
+
+    pd.DataFrame({'decimal': [0xe000], 'base': ['a'], 'combining_character': ['']}).to_pickle(str(normalization_file))
+
+    args = ['--check', check, '--normalization-file', str(normalization_file)]
+
+    assert '4 converted, 0 up to date, 0 failed' in run(collection, state_file, *args)
+
+    # the same content with another modification time
+    os.utime(str(normalization_file), ns=(0, 0))
+
+    if check == 'mtime':
+        assert '4 converted, 0 up to date, 0 failed' in run(collection, state_file, *args)
+    else:
+        assert '0 converted, 4 up to date, 0 failed' in run(collection, state_file, *args)
+
+    # an edited normalization file invalidates all outputs
+    pd.DataFrame({'decimal': [0xe000], 'base': ['b'], 'combining_character': ['']}).to_pickle(str(normalization_file))
+
+    assert '4 converted, 0 up to date, 0 failed' in run(collection, state_file, *args)
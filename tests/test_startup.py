@@ -0,0 +1,42 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# Modules that must not be loaded before a command actually runs.
+HEAVY_MODULES = ['pandas', 'numpy', 'lxml', 'requests', 'ocrd', 'ocrd_models', 'ocrd_utils', 'qurator.utils.ner',
+                 'qurator.utils.ned', 'pyarrow']
+
+ENTRY_POINTS = ['extract_document_links', 'annotate_tsv', 'page2tsv_cli', 'tsv2page_cli', 'alto2tsv_cli', 'tsv2tsv',
+                'make_page2tsv_commands', 'page2tsv_run_cli', 'tsv2parquet_cli', 'parquet2tsv_cli']
+
+
+def imported_modules(code):
+    """
+    Names of all modules that are imported by running `code` in a fresh interpreter (python -X importtime).
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                            cwd=str(Path(__file__).parent.parent))
+
+    assert result.returncode == 0, result.stderr
+
+    return set(line.rsplit('|', 1)[-1].strip() for line in result.stderr.splitlines()
+               if line.startswith('import time:'))
+
+
+@pytest.mark.parametrize('entry_point', ENTRY_POINTS)
+def test_entry_point_startup(entry_point):
+
+    modules = imported_modules("from qurator.tsvtools.cli import {} as command\n"
+                               "command(['--help'], standalone_mode=False)".format(entry_point))
+
+    assert 'click' in modules
+    assert [m for m in HEAVY_MODULES if m in modules] == []
+
+
+def test_moved_functions_still_importable():
+
+    modules = imported_modules("from qurator.tsvtools.cli import page2tsv, unicode_normalize, tsv2page, alto2tsv")
+
+    assert 'pandas' in modules
@@ -0,0 +1,170 @@
+import json
+import random
+from pathlib import Path
+
+from click.testing import CliRunner
+from ocrd_models.ocrd_page import parse
+
+from qurator.tsvtools.cli import tsv2page_cli
+from qurator.tsvtools.merge import WordIndex
+from qurator.tsvtools.page import page2tsv
+
+PAGE_FILE = Path(__file__).parent.joinpath('testws', 'TESS', 'FILE_0005_TESS.xml')
+
+
+def test_tsv2page_multiple_pairs(tmpdir):
+    pairs = []
+    for namespace in ['2019-07-15', '2018-07-15']:
+        page_file = Path(tmpdir, f'page-{namespace}.xml')
+        page_file.write_text(PAGE_FILE.read_text().replace('2019-07-15', namespace))
+
+        tsv_file = Path(tmpdir, f'page-{namespace}.tsv')
+        page2tsv(str(PAGE_FILE), str(tsv_file), 'OCR', 'http://empty', None, None, False, 1.0, None, None, None, 1,
+                 None)
+        tsv_file.write_text(tsv_file.read_text().replace('Stantenbund', 'Staatenbund'))
+
+        pairs += [str(page_file), str(tsv_file)]
+
+    with tmpdir.as_cwd():
+        result = CliRunner().invoke(tsv2page_cli, pairs)
+    assert result.exit_code == 0, result.output
+
+    corrpage = parse(str(Path(tmpdir, 'page-2019-07-15.corrected.xml')))
+    corrline = corrpage.get_Page().get_TextRegion()[0].get_TextLine()[1]
+    assert 'Staatenbund' in corrline.get_TextEquiv()[0].Unicode
+    assert len(corrline.get_Word()) == 0
+
+    corrtext = Path(tmpdir, 'page-2018-07-15.corrected.xml').read_text()
+    assert 'Staatenbund' in corrtext
+    assert 'pagecontent/2018-07-15' in corrtext
+
+
+WORDS_PAGE = """<?xml version="1.0" encoding="UTF-8"?>
+<pc:PcGts xmlns:pc="http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15">
+  <pc:Page imageFilename="page.png" imageWidth="1000" imageHeight="1000">
+    <pc:TextRegion id="r0">
+      <pc:Coords points="0,0 1000,0 1000,100 0,100"/>
+      <pc:TextLine id="l0">
+        <pc:Coords points="10,10 310,10 310,40 10,40"/>
+        <pc:Word id="w0"><pc:Coords points="10,10 100,10 100,40 10,40"/>
+          <pc:TextEquiv conf="0.9"><pc:Unicode>Ein</pc:Unicode></pc:TextEquiv></pc:Word>
+        <pc:Word id="w1"><pc:Coords points="110,10 200,10 200,40 110,40"/>
+          <pc:TextEquiv conf="0.5"><pc:Unicode>Welt-Stantenbund,</pc:Unicode></pc:TextEquiv></pc:Word>
+        <pc:Word id="w2"><pc:Coords points="210,12 310,12 310,38 210,38"/><pc:TextStyle fontSize="10"/></pc:Word>
+        <pc:TextEquiv><pc:Unicode>Ein Welt-Stantenbund,</pc:Unicode></pc:TextEquiv>
+      </pc:TextLine>
+      <pc:TextLine id="l1">
+        <pc:Coords points="10,50 310,50 310,80 10,80"/>
+        <pc:TextEquiv><pc:Unicode>ohne Wörter</pc:Unicode></pc:TextEquiv>
+      </pc:TextLine>
+    </pc:TextRegion>
+  </pc:Page>
+</pc:PcGts>
+"""
+
+
+def words_of(page_file):
+    page = parse(str(page_file)).get_Page()
+
+    return [[(word.id, word.get_TextEquiv()[0].Unicode if word.get_TextEquiv() else None)
+             for word in line.get_Word()] + [line.get_TextEquiv()[0].Unicode]
+            for line in page.get_AllTextLines()]
+
+
+def test_tsv2page_word_level_nerd(tmpdir):
+    page_file = Path(tmpdir, 'page.xml')
+    page_file.write_text(WORDS_PAGE)
+
+    tsv_file = Path(tmpdir, 'page.tsv')
+    page2tsv(str(page_file), str(tsv_file), 'NERD', 'http://empty', None, None, False, 2.0, None, None, None, 1,
+             None)
+
+    tsv = tsv_file.read_text().replace('Welt-Stantenbund,', 'Welt-Staatenbund\tO\tO\t-\t0\t220\t400\t20\t80\t-\n'
+                                                          '0\t,').replace('ohne', '007')
+    tsv_file.write_text(tsv.replace('\t\tO', '\tdrei\tO', 1))
+
+    result = CliRunner().invoke(tsv2page_cli, ['--word-level', '--scale-factor', '2.0', '-o',
+                                               str(Path(tmpdir, 'out.xml')), str(page_file), str(tsv_file)])
+    assert result.exit_code == 0, result.output
+
+    assert words_of(Path(tmpdir, 'out.xml')) == [
+        [('w0', 'Ein'), ('w1', 'Welt-Staatenbund,'), ('w2', 'drei'), 'Ein Welt-Staatenbund, drei'],
+        ['007 Wörter']]
+
+    assert 'fontSize="10"' in Path(tmpdir, 'out.xml').read_text()
+
+
+def test_tsv2page_word_level_ocr(tmpdir):
+    page_file = Path(tmpdir, 'page.xml')
+    page_file.write_text(WORDS_PAGE.replace('<pc:TextStyle fontSize="10"/>', '<pc:TextEquiv><pc:Unicode>x'
+                                                                            '</pc:Unicode></pc:TextEquiv>'))
+
+    tsv_file = Path(tmpdir, 'page.tsv')
+    page2tsv(str(page_file), str(tsv_file), 'OCR', 'http://empty', None, None, False, 1.0, None, None, None, 1, None)
+
+    tsv_file.write_text(tsv_file.read_text().replace('Stantenbund', 'Staatenbund').replace('ohne', 'mit'))
+
+    result = CliRunner().invoke(tsv2page_cli, ['-w', '-o', str(Path(tmpdir, 'out.xml')), str(page_file),
+                                               str(tsv_file)])
+    assert result.exit_code == 0, result.output
+
+    assert words_of(Path(tmpdir, 'out.xml')) == [
+        [('w0', 'Ein'), ('w1', 'Welt-Staatenbund,'), ('w2', 'x'), 'Ein Welt-Staatenbund, x'], ['mit Wörter']]
+
+    # different number of tokens: words are removed
+    tsv_file.write_text(tsv_file.read_text().replace('Ein Welt', 'EinWelt'))
+
+    result = CliRunner().invoke(tsv2page_cli, ['-w', '-o', str(Path(tmpdir, 'out.xml')), str(page_file),
+                                               str(tsv_file)])
+    assert result.exit_code == 0, result.output
+
+    assert words_of(Path(tmpdir, 'out.xml'))[0] == ['EinWelt-Staatenbund, x']
+
+
+def test_word_index_equals_linear_scan():
+    rng = random.Random(0)
+
+    bboxes = []
+    for _ in range(2000):
+        left, top = rng.randrange(0, 5000), rng.randrange(0, 5000)
+        bboxes.append((left, top, left + rng.randrange(5, 200), top + rng.randrange(5, 50)))
+
+    index = WordIndex(bboxes)
+
+    def linear_scan(bbox):
+        areas = [max(0, min(bbox[2], r) - max(bbox[0], l)) * max(0, min(bbox[3], b) - max(bbox[1], t))
+                 for l, t, r, b in bboxes]
+        return areas.index(max(areas)) if max(areas) > 0 else -1
+
+    for bbox in bboxes[:100] + [(x + 3, y - 2, x + 40, y + 20) for x, y, _, _ in bboxes[100:500]]:
+        assert index.lookup(bbox) == linear_scan(bbox)
+
+
+def test_tsv2page_delta(tmpdir):
+    page_file = Path(tmpdir, 'page.xml')
+    page_file.write_text(PAGE_FILE.read_text())
+
+    tsv_file = Path(tmpdir, 'page.tsv')
+    page2tsv(str(PAGE_FILE), str(tsv_file), 'OCR', 'http://empty', None, None, False, 1.0, None, None, None, 1, None)
+
+    unchanged_tsv_file = Path(tmpdir, 'unchanged.tsv')
+    unchanged_tsv_file.write_text(tsv_file.read_text())
+    tsv_file.write_text(tsv_file.read_text().replace('Stantenbund', 'Staatenbund'))
+
+    with tmpdir.as_cwd():
+        result = CliRunner().invoke(tsv2page_cli, ['--delta', '--change-report', 'report.json', str(page_file),
+                                                   str(tsv_file)])
+        assert result.exit_code == 0, result.output
+
+        result = CliRunner().invoke(tsv2page_cli, ['--delta', '-o', 'unchanged.xml', str(page_file),
+                                                   str(unchanged_tsv_file)])
+        assert result.exit_code == 0, result.output
+
+    report = json.loads(Path(tmpdir, 'report.json').read_text())
+    assert (report['pages'], report['pages_changed'], report['lines_changed']) == (1, 1, 1)
+    assert report['lines'] > 1
+
+    corrected = parse(str(Path(tmpdir, 'page.corrected.xml'))).get_Page().get_TextRegion()[0].get_TextLine()
+    assert 'Staatenbund' in corrected[1].get_TextEquiv()[0].Unicode
+
+    assert Path(tmpdir, 'unchanged.xml').samefile(page_file)
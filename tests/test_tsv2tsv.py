@@ -0,0 +1,116 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from qurator.tsvtools.tsv import annotate_tsv, sanitized_sentence_numbers, sanitized_sentence_numbers_legacy, tsv2tsv
+
+
+def _random_tsv(size, seed):
+    rng = np.random.default_rng(seed)
+
+    return pd.DataFrame({'No.': rng.choice([0, 0, 1, 2, 5], size),
+                         'TOKEN': rng.choice(['', 'a', 'Berlin', '.'], size, p=[0.1, 0.5, 0.2, 0.2]),
+                         'NE-TAG': rng.choice(['O', 'B-LOC', 'I-LOC', 'I-PER'], size)})
+
+
+def test_sanitized_sentence_numbers():
+
+    for seed in range(20):
+        tsv = _random_tsv(300, seed)
+
+        pd.testing.assert_series_equal(sanitized_sentence_numbers(tsv), sanitized_sentence_numbers_legacy(tsv))
+
+
+def test_sanitize_sentence_numbers_edge_cases():
+
+    tsv = pd.DataFrame({'No.': [0, 0, 0, 0, 3, 0], 'TOKEN': ['a', 'b', 'c', '', 'd', 'e'],
+                        'NE-TAG': ['O', 'O', 'O', 'O', 'O', 'I-LOC']}, index=[5, 6, 7, 8, 9, 10])
+
+    assert sanitized_sentence_numbers(tsv).to_list() == [0, 1, 0, 0, 1, 2]
+    pd.testing.assert_series_equal(sanitized_sentence_numbers(tsv), sanitized_sentence_numbers_legacy(tsv))
+
+    assert len(sanitized_sentence_numbers(tsv.iloc[:0])) == 0
+
+    # continuation of a previous part
+    for prev in [0, 4]:
+        pd.testing.assert_series_equal(sanitized_sentence_numbers(tsv, prev),
+                                       sanitized_sentence_numbers_legacy(tsv, prev))
+
+
+def _write_parts(tsv_file, parts):
+    with open(tsv_file, 'w') as f:
+        f.write('\t'.join(parts[0].columns) + '\n')
+        for n, part in enumerate(parts):
+            f.write('# http://empty/{}\n'.format(n))
+            part.to_csv(f, sep='\t', quoting=3, index=False, header=False)
+
+
+def _tsv2tsv(tsv_in_file, tsv_out_file, stream, **kwargs):
+    options = dict(num_tokens=True, sentence_count=True, max_sentence_len=True, keep_tokenization=False,
+                   sentence_split_only=False, show_urls=False, just_zero=False, sanitize_sentence_numbers=True,
+                   show_columns=False, drop_column=[])
+    options.update(kwargs)
+
+    tsv2tsv(str(tsv_in_file), str(tsv_out_file), None, False, stream=stream, **options)
+
+
+def test_stream_equals_tsv2tsv(tmpdir, capsys):
+    parts = []
+    for n in range(5):
+        part = _random_tsv(50, n)
+        for column in ['NE-EMB', 'ID']:
+            part[column] = 'O' if column == 'NE-EMB' else '-'
+        part['url_id'] = n
+        for column in ['left', 'right', 'top', 'bottom']:
+            part[column] = n
+        part['conf'] = '-'
+        parts.append(part)
+
+    tsv_file = Path(tmpdir, 'in.tsv')
+    _write_parts(tsv_file, parts)
+
+    for drop_column in [[], ['conf']]:
+        _tsv2tsv(tsv_file, Path(tmpdir, 'out.tsv'), False, drop_column=drop_column)
+        expected_stdout = capsys.readouterr().out
+
+        _tsv2tsv(tsv_file, Path(tmpdir, 'stream.tsv'), True, drop_column=drop_column)
+
+        assert capsys.readouterr().out == expected_stdout.replace('out.tsv', 'stream.tsv')
+        assert Path(tmpdir, 'stream.tsv').read_text() == Path(tmpdir, 'out.tsv').read_text()
+
+    # --legacy-sanitize is passed on to the streaming implementation
+    _tsv2tsv(tsv_file, Path(tmpdir, 'legacy.tsv'), True, drop_column=['conf'], legacy_sanitize=True)
+    assert Path(tmpdir, 'legacy.tsv').read_text() == Path(tmpdir, 'stream.tsv').read_text()
+
+
+def test_stream_keeps_empty_parts(tmpdir):
+    tsv_file = Path(tmpdir, 'in.tsv')
+    tsv_file.write_text('No.\tTOKEN\tNE-TAG\tNE-EMB\tID\turl_id\tleft\tright\ttop\tbottom\tconf\n'
+                        '# http://empty/0\n'
+                        '#__CONTEXT__:{"a": 1}\n'
+                        '0\tBerlin\tB-LOC\tO\t-\t1\t0\t1\t0\t1\t-\n')
+
+    _tsv2tsv(tsv_file, Path(tmpdir, 'stream.tsv'), True)
+
+    assert Path(tmpdir, 'stream.tsv').read_text() == tsv_file.read_text()
+
+
+def test_url_tokens(tmpdir):
+    tsv_file = Path(tmpdir, 'in.tsv')
+    tsv_file.write_text('No.\tTOKEN\tNE-TAG\tNE-EMB\tID\turl_id\tleft\tright\ttop\tbottom\tconf\n'
+                        '# http://empty/0\n'
+                        '0\tsee\tO\tO\t-\t0\t0\t1\t0\t1\t-\n'
+                        '1\thttps://example.com/a\tO\tO\t-\t0\t0\t1\t0\t1\t-\n'
+                        '#__CONTEXT__:{"a": 1}\n'
+                        '0\tBerlin\tB-LOC\tO\t-\t1\t0\t1\t0\t1\t-\n')
+
+    _tsv2tsv(tsv_file, Path(tmpdir, 'out.tsv'), False)
+    _tsv2tsv(tsv_file, Path(tmpdir, 'stream.tsv'), True)
+
+    assert Path(tmpdir, 'out.tsv').read_text() == tsv_file.read_text()
+    assert Path(tmpdir, 'stream.tsv').read_text() == tsv_file.read_text()
+
+    annotate_tsv(str(tsv_file), str(Path(tmpdir, 'annotated.tsv')))
+    assert Path(tmpdir, 'annotated.tsv').read_text() == tsv_file.read_text().replace('# http://empty/0\n', '') \
+        .replace('#__CONTEXT__:{"a": 1}\n', '')
@@ -0,0 +1,75 @@
+import random
+import unicodedata
+
+import pandas as pd
+from pytest import mark
+
+from qurator.tsvtools.normalize import unicode_normalize, compile_normalization_map
+
+
+def legacy_unicode_normalize(text, normalization_map=None, use_combining_characters=True):
+    # previous implementation of unicode_normalize, kept as reference
+    if normalization_map is None:
+        ret = "".join([c if unicodedata.category(c) != "Co" else '' for c in text])
+
+        if ret != text:
+            print("Warning: Due to unicode normalization possible loss of information: "
+                  "{} => {} (normalization file missing?)".format(text, ret))
+
+    elif use_combining_characters:
+        ret = "".join([c if unicodedata.category(c) != "Co" else
+                       "{}{}".format(normalization_map.loc[ord(c)].base,
+                                     chr(int(normalization_map.loc[ord(c)].combining_character, base=16))
+                                     if normalization_map.loc[ord(c)].combining_character != '' else '')
+                       if ord(c) in normalization_map.index else '' for c in text])
+
+        ret = "".join([c if unicodedata.category(c) != "Co" else '' for c in ret])
+
+        if ret != text:
+            print("Warning: Due to unicode normalization possible loss of information: "
+                  "{} => {}".format(text, ret))
+    else:
+        ret = "".join([c if unicodedata.category(c) != "Co" else
+                       normalization_map.loc[ord(c)].base
+                       if ord(c) in normalization_map.index else ''
+                       for c in text])
+
+        ret = "".join([c if unicodedata.category(c) != "Co" else '' for c in ret])
+
+        if ret != text:
+            print("Warning: Due to unicode normalization possible loss of information: "
+                  "{} => {}".format(text, ret))
+
+    return unicodedata.normalize('NFC', ret)
+
+
+NORMALIZATION_MAP = pd.DataFrame([(0xE000, 'a', '0308'), (0xE001, 'ſ', ''), (0xE002, 'q', '0304'),
+                                  (0xF8FF, 'ck', ''), (0xF0001, 'e', '0301'), (0x61, 'b', '')],
+                                 columns=['decimal', 'base', 'combining_character']).set_index('decimal')
+
+ALPHABET = ['a', 'e', 'ſ', 'ü', 'ü', ' ', '', '', '', '', '', '',
+            '\U000f0001', '\U000f0002', '\U0010fffd']
+
+
+@mark.parametrize('use_combining_characters', [True, False])
+def test_unicode_normalize_equals_legacy(capsys, use_combining_characters):
+    rnd = random.Random(0)
+    texts = [''.join(rnd.choices(ALPHABET, k=rnd.randint(0, 8))) for _ in range(500)]
+
+    normalization_table = compile_normalization_map(NORMALIZATION_MAP, use_combining_characters)
+
+    for text in texts:
+        expected = legacy_unicode_normalize(text, NORMALIZATION_MAP, use_combining_characters)
+        expected_out = capsys.readouterr().out
+
+        assert unicode_normalize(text, NORMALIZATION_MAP, use_combining_characters) == expected
+        assert capsys.readouterr().out == expected_out
+
+        assert unicode_normalize(text, normalization_table) == expected
+        assert capsys.readouterr().out == expected_out
+
+        expected = legacy_unicode_normalize(text)
+        expected_out = capsys.readouterr().out
+
+        assert unicode_normalize(text) == expected
+        assert capsys.readouterr().out == expected_out
@@ -0,0 +1,59 @@
+import csv
+from io import StringIO
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from qurator.tsvtools.alto import alto2tsv
+from qurator.tsvtools.page import page2tsv
+from qurator.tsvtools.writer import tsv_rows
+
+GOLDEN = Path(__file__).parent.joinpath('golden')
+
+# an empty page followed by two pages with text
+PAGES = sorted(Path(__file__).parent.joinpath('testws', 'TESS').glob('*.xml'))[7:10]
+
+
+def test_golden_files(tmpdir):
+    """
+    The golden files have been written by the to_csv based writer of the converters (the tree before
+    writer.TSVWriter). The alto2tsv files are the output of that writer with the later ALTO conversion fixes (HYP
+    not part of the tokens, NERD conf always '-') applied, i.e., only the writer differs.
+    """
+    for n, page in enumerate(PAGES):
+        page2tsv(str(page), str(Path(tmpdir, 'page2tsv_NERD.tsv')), 'NERD', 'http://example.com/{}'.format(n), None,
+                 None, False, 1.0, None, None, None, 1, None)
+        page2tsv(str(page), str(Path(tmpdir, 'page2tsv_OCR.tsv')), 'OCR', 'http://example.com/{}'.format(n), None,
+                 None, False, 0.5, None, 0.2, 1.0, 1, None)
+
+    for purpose in ['NERD', 'OCR']:
+        alto2tsv(str(GOLDEN.joinpath('alto.xml')), str(Path(tmpdir, 'alto2tsv_{}.tsv'.format(purpose))), purpose,
+                 'http://example.com/{{ page_id }}', None, None, False, 1.0, None, 1, split_pages=True)
+
+    for name in ['page2tsv_NERD.tsv', 'page2tsv_OCR.tsv', 'alto2tsv_NERD.tsv', 'alto2tsv_OCR.tsv']:
+        assert Path(tmpdir, name).read_bytes() == GOLDEN.joinpath(name).read_bytes(), name
+
+
+def to_csv(tsv):
+    out = StringIO()
+    tsv.to_csv(out, sep="\t", quoting=3, index=False, header=False)
+
+    return out.getvalue()
+
+
+def test_rows_equal_to_csv():
+    tsv = pd.DataFrame({'int': [1, -2, 3, 0], 'float': [0.1, np.nan, 1e16, 1 / 3], 'conf': ['-', 0.25, np.nan, None],
+                        'text': ['"Berlin"', 'a\rb', '', 'ſͤ'], 'flag': [True, False, True, False],
+                        'nullable': pd.array([1, None, 3, 4], dtype='Int64'),
+                        'date': pd.to_datetime(['2020-01-01', None, '2020-01-03', '2020-01-04'])})
+
+    assert tsv_rows(tsv) == to_csv(tsv)
+    assert tsv_rows(tsv.drop(columns=['date'])) == to_csv(tsv.drop(columns=['date']))
+    assert tsv_rows(tsv.iloc[:0]) == ''
+
+
+def test_rows_refused_by_to_csv():
+    with pytest.raises(csv.Error):
+        tsv_rows(pd.DataFrame({'TOKEN': ['a\tb'], 'url_id': [0]}))